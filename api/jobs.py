@@ -0,0 +1,98 @@
+"""
+In-memory store of processed jobs.
+
+Every processing request is recorded as a job holding its PageResults, so
+clients can come back and query individual pages (e.g. a region of a page)
+without re-uploading the document. The store keeps the most recent
+``OCR_MAX_JOBS`` jobs for at most ``OCR_JOB_TTL_SECONDS``.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ocr.result import PageResult
+
+
+class Job:
+    """A processed file and its page results."""
+
+    __slots__ = ('job_id', 'filename', 'pages', 'created_at', 'profile', 'sha256')
+
+    def __init__(self, job_id: str, filename: str, pages: List[PageResult],
+                 profile: Dict[str, Any] = None, sha256: str = None):
+        self.job_id = job_id
+        self.filename = filename
+        self.pages = pages
+        self.created_at = time.time()
+        self.profile = profile
+        self.sha256 = sha256
+
+    def page(self, page_number: int) -> Optional[PageResult]:
+        """Page by 1-based number, or None."""
+        for index, page in enumerate(self.pages, 1):
+            if (page.page_number or index) == page_number:
+                return page
+        return None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "sha256": self.sha256,
+            "total_pages": len(self.pages),
+            "created_at": self.created_at,
+            "profiled": self.profile is not None,
+        }
+
+
+class JobStore:
+    """
+    Bounded, thread-safe store of the most recent jobs.
+
+    Args:
+        max_jobs: Maximum number of jobs kept
+        ttl_seconds: Jobs older than this are dropped (0 = keep until evicted)
+    """
+
+    def __init__(self, max_jobs: int = 100, ttl_seconds: float = 3600):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        if self.ttl_seconds:
+            cutoff = time.time() - self.ttl_seconds
+            while self._jobs and next(iter(self._jobs.values())).created_at < cutoff:
+                self._jobs.popitem(last=False)
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def add(self, filename: str, pages: List[PageResult], profiler=None,
+            sha256: str = None) -> Job:
+        """
+        Record a job and return it (with a new ``job_id``).
+
+        With a ``utils.profiling.Profiler`` its Chrome trace is kept with the
+        job; ``sha256`` is the content hash of the uploaded file.
+        """
+        job = Job(uuid.uuid4().hex, filename, pages,
+                  profiler.chrome_trace() if profiler is not None else None, sha256)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._expire()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+
+job_store = JobStore(
+    max_jobs=int(os.environ.get("OCR_MAX_JOBS", 100)),
+    ttl_seconds=float(os.environ.get("OCR_JOB_TTL_SECONDS", 3600)),
+)
@@ -1,16 +1,43 @@
 # Import OCR functionality - add to path first
 from datetime import datetime
+import hashlib
+import logging
 import os
 import shutil
 import tempfile
 import numpy as np
 from PIL import Image
 import io
+import asyncio
+import contextvars
+import json
+import tarfile
+import time
+import zipfile
 from typing import List, Dict, Any
-from fastapi.responses import JSONResponse
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from utils.ingest import document_to_images
-from ocr.paddle import process_image_direct
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Body
+from starlette.concurrency import run_in_threadpool
+from utils.archive import iter_archive, is_archive
+from utils.ingest import IMAGE_EXTENSIONS, DocumentSource, parse_dpi
+from ocr.paddle import detect_page, detections_to_dict, process_image_direct, query_region
+from ocr.recognition import get_recognizer
+from ocr.structure import analyze_page
+from ocr.rec_cache import document_cache, get_global_cache, cache_mode
+from ocr.registry import get_registry
+from ocr.result import pages_to_dicts
+from ocr.export import WRITERS, iter_export
+from ocr.templates import FormTemplate, extract_fields, get_template_store
+from ocr.store import get_result_store
+from ocr.orientation import document_orientation
+from ocr.pipeline import document_pages_in_flight, ocr_pages, pipeline_stats
+from ocr.device import configure_worker, detect_device
+from utils.profiling import profile_session, profile_page, stage
+from utils.task_queue import get_task_queue
+from utils.admission import (AdmissionError, admit, check_archive, check_crops, check_dpi,
+                             check_upload, estimate_document_bytes, get_memory_budget,
+                             max_archive_members, max_upload_bytes)
+from api.jobs import job_store
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
@@ -22,6 +49,177 @@ app = FastAPI(
     version="1.0.0"
 )
 
+logger = logging.getLogger(__name__)
+
+# Split the CPU core budget across uvicorn workers before any model loads
+configure_worker()
+
+
+EXPORT_FORMAT = Query("json", pattern="^(json|" + "|".join(WRITERS) + ")$",
+                      description="Response format: json, or a streamed export format")
+
+
+def _export_response(pages, fmt: str, filename: str) -> StreamingResponse:
+    """Stream ``pages`` ((PageResult, image) pairs) in export format ``fmt``."""
+    writer = WRITERS[fmt]
+    stem = os.path.splitext(os.path.basename(filename or "document"))[0] or "document"
+    return StreamingResponse(
+        iter_export(pages, fmt, title=stem),
+        media_type=writer.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{stem}.{writer.extension}"'})
+
+
+def _record(filename: str, pages, contents: bytes, profiler=None):
+    """
+    Record a job and persist its pages in the result store (keyed by the
+    SHA-256 of the uploaded file). A failing store does not fail the request.
+
+    Blocking (SQLite/FTS5 inserts for every line): async handlers call it
+    through ``run_in_threadpool``.
+    """
+    sha256 = hashlib.sha256(contents).hexdigest()
+    store = get_result_store()
+    if store is not None:
+        try:
+            store.save(sha256, filename, pages)
+        except Exception:
+            logger.exception("could not save results of %s to the result store", filename)
+    return job_store.add(filename, pages, profiler=profiler, sha256=sha256)
+
+
+async def _admit(source: DocumentSource, dpi, allow_downgrade: bool, pages: int = None,
+                 pages_in_flight: int = None):
+    """
+    Reserve the estimated memory of OCR'ing ``source`` (see ``utils.admission``).
+
+    Args:
+        pages: Pages that will be rendered (default: all)
+        pages_in_flight: Most pages held at once (default: the document pipeline's)
+    """
+    pages = pages or source.page_count
+    in_flight = pages_in_flight or document_pages_in_flight()
+
+    def estimate(candidate_dpi):
+        return estimate_document_bytes(source.max_page_pixels(candidate_dpi), pages, in_flight)
+
+    return await admit(get_memory_budget(), estimate, dpi, pages, allow_downgrade)
+
+
+def _admission_error(e: AdmissionError) -> HTTPException:
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+
+def _stream_pages(filename: str, contents: bytes, images=None, source: DocumentSource = None,
+                  temp_dir: str = None, admission=None, orientation=None):
+    """
+    OCR pages through the pipeline for a streamed export, yielding (page, image).
+
+    The streaming response pulls each page from a worker thread with a fresh
+    copy of the request context, so the document cache is scoped to a
+    context owned by this generator, and the pipeline threads start in it.
+    The job is recorded (and stored) once all pages are done; ``source``,
+    ``temp_dir`` and the memory ``admission`` are released at the end.
+    """
+    context = contextvars.copy_context()
+    scope = document_cache()
+    context.run(scope.__enter__)
+    pages = []
+    try:
+        run = context.run(ocr_pages, images=images, source=source, store=get_result_store(),
+                          orientation=orientation)
+        try:
+            for page, image in run:
+                pages.append(page)
+                yield page, image
+        finally:
+            run.close()
+    finally:
+        context.run(scope.__exit__, None, None, None)
+        if source is not None:
+            source.close()
+        if temp_dir and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        if admission is not None:
+            admission.release()
+    _record(filename, pages, contents)
+
+
+def _collect_pages(**inputs):
+    """All pages of ``images`` or ``source`` through the pipeline (blocking; run in a thread)."""
+    return [page for page, _ in ocr_pages(store=get_result_store(), **inputs)]
+
+
+def _ocr_member_pages(**inputs):
+    """OCR one upload's pages (``images`` or ``source``) with its own document cache."""
+    with document_cache():
+        return _collect_pages(**inputs)
+
+
+def _ocr_image(image: Image.Image) -> Dict[str, Any]:
+    with profile_page(1):
+        return process_image_direct(image)
+
+
+def _recognize_crops(crops):
+    return get_recognizer().recognize(crops)
+
+
+def _analyze_pages(images, force: bool, table_mode: str):
+    """Routed OCR and structure analysis of each page: (response pages, page results)."""
+    pages = []
+    page_results = []
+    for i, image in enumerate(images):
+        with profile_page(i + 1):
+            analysis = analyze_page(image, force=force, table_mode=table_mode)
+            page = analysis['page']
+            page.page_number = i + 1
+            page_results.append(page)
+            with stage("serialize"):
+                pages.append({
+                    "page_number": i + 1,
+                    "route": analysis['route'],
+                    "reasons": analysis['reasons'],
+                    "signals": analysis['signals'],
+                    "ocr": page.to_dict(),
+                    "structure": analysis['structure']
+                })
+    return pages, page_results
+
+
+def _detect_pages(images, space: str) -> List[Dict[str, Any]]:
+    pages = []
+    for i, image in enumerate(images):
+        with profile_page(i + 1):
+            page = detect_page(image)
+            page.page_number = i + 1
+            with stage("serialize"):
+                pages.append(detections_to_dict(page, space))
+    return pages
+
+
+def _get_template(name: str) -> FormTemplate:
+    template = get_template_store().get(name)
+    if template is None:
+        raise HTTPException(status_code=404, detail=f"Template not found: {name}")
+    return template
+
+
+def _template_response(template: FormTemplate, filename: str, render, page_count: int,
+                       profile: bool) -> Dict[str, Any]:
+    """Read only the template's fields (see ``ocr.templates.extract_fields``)."""
+    with profile_session(profile) as profiler, document_cache():
+        result = extract_fields(template, render, page_count=page_count)
+    response = {
+        "success": True,
+        "filename": filename,
+        **result,
+        "processed_at": datetime.now().isoformat()
+    }
+    if profiler is not None:
+        response["profile"] = profiler.summary()
+    return response
+
 
 @app.get("/")
 async def root():
@@ -29,10 +227,17 @@ async def root():
 
 
 @app.post("/process/image")
-async def process_image(file: UploadFile = File(...)):
+async def process_image(file: UploadFile = File(...), format: str = EXPORT_FORMAT,
+                        profile: bool = False, template: str = None):
     """
-    Process an image file through OCR with spatial text arrangement
+    Process an image file through OCR with spatial text arrangement.
+
+    With ``format`` other than ``json`` the result is streamed back as
+    markdown, text, hOCR, ALTO XML or a searchable PDF. ``profile=true``
+    adds per-stage timings and memory peaks to the JSON response. With
+    ``template`` only the fields of that registered form template are read.
     """
+    form = _get_template(template) if template else None
     try:
         # Check file type
         if not file.content_type.startswith('image/'):
@@ -41,22 +246,46 @@ async def process_image(file: UploadFile = File(...)):
 
         # Read and process image
         contents = await file.read()
+        check_upload(len(contents))
         image = Image.open(io.BytesIO(contents))
 
-        # Process image through OCR
-        result = process_image_direct(image)
+        if form is not None:
+            return await run_in_threadpool(_template_response, form, file.filename,
+                                           lambda n: image, 1, profile)
 
-        if not result['success']:
-            raise HTTPException(
-                status_code=500, detail=f"OCR processing failed: {result['error']}")
+        if format != "json":
+            return _export_response(_stream_pages(file.filename, contents, images=[image]),
+                                    format, file.filename)
 
-        return {
+        with profile_session(profile) as profiler:
+            # Process image through OCR, off the event loop
+            result = await run_in_threadpool(_ocr_image, image)
+
+            if not result['success']:
+                raise HTTPException(
+                    status_code=500, detail=f"OCR processing failed: {result['error']}")
+
+            with stage("serialize"):
+                results = pages_to_dicts(result['results'])
+
+        job = await run_in_threadpool(_record, file.filename, result['results'], contents,
+                                      profiler=profiler)
+
+        response = {
             "success": True,
+            "job_id": job.job_id,
+            "sha256": job.sha256,
             "filename": file.filename,
             "total_pages": result['total_pages'],
-            "results": result['results'],
+            "results": results,
             "processed_at": datetime.now().isoformat()
         }
+        if profiler is not None:
+            response["profile"] = profiler.summary()
+        return response
+
+    except AdmissionError as e:
+        raise _admission_error(e)
 
     except Exception as e:
         raise HTTPException(
@@ -64,44 +293,113 @@ async def process_image(file: UploadFile = File(...)):
 
 
 @app.post("/process/document")
-async def process_document(file: UploadFile = File(...), dpi: int = 300):
+async def process_document(file: UploadFile = File(...),
+                           dpi: str = Query("300", pattern="^(auto|[0-9]+)$"),
+                           format: str = EXPORT_FORMAT, profile: bool = False,
+                           template: str = None, allow_downgrade: bool = False,
+                           orientation: str = Query(os.environ.get("OCR_ORIENTATION", "page"),
+                                                    pattern="^(page|document)$")):
     """
-    Process a document file (PDF, DOCX) through OCR with spatial text arrangement
+    Process a document file (PDF, DOCX) through OCR with spatial text arrangement.
+
+    Pages are rendered, preprocessed, recognized and arranged in a pipeline
+    (see ``ocr.pipeline``). With ``format`` other than ``json`` pages are
+    streamed back as they are recognized, as markdown, text, hOCR, ALTO XML
+    or a searchable PDF. ``dpi=auto`` renders each page at a low probe DPI
+    and re-renders only pages with small text. ``profile=true`` adds
+    per-page, per-stage timings and memory peaks to the JSON response; the
+    Chrome trace is at ``/jobs/{job_id}/profile``.
+
+    Pages whose preprocessed raster is already in the result store (e.g.
+    the unchanged pages of a revised document) reuse the stored result; they
+    are flagged ``reused`` and listed in ``reused_pages``.
+
+    With ``template`` only the fields of that registered form template are
+    read (from the pages it uses) and a field -> text map is returned.
+
+    The request's peak memory is estimated before rasterizing. It waits when
+    the memory budget is in use and is rejected (413) when it can never fit.
+    ``allow_downgrade=true`` lets it run at a lower DPI instead.
+
+    ``orientation=document`` classifies the orientation of the first pages
+    once and applies it to all pages instead of classifying every page (see
+    ``ocr.orientation``); the decision is reported under ``orientation``.
     """
+    form = _get_template(template) if template else None
+    doc_orientation = document_orientation(orientation)
     temp_dir = None
+    admission = None
     try:
-        # Create temporary file
-        temp_dir = tempfile.mkdtemp()
-        temp_file_path = os.path.join(temp_dir, file.filename)
-
         # Save uploaded file
         contents = await file.read()
+        check_upload(len(contents))
+        temp_dir = tempfile.mkdtemp()
+        temp_file_path = os.path.join(temp_dir, file.filename)
         with open(temp_file_path, 'wb') as f:
             f.write(contents)
 
-        # Convert document to images
-        images = document_to_images(temp_file_path, dpi=dpi)
-
-        if not images:
+        source = await run_in_threadpool(DocumentSource, temp_file_path, parse_dpi(dpi))
+        if not source.page_count:
+            source.close()
             raise HTTPException(
                 status_code=400, detail="Failed to convert document to images")
 
-        # Process each image through OCR
-        all_results = []
-        for i, image in enumerate(images):
-            result = process_image_direct(image)
-            if result['success']:
-                for page_result in result['results']:
-                    page_result['page_number'] = i + 1
-                    all_results.append(page_result)
+        if form is not None:
+            template_pages = [n for n in form.pages if n <= source.page_count]
+            admission = await _admit(source, source.dpi, allow_downgrade,
+                                     pages=len(template_pages) or 1, pages_in_flight=1)
+            source.dpi = admission.dpi
+            with source:
+                return await run_in_threadpool(_template_response, form, file.filename,
+                                               source.render, source.page_count, profile)
 
-        return {
+        admission = await _admit(source, source.dpi, allow_downgrade)
+        source.dpi = admission.dpi
+
+        if format != "json":
+            # The generator owns the upload, its temp dir and the admission from here on
+            stream = _stream_pages(file.filename, contents, source=source,
+                                   temp_dir=temp_dir, admission=admission,
+                                   orientation=doc_orientation)
+            temp_dir = admission = None
+            return _export_response(stream, format, file.filename)
+
+        with profile_session(profile) as profiler:
+            # Rasterize, preprocess, OCR and arrange pages in a pipeline
+            with source, document_cache() as rec_cache:
+                all_results = await run_in_threadpool(_collect_pages, source=source,
+                                                      orientation=doc_orientation)
+
+            with stage("serialize"):
+                results = pages_to_dicts(all_results)
+
+        job = await run_in_threadpool(_record, file.filename, all_results, contents,
+                                      profiler=profiler)
+
+        response = {
             "success": True,
+            "job_id": job.job_id,
+            "sha256": job.sha256,
             "filename": file.filename,
-            "total_pages": len(images),
-            "results": all_results,
+            "total_pages": source.page_count,
+            "results": results,
+            "admission": admission.to_dict(),
             "processed_at": datetime.now().isoformat()
         }
+        if rec_cache is not None:
+            response["recognition_cache"] = rec_cache.stats()
+        if get_result_store() is not None:
+            response["reused_pages"] = [page.page_number for page in all_results if page.reused]
+        if source.dpi == "auto":
+            response["render_dpi"] = {str(n): d for n, d in sorted(source.page_dpi.items())}
+        if doc_orientation is not None:
+            response["orientation"] = doc_orientation.stats()
+        if profiler is not None:
+            response["profile"] = profiler.summary()
+        return response
+
+    except AdmissionError as e:
+        raise _admission_error(e)
 
     except Exception as e:
         raise HTTPException(
@@ -111,6 +409,209 @@ async def process_document(file: UploadFile = File(...), dpi: int = 300):
         # Clean up temp files
         if temp_dir and os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
+        if admission is not None:
+            admission.release()
+
+
+@app.post("/process/structure")
+async def process_structure(file: UploadFile = File(...), dpi: int = 300,
+                            force: bool = False, profile: bool = False,
+                            allow_downgrade: bool = False,
+                            tables: str = Query(os.environ.get("OCR_TABLE_MODE", "structure"),
+                                                pattern="^(structure|fast)$")):
+    """
+    Structure analysis (tables, charts, layout) with selective routing.
+
+    Every page goes through regular OCR; only pages whose cheap checks
+    suggest tables or charts (or all pages with ``force=true``) are also
+    sent to PPStructureV3. With ``tables=fast``, pages whose only structure
+    is ruled tables get them from the OpenCV extractor (``ocr.tables``,
+    route ``tables``) instead. ``profile=true`` adds per-stage timings.
+    Documents are rendered one page at a time under the same memory
+    admission control as ``/process/document``.
+    """
+    temp_dir = None
+    source = None
+    admission = None
+    try:
+        contents = await file.read()
+        check_upload(len(contents))
+        with profile_session(profile) as profiler:
+            if file.content_type and file.content_type.startswith('image/'):
+                images = [Image.open(io.BytesIO(contents))]
+            else:
+                temp_dir = tempfile.mkdtemp()
+                temp_file_path = os.path.join(temp_dir, file.filename)
+                with open(temp_file_path, 'wb') as f:
+                    f.write(contents)
+                source = await run_in_threadpool(DocumentSource, temp_file_path, dpi)
+                if source.page_count:
+                    admission = await _admit(source, dpi, allow_downgrade, pages_in_flight=1)
+                    source.dpi = admission.dpi
+                images = (source.render(n) for n in range(1, source.page_count + 1))
+
+            with document_cache():
+                pages, page_results = await run_in_threadpool(_analyze_pages, images,
+                                                              force, tables)
+
+        if not pages:
+            raise HTTPException(
+                status_code=400, detail="Failed to convert document to images")
+
+        job = await run_in_threadpool(_record, file.filename, page_results, contents,
+                                      profiler=profiler)
+
+        response = {
+            "success": True,
+            "job_id": job.job_id,
+            "sha256": job.sha256,
+            "filename": file.filename,
+            "total_pages": len(pages),
+            "structure_pages": sum(1 for p in pages if p['route'] == 'structure'),
+            "table_pages": sum(1 for p in pages if p['route'] == 'tables'),
+            "pages": pages,
+            "processed_at": datetime.now().isoformat()
+        }
+        if profiler is not None:
+            response["profile"] = profiler.summary()
+        return response
+
+    except AdmissionError as e:
+        raise _admission_error(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error analyzing document structure: {str(e)}")
+
+    finally:
+        if source is not None:
+            source.close()
+        if temp_dir and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        if admission is not None:
+            admission.release()
+
+
+@app.post("/process/detect")
+async def process_detect(file: UploadFile = File(...), dpi: int = 300,
+                         space: str = Query("page", pattern="^(page|image)$"),
+                         profile: bool = False, allow_downgrade: bool = False):
+    """
+    Detection only: text-region boxes and polygons, without recognition.
+
+    Only the text detector (``OCR_DET_MODEL``) runs; the recognition and
+    orientation models are neither loaded nor run. Boxes and 4-point
+    polygons are in original page coordinates (``space=page``) or in the
+    preprocessed image they were detected on (``space=image``); scores are
+    detection scores. Documents are rendered one page at a time under
+    memory admission control.
+    """
+    temp_dir = None
+    source = None
+    admission = None
+    try:
+        contents = await file.read()
+        check_upload(len(contents))
+        with profile_session(profile) as profiler:
+            if file.content_type and file.content_type.startswith('image/'):
+                images = [Image.open(io.BytesIO(contents))]
+            else:
+                temp_dir = tempfile.mkdtemp()
+                temp_file_path = os.path.join(temp_dir, file.filename)
+                with open(temp_file_path, 'wb') as f:
+                    f.write(contents)
+                source = await run_in_threadpool(DocumentSource, temp_file_path, dpi)
+                if source.page_count:
+                    admission = await _admit(source, dpi, allow_downgrade, pages_in_flight=1)
+                    source.dpi = admission.dpi
+                images = (source.render(n) for n in range(1, source.page_count + 1))
+
+            pages = await run_in_threadpool(_detect_pages, images, space)
+
+        if not pages:
+            raise HTTPException(
+                status_code=400, detail="Failed to convert document to images")
+
+        response = {
+            "success": True,
+            "filename": file.filename,
+            "space": space,
+            "total_pages": len(pages),
+            "total_regions": sum(len(p['boxes']) for p in pages),
+            "pages": pages,
+            "processed_at": datetime.now().isoformat()
+        }
+        if profiler is not None:
+            response["profile"] = profiler.summary()
+        return response
+
+    except AdmissionError as e:
+        raise _admission_error(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error detecting text regions: {str(e)}")
+
+    finally:
+        if source is not None:
+            source.close()
+        if temp_dir and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        if admission is not None:
+            admission.release()
+
+
+@app.post("/process/recognize")
+async def process_recognize(files: List[UploadFile] = File(...), profile: bool = False):
+    """
+    Recognition only: the text of many line crops in one request.
+
+    Each file is one text-line image, already cropped by the caller's own
+    detector. All crops go to the recognizer (``OCR_REC_MODEL``) as one
+    batched call; no detection, orientation or preprocessing runs. Results
+    come back in upload order. At most ``OCR_MAX_CROPS`` crops per request.
+    """
+    try:
+        check_crops(len(files))
+        contents = [await file.read() for file in files]
+        check_upload(sum(len(c) for c in contents))
+
+        with profile_session(profile) as profiler:
+            crops = []
+            with stage("decode"):
+                for file, data in zip(files, contents):
+                    try:
+                        rgb = Image.open(io.BytesIO(data)).convert("RGB")
+                    except Exception:
+                        raise HTTPException(
+                            status_code=400, detail=f"Not an image: {file.filename}")
+                    # The recognizer takes BGR arrays, like the OCR pipeline
+                    crops.append(np.ascontiguousarray(np.asarray(rgb)[:, :, ::-1]))
+
+            with document_cache():
+                texts, scores = await run_in_threadpool(_recognize_crops, crops)
+
+        response = {
+            "success": True,
+            "total_crops": len(crops),
+            "lines": [{"index": i, "filename": file.filename, "text": text,
+                       "score": float(score)}
+                      for i, (file, text, score) in enumerate(zip(files, texts, scores))],
+            "processed_at": datetime.now().isoformat()
+        }
+        if profiler is not None:
+            response["profile"] = profiler.summary()
+        return response
+
+    except AdmissionError as e:
+        raise _admission_error(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error recognizing crops: {str(e)}")
 
 
 @app.post("/process/multiple")
@@ -125,16 +626,21 @@ async def process_multiple_files(files: List[UploadFile] = File(...)):
             if file.content_type.startswith('image/'):
                 # Process as image
                 contents = await file.read()
+                check_upload(len(contents))
                 image = Image.open(io.BytesIO(contents))
-                result = process_image_direct(image)
+                result = await run_in_threadpool(process_image_direct, image)
 
                 if result['success']:
+                    job = await run_in_threadpool(_record, file.filename, result['results'],
+                                                  contents)
                     results.append({
                         "filename": file.filename,
                         "type": "image",
                         "success": True,
+                        "job_id": job.job_id,
+                        "sha256": job.sha256,
                         "total_pages": result['total_pages'],
-                        "results": result['results']
+                        "results": pages_to_dicts(result['results'])
                     })
                 else:
                     results.append({
@@ -146,30 +652,37 @@ async def process_multiple_files(files: List[UploadFile] = File(...)):
 
             else:
                 # Process as document (will need to save temporarily)
-                temp_dir = tempfile.mkdtemp()
-                temp_file_path = os.path.join(temp_dir, file.filename)
-
                 contents = await file.read()
-                with open(temp_file_path, 'wb') as f:
-                    f.write(contents)
-
-                images = document_to_images(temp_file_path)
+                check_upload(len(contents))
+                temp_dir = tempfile.mkdtemp()
+                try:
+                    temp_file_path = os.path.join(temp_dir, file.filename)
+                    with open(temp_file_path, 'wb') as f:
+                        f.write(contents)
 
-                if images:
-                    doc_results = []
-                    for i, image in enumerate(images):
-                        result = process_image_direct(image)
-                        if result['success']:
-                            for page_result in result['results']:
-                                page_result['page_number'] = i + 1
-                                doc_results.append(page_result)
+                    with await run_in_threadpool(DocumentSource, temp_file_path) as source:
+                        doc_results = []
+                        if source.page_count:
+                            admission = await _admit(source, source.dpi, allow_downgrade=False)
+                            try:
+                                doc_results = await run_in_threadpool(_ocr_member_pages,
+                                                                      source=source)
+                            finally:
+                                admission.release()
+                finally:
+                    # Clean up temp files, also when the document was rejected
+                    shutil.rmtree(temp_dir, ignore_errors=True)
 
+                if source.page_count:
+                    job = await run_in_threadpool(_record, file.filename, doc_results, contents)
                     results.append({
                         "filename": file.filename,
                         "type": "document",
                         "success": True,
-                        "total_pages": len(images),
-                        "results": doc_results
+                        "job_id": job.job_id,
+                        "sha256": job.sha256,
+                        "total_pages": source.page_count,
+                        "results": pages_to_dicts(doc_results)
                     })
                 else:
                     results.append({
@@ -179,8 +692,13 @@ async def process_multiple_files(files: List[UploadFile] = File(...)):
                         "error": "Failed to convert document to images"
                     })
 
-                # Clean up temp files
-                shutil.rmtree(temp_dir)
+        except AdmissionError as e:
+            results.append({
+                "filename": file.filename,
+                "success": False,
+                "status_code": e.status_code,
+                "error": str(e)
+            })
 
         except Exception as e:
             results.append({
@@ -196,6 +714,164 @@ async def process_multiple_files(files: List[UploadFile] = File(...)):
     }
 
 
+async def _ocr_archive_member(member, dpi, allow_downgrade: bool) -> Dict[str, Any]:
+    """
+    Result line for one archive member.
+
+    Images are decoded from memory. Documents are written to a temp file
+    of their own (poppler reads from a path) and admitted against the
+    memory budget like ``/process/document`` uploads.
+    """
+    base = {"filename": member.name, "index": member.index}
+    if member.error is not None:
+        return {**base, "success": False, "error": member.error}
+
+    is_image = member.name.lower().endswith(IMAGE_EXTENSIONS)
+    base["type"] = "image" if is_image else "document"
+    temp_dir = None
+    try:
+        check_upload(len(member.data))
+        if is_image:
+            image = Image.open(io.BytesIO(member.data))
+            pages = await run_in_threadpool(_ocr_member_pages, images=[image])
+        else:
+            temp_dir = tempfile.mkdtemp()
+            path = os.path.join(temp_dir, os.path.basename(member.name))
+            with open(path, 'wb') as f:
+                f.write(member.data)
+            source = await run_in_threadpool(DocumentSource, path, dpi)
+            with source:
+                if not source.page_count:
+                    return {**base, "success": False,
+                            "error": "Failed to convert document to images"}
+                admission = await _admit(source, source.dpi, allow_downgrade)
+                try:
+                    source.dpi = admission.dpi
+                    pages = await run_in_threadpool(_ocr_member_pages, source=source)
+                finally:
+                    admission.release()
+
+        job = await run_in_threadpool(_record, member.name, pages, member.data)
+        return {
+            **base,
+            "success": True,
+            "job_id": job.job_id,
+            "sha256": job.sha256,
+            "total_pages": len(pages),
+            "results": pages_to_dicts(pages)
+        }
+
+    except AdmissionError as e:
+        return {**base, "success": False, "status_code": e.status_code, "error": str(e)}
+
+    except Exception as e:
+        return {**base, "success": False, "error": str(e)}
+
+    finally:
+        if temp_dir and os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+
+
+async def _stream_archive(members, first, dpi, allow_downgrade: bool, concurrency: int):
+    """
+    NDJSON lines for the members of an archive, as they finish.
+
+    At most ``concurrency`` members are read and in flight at once, so the
+    next member is only pulled from the archive when a slot frees up. A
+    summary line closes the stream.
+    """
+    started = time.perf_counter()
+    counts = {"total_files": 0, "succeeded": 0, "failed": 0, "total_pages": 0}
+    pending = set()
+    upcoming = first
+    exhausted = first is None
+    try:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < concurrency:
+                member, upcoming = upcoming, None
+                if member is None:
+                    try:
+                        member = await run_in_threadpool(next, members, None)
+                    except Exception as e:
+                        # A truncated or corrupt archive: report what was read
+                        exhausted = True
+                        yield json.dumps({"success": False,
+                                          "error": f"Error reading archive: {e}"}) + "\n"
+                        break
+                if member is None:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(
+                    _ocr_archive_member(member, dpi, allow_downgrade)))
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: t.result()["index"]):
+                result = task.result()
+                counts["total_files"] += 1
+                if result["success"]:
+                    counts["succeeded"] += 1
+                    counts["total_pages"] += result["total_pages"]
+                else:
+                    counts["failed"] += 1
+                yield json.dumps(result) + "\n"
+    finally:
+        for task in pending:
+            task.cancel()
+        members.close()
+
+    yield json.dumps({"summary": {
+        **counts,
+        "seconds": round(time.perf_counter() - started, 3),
+        "processed_at": datetime.now().isoformat()
+    }}) + "\n"
+
+
+@app.post("/process/archive")
+async def process_archive(file: UploadFile = File(...),
+                          dpi: str = Query("300", pattern="^(auto|[0-9]+)$"),
+                          allow_downgrade: bool = False,
+                          concurrency: int = Query(None, ge=1)):
+    """
+    Process every image and document in a ZIP or TAR (optionally
+    compressed) archive, streaming one NDJSON line per file.
+
+    The archive is read member by member (see ``utils.archive``) and each
+    file goes straight into the OCR pipeline; up to ``concurrency`` files
+    (capped by ``OCR_ARCHIVE_CONCURRENCY``, default 2) are processed at
+    once. Lines come in completion order and carry the member's ``index``
+    and ``filename``, then the fields of a ``/process/multiple`` result. A
+    member over ``OCR_MAX_UPLOAD_MB``, of an unsupported type or failing
+    admission gets a line with ``success: false``; the rest of the archive
+    still runs. The last line is a ``summary``.
+    """
+    if not is_archive(file.filename):
+        raise HTTPException(status_code=400, detail="File must be a ZIP or TAR archive")
+    try:
+        check_archive(file.size if file.size is not None else len(await file.read()))
+    except AdmissionError as e:
+        raise _admission_error(e)
+
+    try:
+        dpi = parse_dpi(dpi)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    limit = int(os.environ.get("OCR_ARCHIVE_CONCURRENCY", 2))
+    concurrency = min(concurrency or limit, limit)
+    members = iter_archive(file.file, max_upload_bytes(), max_archive_members())
+    try:
+        # Fail on a file that is not an archive before the stream starts
+        first = await run_in_threadpool(next, members, None)
+    except (ValueError, tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read archive: {e}")
+
+    return StreamingResponse(
+        _stream_archive(members, first, dpi, allow_downgrade, concurrency),
+        media_type="application/x-ndjson")
+
+
 @app.get("/health")
 async def health_check():
     """
@@ -204,10 +880,269 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "service": "ocr-tech-api"
+        "service": "ocr-tech-api",
+        "device": detect_device()
+    }
+
+
+def _get_job_page(job_id: str, page_number: int):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    page = job.page(page_number)
+    if page is None:
+        raise HTTPException(
+            status_code=404, detail=f"Page {page_number} not found in job {job_id}")
+    return page
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Summary of a processed job
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.summary()
+
+
+@app.get("/jobs/{job_id}/profile")
+async def get_job_profile(job_id: str):
+    """
+    Chrome trace-event JSON of a job processed with ``profile=true``
+    (open in chrome://tracing or Perfetto)
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job.profile is None:
+        raise HTTPException(
+            status_code=404, detail=f"Job {job_id} was not processed with profile=true")
+    return JSONResponse(job.profile, headers={
+        "Content-Disposition": f'attachment; filename="{job_id}.trace.json"'})
+
+
+@app.get("/jobs/{job_id}/export")
+async def export_job(job_id: str,
+                     format: str = Query(..., pattern="^(" + "|".join(WRITERS) + ")$")):
+    """
+    Stream a processed job as markdown, text, hOCR, ALTO XML or a
+    text-only searchable PDF (page images are not kept with jobs)
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return _export_response(iter(job.pages), format, job.filename)
+
+
+@app.get("/jobs/{job_id}/pages/{page_number}")
+async def get_job_page(job_id: str, page_number: int):
+    """
+    Full OCR result of one page of a processed job
+    """
+    return _get_job_page(job_id, page_number).to_dict()
+
+
+@app.get("/jobs/{job_id}/pages/{page_number}/region")
+async def get_job_page_region(job_id: str, page_number: int,
+                              bbox: str = Query(..., description="x1,y1,x2,y2"),
+                              space: str = Query("page", pattern="^(page|image)$"),
+                              mode: str = Query("center", pattern="^(center|intersect|inside)$")):
+    """
+    Arranged text and boxes inside a rectangle of one page.
+
+    Coordinates are in the original page space by default (``space=page``)
+    or in the preprocessed image space (``space=image``).
+    """
+    try:
+        rect = [float(v) for v in bbox.split(',')]
+        if len(rect) != 4:
+            raise ValueError
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="bbox must be four comma-separated numbers: x1,y1,x2,y2")
+
+    page = _get_job_page(job_id, page_number)
+    region = query_region(page, rect, space=space, mode=mode)
+
+    return {
+        "job_id": job_id,
+        "page_number": page_number,
+        "bbox": rect,
+        "space": space,
+        **region.to_dict()
+    }
+
+
+@app.post("/templates")
+async def register_template(template: Dict[str, Any] = Body(...)):
+    """
+    Register (or replace) a form template: named fields in normalized page
+    coordinates plus optional anchor texts (see ``ocr.templates``)
+    """
+    try:
+        form = FormTemplate.from_dict(template)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid template: {e}")
+    return get_template_store().register(form).to_dict()
+
+
+@app.get("/templates")
+async def list_templates():
+    """
+    Registered form templates
+    """
+    return {"templates": [t.to_dict() for t in get_template_store().list()]}
+
+
+@app.get("/templates/{name}")
+async def get_template(name: str):
+    """
+    One registered form template
+    """
+    return _get_template(name).to_dict()
+
+
+@app.delete("/templates/{name}")
+async def delete_template(name: str):
+    """
+    Remove a form template
+    """
+    if not get_template_store().remove(name):
+        raise HTTPException(status_code=404, detail=f"Template not found: {name}")
+    return {"deleted": name}
+
+
+def _get_result_store():
+    store = get_result_store()
+    if store is None:
+        raise HTTPException(
+            status_code=404, detail="Result store is disabled (OCR_RESULT_STORE=off)")
+    return store
+
+
+@app.post("/tasks", status_code=202)
+async def enqueue_task(file: UploadFile = File(...),
+                       dpi: str = Query("300", pattern="^(auto|[0-9]+)$"),
+                       orientation: str = Query(os.environ.get("OCR_ORIENTATION", "page"),
+                                                pattern="^(page|document)$"),
+                       max_attempts: int = Query(3, ge=1, le=10),
+                       allow_downgrade: bool = False):
+    """
+    Queue a file for OCR by a standalone worker (``worker.py``) and return at once.
+
+    The upload goes to the shared task queue (``OCR_TASK_QUEUE``); poll
+    ``/tasks/{task_id}`` for its status and, once ``done``, its results.
+    This node loads no models. Failed attempts are retried with backoff up
+    to ``max_attempts`` times.
+
+    The upload size and DPI limits of ``/process/document`` are checked
+    here (``allow_downgrade=true`` renders at ``OCR_MAX_DPI`` instead); the
+    page limit is checked by the worker, which fails the task without retries.
+    """
+    queue = get_task_queue()
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Task queue is off (OCR_TASK_QUEUE)")
+    try:
+        contents = await file.read()
+        check_upload(len(contents))
+        render_dpi = check_dpi(parse_dpi(dpi), allow_downgrade)
+    except AdmissionError as e:
+        raise _admission_error(e)
+
+    kind = 'image' if file.content_type and file.content_type.startswith('image/') else 'document'
+    payload = {"filename": file.filename, "dpi": render_dpi, "orientation": orientation}
+    task_id = queue.enqueue(kind, payload, data=contents, max_attempts=max_attempts)
+    return {
+        "task_id": task_id,
+        "kind": kind,
+        "status": "queued",
+        "sha256": hashlib.sha256(contents).hexdigest(),
+        "status_url": f"/tasks/{task_id}",
+    }
+
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    """Status of a queued task, with its OCR results once it is done."""
+    queue = get_task_queue()
+    task = queue.get(task_id) if queue is not None else None
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+    response = task.summary()
+    if task.result is not None:
+        response["result"] = task.result
+    return response
+
+
+@app.get("/search")
+async def search(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=200)):
+    """
+    Full-text search over stored results: matching documents and pages, with
+    the matching lines and their boxes in original page coordinates
+    """
+    return _get_result_store().search(q, limit=limit)
+
+
+@app.get("/documents/{sha256}")
+async def get_document(sha256: str):
+    """
+    Stored document by content hash
+    """
+    document = _get_result_store().document(sha256)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Document not found: {sha256}")
+    return document
+
+
+@app.get("/documents/{sha256}/pages/{page_number}")
+async def get_document_page(sha256: str, page_number: int):
+    """
+    Stored OCR result of one page of a document
+    """
+    page = _get_result_store().page(sha256, page_number)
+    if page is None:
+        raise HTTPException(
+            status_code=404, detail=f"Page {page_number} not found in document {sha256}")
+    return page.to_dict()
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Operational metrics: model memory, recognition cache, pipeline stage
+    occupancy, the request memory budget and the task queue backlog
+    """
+    registry_stats = get_registry().stats()
+    store = get_result_store()
+    queue = get_task_queue()
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "models": {
+            "resident": len(registry_stats['models']),
+            "memory_used_mb": registry_stats['memory_used_mb'],
+            "memory_budget_mb": registry_stats['memory_budget_mb'],
+        },
+        "recognition_cache": {
+            "mode": cache_mode(),
+            "global": get_global_cache().stats(),
+        },
+        "pipeline": pipeline_stats(),
+        "result_store": store.stats() if store is not None else None,
+        "admission": get_memory_budget().stats(),
+        "task_queue": queue.stats() if queue is not None else None,
     }
 
 
+@app.get("/models")
+async def models():
+    """
+    Resident OCR models, their approximate memory and recent load/evict events
+    """
+    return get_registry().stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
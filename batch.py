@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Bulk OCR of a document corpus with parallel workers.
+
+Inputs are files and directories (walked recursively) and/or a file list.
+Every document's status is recorded in a SQLite manifest, so an interrupted
+run picks up where it stopped when started again with the same manifest.
+
+Output is content-addressed: a document with SHA-256 ``abcd...`` is written
+to ``<output>/ab/abcd.../`` (``result.json`` plus one file per export
+format), so identical files are processed once and names never collide.
+Results are also saved to a searchable result store (``ocr.store``,
+``<output>/results.sqlite`` by default).
+
+Usage:
+    python batch.py archive/ --workers 4 --output corpus_out
+    python batch.py --list files.txt --formats md alto --manifest run.sqlite
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, List
+
+from utils.ingest import SUPPORTED_EXTENSIONS, parse_dpi
+from utils.manifest import Manifest
+
+
+def load_results(output_dir: str):
+    """Source path and PageResults of a finished document directory."""
+    from ocr.result import PageResult
+    with open(os.path.join(output_dir, 'result.json'), encoding='utf-8') as f:
+        data = json.load(f)
+    return data['source'], [PageResult.from_dict(page) for page in data['results']]
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_dir(output_root: str, sha256: str) -> str:
+    return os.path.join(output_root, sha256[:2], sha256)
+
+
+def iter_inputs(inputs: Iterable[str], list_file: str = None) -> Iterator[str]:
+    """Absolute paths of supported documents under ``inputs`` and in ``list_file``."""
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        yield os.path.abspath(os.path.join(root, name))
+        else:
+            yield os.path.abspath(item)
+
+    if list_file:
+        with (sys.stdin if list_file == '-' else open(list_file, encoding='utf-8')) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield os.path.abspath(line)
+
+
+def _init_worker(counter, workers: int):
+    with counter.get_lock():
+        worker_index = counter.value
+        counter.value += 1
+
+    from ocr.device import configure_worker
+    configure_worker(worker_index=worker_index, workers=workers)
+
+
+def process_document(path: str, output_root: str, formats: List[str], dpi: int,
+                     profile: bool = False, store_path: str = None) -> dict:
+    """
+    OCR one document into its content-addressed directory (runs in a worker).
+
+    Results are written to a temporary directory and renamed into place, so
+    a directory holding ``result.json`` is always complete. With ``profile``
+    a Chrome trace of the stages is written next to it as ``trace.json``.
+    Pages already in the result store at ``store_path`` (only read here) are
+    not recognized again. Page orientation follows ``$OCR_ORIENTATION``.
+    """
+    from ocr.export import WRITERS, create_writer
+    from ocr.orientation import document_orientation
+    from ocr.pipeline import ocr_pages
+    from ocr.rec_cache import document_cache
+    from ocr.result import pages_to_dicts
+    from ocr.store import ResultStore
+    from utils.ingest import DocumentSource
+    from utils.profiling import profile_session, stage
+
+    started = time.perf_counter()
+    sha256 = file_sha256(path)
+    out_dir = content_dir(output_root, sha256)
+    result_path = os.path.join(out_dir, 'result.json')
+
+    # Same content already processed (duplicate file or earlier run)
+    if os.path.exists(result_path):
+        with open(result_path, encoding='utf-8') as f:
+            total_pages = json.load(f)['total_pages']
+        return {'path': path, 'sha256': sha256, 'pages': total_pages, 'output_dir': out_dir,
+                'reused': True, 'seconds': time.perf_counter() - started}
+
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    store = ResultStore(store_path) if store_path else None
+    try:
+        with profile_session(profile) as profiler:
+            os.makedirs(tmp_dir, exist_ok=True)
+            title = os.path.splitext(os.path.basename(path))[0]
+            files, writers = [], []
+            try:
+                for fmt in formats:
+                    f = open(os.path.join(tmp_dir, f"document.{WRITERS[fmt].extension}"), 'wb')
+                    files.append(f)
+                    writers.append(create_writer(fmt, f, title=title))
+
+                # Pages are exported as they leave the pipeline; only the
+                # (small) page results are kept for result.json
+                pages = []
+                orientation = document_orientation()
+                with DocumentSource(path, dpi=dpi) as source, document_cache():
+                    for writer in writers:
+                        writer.begin()
+                    for page, image in ocr_pages(source=source, store=store,
+                                                 orientation=orientation):
+                        pages.append(page)
+                        for writer in writers:
+                            writer.write_page(page, image)
+                    for writer in writers:
+                        writer.end()
+            finally:
+                for f in files:
+                    f.close()
+
+            with stage("serialize"), \
+                    open(os.path.join(tmp_dir, 'result.json'), 'w', encoding='utf-8') as f:
+                json.dump({'source': path, 'sha256': sha256, 'total_pages': len(pages),
+                           'render_dpi': source.page_dpi,
+                           'orientation': orientation.stats() if orientation else None,
+                           'results': pages_to_dicts(pages)}, f, ensure_ascii=False)
+        if profiler is not None:
+            profiler.write_chrome_trace(os.path.join(tmp_dir, 'trace.json'))
+        try:
+            os.rename(tmp_dir, out_dir)
+        except OSError:
+            # Another worker finished the same content first
+            if not os.path.exists(result_path):
+                raise
+    finally:
+        if store is not None:
+            store.close()
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+
+    return {'path': path, 'sha256': sha256, 'pages': len(pages), 'output_dir': out_dir,
+            'reused': False, 'reused_pages': sum(page.reused for page in pages),
+            'seconds': time.perf_counter() - started}
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class Progress:
+    """Throughput and ETA for documents finished in this run."""
+
+    def __init__(self, total: int, already_done: int, interval: float):
+        self.total = total
+        self.already_done = already_done
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.pages = 0
+        self.started = time.perf_counter()
+        self._last_report = 0.0
+
+    def update(self, pages: int = 0, failed: bool = False):
+        self.done += 1
+        self.failed += failed
+        self.pages += pages
+
+    def line(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        docs_rate = self.done / elapsed
+        remaining = self.total - self.already_done - self.done
+        eta = _format_duration(remaining / docs_rate) if docs_rate else "?"
+        return (f"[{self.already_done + self.done}/{self.total}] "
+                f"{docs_rate * 60:.1f} docs/min, {self.pages / elapsed:.2f} pages/s, "
+                f"{self.failed} failed, ETA {eta}")
+
+    def maybe_report(self, force: bool = False):
+        now = time.perf_counter()
+        if force or now - self._last_report >= self.interval:
+            self._last_report = now
+            print(self.line(), file=sys.stderr, flush=True)
+
+
+def run_batch(manifest: Manifest, output_root: str, workers: int, formats: List[str],
+              dpi: int, progress_interval: float = 10.0, profile: bool = False,
+              store=None) -> dict:
+    """
+    Process every pending document in ``manifest``.
+
+    Finished documents are added to ``store`` (an ``ocr.store.ResultStore``)
+    by this process, unless it already holds their content hash.
+    """
+    counts = manifest.counts()
+    total = sum(counts.values())
+    progress = Progress(total=total, already_done=total - counts['pending'],
+                        interval=progress_interval)
+    os.makedirs(output_root, exist_ok=True)
+
+    ctx = mp.get_context("spawn")
+    counter = ctx.Value("i", 0)
+    pending = manifest.pending()
+    in_flight = {}
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(counter, workers)) as pool:
+        def submit_next() -> bool:
+            path = next(pending, None)
+            if path is None:
+                return False
+            manifest.mark_running(path)
+            in_flight[pool.submit(process_document, path, output_root, formats, dpi, profile,
+                                  store.path if store is not None else None)] = path
+            return True
+
+        # Keep a couple of documents queued per worker, not the whole corpus
+        while len(in_flight) < workers * 2 and submit_next():
+            pass
+
+        while in_flight:
+            finished, _ = wait(in_flight, timeout=progress_interval,
+                               return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    manifest.mark_failed(path, f"{type(e).__name__}: {e}")
+                    progress.update(failed=True)
+                else:
+                    manifest.mark_done(path, result['sha256'], result['pages'],
+                                       result['output_dir'], result['seconds'])
+                    if store is not None and not store.has(result['sha256']):
+                        source, pages = load_results(result['output_dir'])
+                        store.save(result['sha256'], os.path.basename(source), pages)
+                    progress.update(pages=0 if result['reused']
+                                    else result['pages'] - result.get('reused_pages', 0))
+                submit_next()
+            progress.maybe_report()
+
+    progress.maybe_report(force=True)
+    return manifest.counts()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="OCR a corpus of documents with parallel workers and a resumable manifest")
+    parser.add_argument("inputs", nargs="*", help="Documents or directories to process")
+    parser.add_argument("--list", dest="list_file",
+                        help="File with one document path per line ('-' for stdin)")
+    parser.add_argument("--output", default="output",
+                        help="Root of the content-addressed output tree (default: output)")
+    parser.add_argument("--manifest", default=None,
+                        help="SQLite manifest (default: <output>/manifest.sqlite)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes (default: half the cores)")
+    parser.add_argument("--formats", nargs="*", default=["md"],
+                        help="Export formats written next to result.json (default: md)")
+    parser.add_argument("--dpi", type=parse_dpi, default=300,
+                        help="DPI for document rasterization, or 'auto' to pick it per page "
+                             "from the text size (default: 300)")
+    parser.add_argument("--store", default=None,
+                        help="Searchable result store (default: <output>/results.sqlite; "
+                             "'off' to disable)")
+    parser.add_argument("--orientation", choices=("page", "document"), default=None,
+                        help="Classify orientation per page or once per document "
+                             "(default: $OCR_ORIENTATION or page)")
+    parser.add_argument("--engine", default=None,
+                        help="OCR engine for the workers (default: $OCR_ENGINE or paddle)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a Chrome trace of each document's stages (trace.json)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Process documents that failed in earlier runs again")
+    parser.add_argument("--progress-interval", type=float, default=10.0,
+                        help="Seconds between progress lines (default: 10)")
+    args = parser.parse_args()
+
+    from ocr.export import WRITERS
+    unknown = [fmt for fmt in args.formats if fmt not in WRITERS]
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(unknown)} (choose from {', '.join(WRITERS)})")
+    if not args.inputs and not args.list_file:
+        parser.error("give documents/directories to process or --list")
+
+    if args.engine:
+        # Inherited by the spawned workers
+        os.environ["OCR_ENGINE"] = args.engine
+    if args.orientation:
+        os.environ["OCR_ORIENTATION"] = args.orientation
+    os.environ["OCR_WORKERS"] = str(args.workers)
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.output, "manifest.sqlite")
+
+    with Manifest(manifest_path) as manifest:
+        added = manifest.add(iter_inputs(args.inputs, args.list_file))
+        recovered = manifest.recover(retry_failed=args.retry_failed)
+        counts = manifest.counts()
+        print(f"Manifest {manifest_path}: {added} new, {recovered} resumed, "
+              f"{counts['pending']} pending, {counts['done']} done, {counts['failed']} failed",
+              file=sys.stderr)
+
+        store = None
+        if args.store != "off":
+            from ocr.store import ResultStore
+            store = ResultStore(args.store or os.path.join(args.output, "results.sqlite"))
+        try:
+            counts = run_batch(manifest, args.output, args.workers, args.formats,
+                               args.dpi, args.progress_interval, args.profile, store)
+        finally:
+            if store is not None:
+                store.close()
+
+    print(json.dumps(counts))
+    if counts['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
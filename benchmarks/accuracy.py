@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Accuracy versus speed of OCR configurations on a synthetic corpus.
+
+Runs every configuration over the pages written by ``benchmarks.corpus``
+and reports, next to throughput:
+
+- CER / WER: character and word edit distance of the page's
+  ``arranged_text`` to the ground truth in reading order, over the number of
+  reference characters / words (whitespace is normalized first);
+- order: how much of the reading order survives, as the longest run of
+  ground-truth lines found in increasing order, over the lines found;
+- found: the fraction of ground-truth lines hit by at least one box.
+
+A configuration is ``name:key=value,...`` with keys ``engine``
+(``OCR_ENGINE`` name), ``dpi`` (pages are downsampled from the corpus DPI,
+as if rasterized at that DPI), ``max_dimension`` (``preprocess_for_ocr``)
+and ``line_threshold`` (``ocr.layout``). Throughput covers resampling,
+preprocessing, inference and layout; the first page of each configuration
+is run once untimed to load the models.
+
+Usage:
+    python -m benchmarks.corpus --output corpus --pages 30 --columns 1 2 3 --skew 2
+    python -m benchmarks.accuracy corpus --config base: \\
+        --config small:max_dimension=768 --config dpi200:dpi=200 --json accuracy.json
+"""
+
+import argparse
+import bisect
+import json
+import os
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+from PIL import Image
+
+CONFIG_KEYS = {'engine': str, 'dpi': int, 'max_dimension': int, 'line_threshold': float}
+DEFAULT_CONFIGS = ("base:", "small:max_dimension=768", "large:max_dimension=1536",
+                   "dpi200:dpi=200")
+
+
+def parse_config(spec: str) -> Dict[str, Any]:
+    """``name:key=value,...`` -> {'name': ..., key: value}."""
+    name, _, settings = spec.partition(":")
+    config = {'name': name or "base"}
+    for item in filter(None, settings.split(",")):
+        key, _, value = item.partition("=")
+        if key not in CONFIG_KEYS:
+            raise ValueError(f"Unknown setting {key!r} (expected one of {', '.join(CONFIG_KEYS)})")
+        config[key] = CONFIG_KEYS[key](value)
+    return config
+
+
+def edit_distance(a: Sequence, b: Sequence) -> int:
+    """Levenshtein distance between two sequences of integers."""
+    a, b = np.asarray(a), np.asarray(b)
+    if not len(a) or not len(b):
+        return max(len(a), len(b))
+    ramp = np.arange(len(b) + 1)
+    previous = ramp.copy()
+    for symbol in a:
+        current = np.empty_like(previous)
+        current[0] = previous[0] + 1
+        # Substitution or deletion, one row at a time ...
+        current[1:] = np.minimum(previous[:-1] + (b != symbol), previous[1:] + 1)
+        # ... then insertions, as a running minimum along the row
+        previous = np.minimum.accumulate(current - ramp) + ramp
+    return int(previous[-1])
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def char_errors(reference: str, hypothesis: str):
+    """(edits, reference characters) on whitespace-normalized text."""
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+
+    def codes(text):
+        return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+    return edit_distance(codes(reference), codes(hypothesis)), len(reference)
+
+
+def word_errors(reference: str, hypothesis: str):
+    """(edits, reference words)."""
+    vocabulary: Dict[str, int] = {}
+    ref = [vocabulary.setdefault(w, len(vocabulary)) for w in reference.split()]
+    hyp = [vocabulary.setdefault(w, len(vocabulary)) for w in hypothesis.split()]
+    return edit_distance(ref, hyp), len(ref)
+
+
+def longest_increasing(sequence: Sequence[int]) -> int:
+    tails: List[int] = []
+    for value in sequence:
+        i = bisect.bisect_left(tails, value)
+        tails[i:i + 1] = [value]
+    return len(tails)
+
+
+def reading_order(boxes: np.ndarray, order: np.ndarray, truth_boxes: np.ndarray):
+    """
+    Reading-order score of predicted ``boxes`` read in ``order``.
+
+    Each predicted box is matched to the ground-truth line containing its
+    centre. Returns (order score, fraction of ground-truth lines found).
+    """
+    if not len(truth_boxes):
+        return 1.0, 1.0
+    if not len(boxes):
+        return 0.0, 0.0
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    tx1, ty1, tx2, ty2 = (truth_boxes[:, i][None, :] for i in range(4))
+    inside = ((cx[:, None] >= tx1) & (cx[:, None] <= tx2)
+              & (cy[:, None] >= ty1) & (cy[:, None] <= ty2))
+    # Smallest containing line wins (table cells sit inside nothing else,
+    # but rotated boxes of neighbouring lines overlap)
+    area = ((tx2 - tx1) * (ty2 - ty1)).astype(np.float64)
+    matched = np.where(inside, area, np.inf).argmin(axis=1)
+    matched[~inside.any(axis=1)] = -1
+
+    sequence, seen = [], set()
+    for i in order.tolist():
+        line = int(matched[i])
+        if line >= 0 and line not in seen:
+            seen.add(line)
+            sequence.append(line)
+    if not sequence:
+        return 0.0, 0.0
+    return longest_increasing(sequence) / len(sequence), len(sequence) / len(truth_boxes)
+
+
+def load_corpus(corpus_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(corpus_dir, "corpus.json"), encoding="utf-8") as f:
+        index = json.load(f)
+    for page in index['pages']:
+        with open(os.path.join(corpus_dir, page['truth']), encoding="utf-8") as f:
+            page['ground_truth'] = json.load(f)
+    return index
+
+
+def run_config(config: Dict[str, Any], corpus_dir: str, index: Dict[str, Any],
+               keep_pages: bool = False) -> Dict[str, Any]:
+    """Score one configuration on every page of the corpus."""
+    from ocr.engine import get_engine
+    from ocr.layout import analyze_layout, arrange_text
+    from utils.preprocess import preprocess_for_ocr
+
+    engine = get_engine(config.get('engine'))
+    corpus_dpi = index['dpi']
+    dpi = min(config.get('dpi', corpus_dpi), corpus_dpi)
+    max_dimension = config.get('max_dimension')
+    line_threshold = config.get('line_threshold')
+
+    def ocr(image: Image.Image):
+        if dpi != corpus_dpi:
+            scale = dpi / corpus_dpi
+            image = image.resize((round(image.width * scale), round(image.height * scale)),
+                                 Image.LANCZOS)
+        preprocessed = preprocess_for_ocr(image, max_dimension)
+        page = engine.predict(preprocessed)
+        text = arrange_text(page.texts, page.boxes, line_threshold)
+        return page, text, preprocessed.shape
+
+    totals = {'char_edits': 0, 'chars': 0, 'word_edits': 0, 'words': 0}
+    orders, found, pages, seconds = [], [], [], 0.0
+    for n, entry in enumerate(index['pages']):
+        image = Image.open(os.path.join(corpus_dir, entry['image'])).convert("RGB")
+        if n == 0:
+            ocr(image)  # warm-up
+        started = time.perf_counter()
+        page, text, shape = ocr(image)
+        seconds += time.perf_counter() - started
+
+        truth = entry['ground_truth']
+        char_edits, chars = char_errors(truth['text'], text)
+        word_edits, words = word_errors(truth['text'], text)
+        totals['char_edits'] += char_edits
+        totals['chars'] += chars
+        totals['word_edits'] += word_edits
+        totals['words'] += words
+
+        # Boxes back to corpus pixels for matching against the ground truth
+        sx, sy = truth['size'][0] / shape[1], truth['size'][1] / shape[0]
+        boxes = page.boxes * [sx, sy, sx, sy]
+        order = (analyze_layout(page.boxes, line_threshold).order if len(page)
+                 else np.zeros(0, dtype=int))
+        page_order, page_found = reading_order(
+            boxes, order, np.array([line['box'] for line in truth['lines']]))
+        orders.append(page_order)
+        found.append(page_found)
+        if keep_pages:
+            pages.append({'id': entry['id'], 'cer': round(char_edits / max(chars, 1), 4),
+                          'wer': round(word_edits / max(words, 1), 4),
+                          'order': round(page_order, 4), 'found': round(page_found, 4)})
+
+    count = len(index['pages'])
+    result = {
+        'config': config,
+        'pages': count,
+        'seconds': round(seconds, 3),
+        'pages_per_second': round(count / seconds, 3) if seconds else 0.0,
+        'ms_per_page': round(seconds / count * 1000, 1) if count else 0.0,
+        'cer': round(totals['char_edits'] / max(totals['chars'], 1), 4),
+        'wer': round(totals['word_edits'] / max(totals['words'], 1), 4),
+        'order': round(float(np.mean(orders)), 4) if orders else 0.0,
+        'found': round(float(np.mean(found)), 4) if found else 0.0,
+    }
+    if keep_pages:
+        result['per_page'] = pages
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR accuracy vs speed on a synthetic corpus")
+    parser.add_argument("corpus", help="Directory written by benchmarks.corpus")
+    parser.add_argument("--config", action="append", dest="configs",
+                        help="name:key=value,... (repeatable; keys: "
+                             f"{', '.join(CONFIG_KEYS)}; default: {' '.join(DEFAULT_CONFIGS)})")
+    parser.add_argument("--limit", type=int, default=0, help="Use only the first N pages")
+    parser.add_argument("--per-page", action="store_true",
+                        help="Include per-page scores in the JSON output")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    configs = [parse_config(spec) for spec in (args.configs or DEFAULT_CONFIGS)]
+    index = load_corpus(args.corpus)
+    if args.limit:
+        index['pages'] = index['pages'][:args.limit]
+
+    results = []
+    print(f"{len(index['pages'])} pages at {index['dpi']} DPI")
+    print(f"{'config':<16} {'pages/s':>8} {'ms/page':>8} {'CER':>7} {'WER':>7} "
+          f"{'order':>7} {'found':>7}")
+    for config in configs:
+        result = run_config(config, args.corpus, index, keep_pages=args.per_page)
+        results.append(result)
+        print(f"{config['name']:<16} {result['pages_per_second']:>8.2f} "
+              f"{result['ms_per_page']:>8.1f} {result['cer']:>7.2%} {result['wer']:>7.2%} "
+              f"{result['order']:>7.2%} {result['found']:>7.2%}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'corpus': args.corpus, 'dpi': index['dpi'], 'results': results},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic OCR corpus with known text.
+
+Each page is rendered with PIL at the corpus DPI: a title, an optional ruled
+table and body text in one to three columns, in a random font and size,
+then degraded with skew, blur and noise. Next to every ``page_NNNN.png``
+goes a ``page_NNNN.json`` with the ground truth: every line's text and box
+(in page pixels) in reading order (title, table row by row, then the
+columns), plus the parameters the page was drawn with. ``corpus.json``
+lists the pages. ``benchmarks.accuracy`` scores OCR configurations on it.
+
+Usage:
+    python -m benchmarks.corpus --output corpus --pages 50 --columns 1 2 3 \\
+        --table-prob 0.3 --skew 2 --blur 1.0 --noise 12
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+WORDS = (
+    "the of and to in is for on that by with as at from this are be or an "
+    "will which it not have has all can more other new page data report total "
+    "amount invoice date number account customer service order payment due "
+    "balance period item quantity price tax net gross summary section table "
+    "figure results analysis method sample value average annual quarter "
+    "revenue cost margin growth region market product policy claim address "
+    "company limited office street city state contact email phone reference "
+    "description notes approved signed received issued review process system "
+    "document record file version update status final draft general terms "
+    "conditions agreement between parties shall provide within days following"
+).split()
+
+FONT_DIRS = ("/usr/share/fonts", "/usr/local/share/fonts", "~/.fonts",
+             "/Library/Fonts", "/System/Library/Fonts", "C:/Windows/Fonts")
+
+
+def find_fonts() -> List[str]:
+    """TrueType/OpenType fonts installed on this machine."""
+    fonts = []
+    for directory in FONT_DIRS:
+        directory = os.path.expanduser(directory)
+        for pattern in ("**/*.ttf", "**/*.otf"):
+            fonts += glob.glob(os.path.join(directory, pattern), recursive=True)
+    return sorted(set(fonts))
+
+
+def load_font(path: str, size: int) -> ImageFont.ImageFont:
+    return ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+
+
+def random_word(rng: np.random.Generator) -> str:
+    kind = rng.random()
+    if kind < 0.06:
+        return f"{rng.integers(1, 10000):,}"
+    if kind < 0.09:
+        return f"${rng.integers(1, 100000) / 100:,.2f}"
+    if kind < 0.11:
+        return f"{rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}/{rng.integers(1990, 2030)}"
+    return str(rng.choice(WORDS))
+
+
+def random_sentence(rng: np.random.Generator) -> List[str]:
+    words = [random_word(rng) for _ in range(rng.integers(5, 16))]
+    words[0] = words[0].capitalize()
+    words[-1] += "." if rng.random() < 0.85 else ","
+    return words
+
+
+def wrap_words(words: Sequence[str], font, width: float) -> List[str]:
+    """Greedy word wrap of ``words`` into lines no wider than ``width``."""
+    lines, current = [], []
+    for word in words:
+        candidate = " ".join(current + [word])
+        if current and font.getlength(candidate) > width:
+            lines.append(" ".join(current))
+            current = [word]
+        else:
+            current.append(word)
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+class PageCanvas:
+    """A white page and the ground-truth lines drawn on it, in reading order."""
+
+    def __init__(self, width: int, height: int):
+        self.image = Image.new("RGB", (width, height), "white")
+        self.draw = ImageDraw.Draw(self.image)
+        self.lines: List[Dict[str, Any]] = []
+
+    def text(self, x: float, y: float, text: str, font, block: str):
+        self.draw.text((x, y), text, font=font, fill=(0, 0, 0))
+        x1, y1, x2, y2 = self.draw.textbbox((x, y), text, font=font)
+        self.lines.append({'text': text, 'box': [int(x1), int(y1), int(x2), int(y2)],
+                           'block': block})
+
+
+def draw_table(canvas: PageCanvas, rng: np.random.Generator, font, x: float, y: float,
+               width: float, size: int) -> float:
+    """Ruled table of short cells; returns the y below it."""
+    rows, columns = int(rng.integers(3, 7)), int(rng.integers(3, 5))
+    cell_width = width / columns
+    row_height = size * 2.0
+    for row in range(rows):
+        top = y + row * row_height
+        for column in range(columns):
+            if row == 0:
+                cell = str(rng.choice(WORDS)).capitalize()
+            elif column == 0:
+                cell = " ".join(str(w) for w in rng.choice(WORDS, 2)).capitalize()
+            else:
+                cell = random_word(rng) if rng.random() < 0.5 else f"{rng.integers(1, 1000)}"
+            canvas.text(x + column * cell_width + size * 0.4, top + size * 0.4, cell, font,
+                        f"table:{row}")
+    line_width = max(1, size // 12)
+    for row in range(rows + 1):
+        canvas.draw.line([(x, y + row * row_height), (x + width, y + row * row_height)],
+                         fill=(0, 0, 0), width=line_width)
+    for column in range(columns + 1):
+        canvas.draw.line([(x + column * cell_width, y), (x + column * cell_width,
+                                                          y + rows * row_height)],
+                         fill=(0, 0, 0), width=line_width)
+    return y + rows * row_height + size * 1.5
+
+
+def rotate_boxes(boxes: np.ndarray, angle: float, size: Tuple[int, int]) -> np.ndarray:
+    """Bounding boxes of ``boxes`` after ``Image.rotate(angle)`` about the page centre."""
+    cx, cy = size[0] / 2, size[1] / 2
+    theta = math.radians(angle)
+    cos, sin = math.cos(theta), math.sin(theta)
+    x1, y1, x2, y2 = boxes.T.astype(np.float64)
+    xs = np.stack([x1, x2, x2, x1], axis=1) - cx
+    ys = np.stack([y1, y1, y2, y2], axis=1) - cy
+    # Counter-clockwise on screen, with y pointing down
+    rx = xs * cos + ys * sin + cx
+    ry = -xs * sin + ys * cos + cy
+    return np.stack([rx.min(1), ry.min(1), rx.max(1), ry.max(1)], axis=1).round().astype(int)
+
+
+def degrade(image: Image.Image, rng: np.random.Generator, blur: float,
+            noise: float) -> Image.Image:
+    if blur > 0:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    if noise > 0:
+        pixels = np.asarray(image, dtype=np.float32)
+        pixels = pixels + rng.normal(0, noise, pixels.shape[:2])[..., None]
+        # Salt and pepper specks
+        specks = rng.random(pixels.shape[:2])
+        pixels[specks < 0.0005] = 0
+        pixels[specks > 0.9995] = 255
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return image
+
+
+def generate_page(rng: np.random.Generator, dpi: int = 300, fonts: Sequence[str] = (),
+                  columns: Sequence[int] = (1, 2), table_prob: float = 0.3,
+                  skew: float = 0.0, blur: float = 0.0,
+                  noise: float = 0.0) -> Tuple[Image.Image, Dict[str, Any]]:
+    """
+    Render one Letter-size page.
+
+    Args:
+        rng: Random generator (the page is a function of its state)
+        dpi: Render resolution
+        fonts: Font files to choose from (PIL's default font when empty)
+        columns: Column counts to choose from
+        table_prob: Probability of a table under the title
+        skew: Largest rotation in degrees (uniform in +-skew)
+        blur: Largest Gaussian blur radius in pixels at 300 DPI
+        noise: Largest Gaussian noise sigma (0-255 scale)
+
+    Returns:
+        (page image, ground truth)
+    """
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    margin = 0.75 * dpi
+    font_path = str(rng.choice(fonts)) if len(fonts) else None
+    body_pt = int(rng.choice([9, 10, 11, 12]))
+    size = max(8, round(body_pt * dpi / 72))
+    font = load_font(font_path, size)
+    title_font = load_font(font_path, round(size * rng.uniform(1.4, 1.9)))
+    n_columns = int(rng.choice(columns))
+
+    canvas = PageCanvas(width, height)
+    title = " ".join(random_sentence(rng)[:int(rng.integers(3, 7))]).rstrip(".,").title()
+    canvas.text(margin, margin, title, title_font, "title")
+    y = canvas.lines[-1]['box'][3] + size * 1.5
+
+    has_table = bool(rng.random() < table_prob)
+    if has_table:
+        y = draw_table(canvas, rng, font, margin, y, width - 2 * margin, size)
+
+    gutter = 0.3 * dpi
+    column_width = (width - 2 * margin - (n_columns - 1) * gutter) / n_columns
+    line_pitch = size * 1.35
+    bottom = height - margin
+    for column in range(n_columns):
+        x = margin + column * (column_width + gutter)
+        line_y = y
+        while line_y + line_pitch < bottom:
+            paragraph = sum((random_sentence(rng) for _ in range(rng.integers(2, 5))), [])
+            for line in wrap_words(paragraph, font, column_width):
+                if line_y + line_pitch >= bottom:
+                    break
+                canvas.text(x, line_y, line, font, f"column:{column}")
+                line_y += line_pitch
+            line_y += line_pitch * 0.8
+
+    image = canvas.image
+    boxes = np.array([line['box'] for line in canvas.lines])
+    angle = float(rng.uniform(-skew, skew)) if skew > 0 else 0.0
+    if angle:
+        image = image.rotate(angle, resample=Image.BICUBIC, fillcolor="white")
+        boxes = rotate_boxes(boxes, angle, image.size)
+    blur_radius = float(rng.uniform(0, blur)) * dpi / 300 if blur > 0 else 0.0
+    noise_sigma = float(rng.uniform(0, noise)) if noise > 0 else 0.0
+    image = degrade(image, rng, blur_radius, noise_sigma)
+
+    lines = [{'text': line['text'], 'box': [int(v) for v in box], 'block': line['block']}
+             for line, box in zip(canvas.lines, boxes)]
+    truth = {
+        'size': [width, height],
+        'dpi': dpi,
+        'text': "\n".join(line['text'] for line in lines),
+        'lines': lines,
+        'meta': {
+            'font': os.path.basename(font_path) if font_path else "default",
+            'font_pt': body_pt,
+            'columns': n_columns,
+            'table': has_table,
+            'skew': round(angle, 3),
+            'blur': round(blur_radius, 3),
+            'noise': round(noise_sigma, 3),
+        },
+    }
+    return image, truth
+
+
+def generate_corpus(output: str, pages: int, seed: int = 0, dpi: int = 300,
+                    fonts: Sequence[str] = None, **options) -> Dict[str, Any]:
+    """Write ``pages`` pages and their ground truth to ``output``; returns the index."""
+    os.makedirs(output, exist_ok=True)
+    fonts = find_fonts() if fonts is None else list(fonts)
+    index = {'dpi': dpi, 'seed': seed, 'options': options, 'pages': []}
+    for n in range(1, pages + 1):
+        # One generator per page: pages can be regenerated independently
+        rng = np.random.default_rng([seed, n])
+        image, truth = generate_page(rng, dpi=dpi, fonts=fonts, **options)
+        stem = f"page_{n:04d}"
+        image.save(os.path.join(output, f"{stem}.png"))
+        with open(os.path.join(output, f"{stem}.json"), 'w', encoding='utf-8') as f:
+            json.dump(truth, f, ensure_ascii=False)
+        index['pages'].append({'id': stem, 'image': f"{stem}.png", 'truth': f"{stem}.json",
+                               **truth['meta']})
+    with open(os.path.join(output, "corpus.json"), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic OCR corpus")
+    parser.add_argument("--output", default="corpus", help="Output directory")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dpi", type=int, default=300,
+                        help="Render DPI; the accuracy runner can only downsample from it")
+    parser.add_argument("--fonts", nargs="*", default=None,
+                        help="Font files (default: all fonts found on this machine)")
+    parser.add_argument("--columns", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--table-prob", type=float, default=0.3)
+    parser.add_argument("--skew", type=float, default=0.0,
+                        help="Largest rotation in degrees")
+    parser.add_argument("--blur", type=float, default=0.0,
+                        help="Largest Gaussian blur radius (pixels at 300 DPI)")
+    parser.add_argument("--noise", type=float, default=0.0,
+                        help="Largest Gaussian noise sigma (0-255)")
+    args = parser.parse_args()
+
+    index = generate_corpus(args.output, args.pages, seed=args.seed, dpi=args.dpi,
+                            fonts=args.fonts, columns=args.columns,
+                            table_prob=args.table_prob, skew=args.skew, blur=args.blur,
+                            noise=args.noise)
+    fonts = sorted({page['font'] for page in index['pages']})
+    print(f"{len(index['pages'])} pages at {args.dpi} DPI in {args.output} "
+          f"({len(fonts)} fonts)")
+
+
+if __name__ == "__main__":
+    main()
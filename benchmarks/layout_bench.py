@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark the reading-order engine on large synthetic pages.
+
+Generates multi-column pages with thousands of boxes and times
+``ocr.layout.arrange_text`` against the previous per-dict implementation
+of ``arrange_text_by_position`` (kept here as a reference).
+
+Usage:
+    python -m benchmarks.layout_bench --boxes 1000 5000 20000 --columns 3
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ocr.layout import arrange_text
+
+
+def synthetic_page(n_boxes: int, columns: int = 2, words_per_line: int = 4,
+                   seed: int = 0):
+    """
+    Texts and (N, 4) boxes for a page of ``columns`` text columns,
+    each line split into ``words_per_line`` word boxes.
+    """
+    rng = np.random.default_rng(seed)
+    lines = -(-n_boxes // words_per_line)
+    rows = -(-lines // columns)
+    line_height, pitch, column_width, gutter = 12, 18, 400, 60
+
+    boxes = []
+    for i in range(n_boxes):
+        line, word = divmod(i, words_per_line)
+        column, row = divmod(line, rows)
+        x = column * (column_width + gutter) + word * (column_width // words_per_line)
+        y = row * pitch + rng.integers(-2, 3)
+        boxes.append([x, y, x + column_width // words_per_line - 8, y + line_height])
+
+    texts = [f"w{i}" for i in range(n_boxes)]
+    order = rng.permutation(n_boxes)
+    return [texts[i] for i in order], np.array(boxes, dtype=np.int32)[order]
+
+
+def legacy_arrange(rec_texts, rec_boxes, y_threshold=15):
+    """The fixed-threshold, dict-per-item implementation this engine replaced."""
+    items = []
+    for text, box in zip(rec_texts, rec_boxes):
+        x1, y1, x2, y2 = box[:4]
+        items.append({'text': text, 'center_y': (y1 + y2) / 2,
+                      'center_x': (x1 + x2) / 2})
+    items.sort(key=lambda item: (item['center_y'], item['center_x']))
+
+    lines, current, current_y = [], [], None
+    for item in items:
+        if current_y is None or abs(item['center_y'] - current_y) <= y_threshold:
+            current.append(item)
+            current_y = item['center_y'] if current_y is None else current_y
+        else:
+            lines.append(sorted(current, key=lambda x: x['center_x']))
+            current, current_y = [item], item['center_y']
+    if current:
+        lines.append(sorted(current, key=lambda x: x['center_x']))
+    return '\n'.join(' '.join(i['text'] for i in line) for line in lines)
+
+
+def time_call(fn, *args, repeat: int = 5) -> float:
+    """Best-of-``repeat`` wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reading-order layout")
+    parser.add_argument("--boxes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--columns", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'boxes':>8} {'layout ms':>10} {'legacy ms':>10} {'speedup':>8}")
+    for n in args.boxes:
+        texts, boxes = synthetic_page(n, args.columns)
+        new_ms = time_call(arrange_text, texts, boxes, repeat=args.repeat)
+        old_ms = time_call(legacy_arrange, texts, boxes.tolist(), repeat=args.repeat)
+        print(f"{n:>8} {new_ms:>10.2f} {old_ms:>10.2f} {old_ms / new_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
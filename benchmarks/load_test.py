@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Load test the API with a mix of image, PDF and multi-file requests.
+
+Requests go to the FastAPI app in-process (default) or to a running server
+(``--url``). Arrivals are either closed-loop (``--concurrency`` clients
+sending back to back) or open-loop at ``--rate`` requests/sec with Poisson
+inter-arrival times, capped at ``--concurrency`` in flight. A replay file
+(JSONL with ``kind``, ``paths`` and optional ``at`` seconds) reproduces a
+recorded request stream instead.
+
+Reports latency percentiles, pages/sec, error rate and peak RSS (of this
+process in-process, or of ``--server-pid``), optionally as JSON, and can
+compare against an earlier JSON result to catch regressions.
+
+Usage:
+    OCR_ENGINE=stub python -m benchmarks.load_test --requests 200 --concurrency 8
+    python -m benchmarks.load_test --url http://localhost:8000 --rate 2 --duration 60 \\
+        --mix image=3,pdf=1,multiple=1 --json run.json --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.memory import current_rss
+
+ENDPOINTS = {
+    "image": "/process/image",
+    "pdf": "/process/document",
+    "multiple": "/process/multiple",
+}
+
+CONTENT_TYPES = {".pdf": "application/pdf", ".png": "image/png", ".jpg": "image/jpeg",
+                 ".jpeg": "image/jpeg", ".tiff": "image/tiff", ".bmp": "image/bmp"}
+
+
+def synthetic_payloads(image_path: str = None, pdf_path: str = None,
+                       pdf_pages: int = 3) -> Dict[str, tuple]:
+    """(filename, bytes, content type) for the image and PDF request kinds."""
+    from PIL import Image
+
+    if image_path:
+        with open(image_path, "rb") as f:
+            image = (os.path.basename(image_path), f.read(),
+                     CONTENT_TYPES.get(os.path.splitext(image_path)[1].lower(), "image/png"))
+        page = Image.open(io.BytesIO(image[1])).convert("RGB")
+    else:
+        rng = np.random.default_rng(0)
+        page = Image.fromarray((rng.random((1100, 850)) * 255).astype(np.uint8)).convert("RGB")
+        buffer = io.BytesIO()
+        page.save(buffer, format="PNG")
+        image = ("synthetic.png", buffer.getvalue(), "image/png")
+
+    if pdf_path:
+        with open(pdf_path, "rb") as f:
+            pdf = (os.path.basename(pdf_path), f.read(), "application/pdf")
+    else:
+        buffer = io.BytesIO()
+        page.save(buffer, format="PDF", save_all=True,
+                  append_images=[page] * (pdf_pages - 1), resolution=150)
+        pdf = ("synthetic.pdf", buffer.getvalue(), "application/pdf")
+
+    return {"image": image, "pdf": pdf}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ENDPOINTS:
+            raise ValueError(f"Unknown request kind: {kind} (expected {', '.join(ENDPOINTS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def _files_for(kind: str, payloads: Dict[str, tuple], paths: List[str] = None):
+    if paths:
+        items = []
+        for path in paths:
+            with open(path, "rb") as f:
+                items.append((os.path.basename(path), f.read(),
+                              CONTENT_TYPES.get(os.path.splitext(path)[1].lower(),
+                                                "application/octet-stream")))
+    elif kind == "multiple":
+        items = [payloads["image"], payloads["pdf"]]
+    else:
+        items = [payloads[kind]]
+    field = "files" if kind == "multiple" else "file"
+    return [(field, item) for item in items]
+
+
+def _pages_in(kind: str, body: dict) -> int:
+    if kind == "multiple":
+        return sum(r.get("total_pages", 0) for r in body.get("results", []) if r.get("success"))
+    return body.get("total_pages", 0)
+
+
+class RSSSampler:
+    """Samples RSS of this process (or ``pid``) in the background."""
+
+    def __init__(self, pid: int = None, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                self.peak = max(self.peak, current_rss(self.pid))
+            except Exception:
+                pass
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def _send(client, kind: str, files, timeout: float) -> dict:
+    started = time.perf_counter()
+    try:
+        response = await client.post(ENDPOINTS[kind], files=files, timeout=timeout)
+        latency = time.perf_counter() - started
+        ok = response.status_code == 200
+        pages = _pages_in(kind, response.json()) if ok else 0
+        return {"kind": kind, "latency": latency, "ok": ok, "pages": pages,
+                "status": response.status_code}
+    except Exception as e:
+        return {"kind": kind, "latency": time.perf_counter() - started, "ok": False,
+                "pages": 0, "status": None, "error": f"{type(e).__name__}: {e}"}
+
+
+def _schedule(args, mix: Dict[str, float]) -> List[dict]:
+    """Planned requests: kind, optional paths and arrival offset (None = closed loop)."""
+    if args.replay:
+        plan = []
+        with open(args.replay, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    plan.append({"kind": entry["kind"], "paths": entry.get("paths"),
+                                 "at": entry.get("at")})
+        return plan
+
+    rng = random.Random(args.seed)
+    kinds, weights = list(mix), list(mix.values())
+    plan = []
+    at = 0.0
+    while True:
+        if args.rate:
+            at += rng.expovariate(args.rate)
+            if args.duration and at > args.duration:
+                break
+        if not args.duration or not args.rate:
+            if len(plan) >= args.requests:
+                break
+        plan.append({"kind": rng.choices(kinds, weights)[0], "paths": None,
+                     "at": at if args.rate else None})
+    return plan
+
+
+async def run_load(args) -> dict:
+    import httpx
+
+    payloads = synthetic_payloads(args.image, args.pdf, args.pdf_pages)
+    plan = _schedule(args, parse_mix(args.mix))
+
+    if args.url:
+        transport, base_url = None, args.url.rstrip("/")
+        sampler = RSSSampler(pid=args.server_pid) if args.server_pid else None
+    else:
+        from api.main import app
+        transport, base_url = httpx.ASGITransport(app=app), "http://loadtest"
+        sampler = RSSSampler()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url) as client:
+        # Warm-up request so model loading is not measured
+        if args.warmup:
+            await _send(client, "image", _files_for("image", payloads), args.timeout)
+
+        if sampler:
+            sampler.start()
+        started = time.perf_counter()
+
+        async def one(item):
+            if item["at"] is not None:
+                delay = started + item["at"] - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            async with semaphore:
+                files = _files_for(item["kind"], payloads, item["paths"])
+                results.append(await _send(client, item["kind"], files, args.timeout))
+
+        if plan and plan[0]["at"] is None:
+            # Closed loop: ``concurrency`` clients pull from the plan
+            queue = list(reversed(plan))
+
+            async def client_loop():
+                while queue:
+                    await one(queue.pop())
+
+            await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+        else:
+            await asyncio.gather(*(one(item) for item in plan))
+
+        elapsed = time.perf_counter() - started
+        if sampler:
+            await sampler.stop()
+
+    return summarize(results, elapsed, sampler.peak if sampler else None, args)
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(latencies)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 4), "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4), "mean": round(float(values.mean()), 4),
+            "max": round(float(values.max()), 4)}
+
+
+def summarize(results: List[dict], elapsed: float, peak_rss: Optional[int], args) -> dict:
+    ok = [r for r in results if r["ok"]]
+    pages = sum(r["pages"] for r in ok)
+    by_kind = {}
+    for kind in sorted({r["kind"] for r in results}):
+        kind_results = [r for r in results if r["kind"] == kind]
+        by_kind[kind] = {
+            "requests": len(kind_results),
+            "errors": sum(1 for r in kind_results if not r["ok"]),
+            "latency": _percentiles([r["latency"] for r in kind_results if r["ok"]]),
+        }
+
+    errors = {}
+    for r in results:
+        if not r["ok"]:
+            key = r.get("error") or f"HTTP {r['status']}"
+            errors[key] = errors.get(key, 0) + 1
+
+    return {
+        "config": {
+            "target": args.url or "in-process",
+            "engine": os.environ.get("OCR_ENGINE", "paddle"),
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "mix": args.mix,
+            "replay": args.replay,
+        },
+        "requests": len(results),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(results) / elapsed, 3) if elapsed else 0.0,
+        "pages": pages,
+        "pages_per_sec": round(pages / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "latency": _percentiles([r["latency"] for r in ok]),
+        "by_kind": by_kind,
+        "peak_rss_mb": round(peak_rss / 1e6, 1) if peak_rss else None,
+    }
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Regressions of ``current`` against ``baseline`` beyond ``max_regression``."""
+    checks = [
+        ("latency p50", current["latency"]["p50"], baseline["latency"]["p50"], True),
+        ("latency p95", current["latency"]["p95"], baseline["latency"]["p95"], True),
+        ("latency p99", current["latency"]["p99"], baseline["latency"]["p99"], True),
+        ("pages/sec", current["pages_per_sec"], baseline["pages_per_sec"], False),
+        ("peak RSS", current["peak_rss_mb"], baseline["peak_rss_mb"], True),
+    ]
+    regressions = []
+    for name, now, before, lower_is_better in checks:
+        if not now or not before:
+            continue
+        change = (now - before) / before
+        worse = change > max_regression if lower_is_better else -change > max_regression
+        print(f"  {name:<12} {before:>10.3f} -> {now:>10.3f} ({change:+.1%})"
+              f"{'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(name)
+    if current["error_rate"] > baseline["error_rate"]:
+        regressions.append("error rate")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the OCR API and report latency, throughput and memory")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--server-pid", type=int,
+                        help="PID of the server process, for peak RSS with --url")
+    parser.add_argument("--requests", type=int, default=50,
+                        help="Requests to send (closed loop, or with --rate and no --duration)")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Maximum requests in flight (default: 4)")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Open-loop arrival rate in requests/sec (default: closed loop)")
+    parser.add_argument("--duration", type=float, default=0.0,
+                        help="With --rate, generate arrivals for this many seconds")
+    parser.add_argument("--mix", default="image=3,pdf=1,multiple=1",
+                        help="Request mix as kind=weight pairs (default: image=3,pdf=1,multiple=1)")
+    parser.add_argument("--replay", help="JSONL request stream to replay instead of --mix")
+    parser.add_argument("--image", help="Image to send (default: synthetic page)")
+    parser.add_argument("--pdf", help="PDF to send (default: synthetic, built from the image)")
+    parser.add_argument("--pdf-pages", type=int, default=3,
+                        help="Pages of the synthetic PDF (default: 3)")
+    parser.add_argument("--timeout", type=float, default=300.0,
+                        help="Per-request timeout in seconds")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false",
+                        help="Do not send an unmeasured warm-up request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Earlier JSON result to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative regression with --compare (default: 0.2)")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args))
+
+    latency = summary["latency"]
+    print(f"{summary['requests']} requests in {summary['seconds']:.1f}s "
+          f"({summary['requests_per_sec']:.2f} req/s, {summary['pages_per_sec']:.2f} pages/s), "
+          f"error rate {summary['error_rate']:.1%}")
+    if latency["p50"] is not None:
+        print(f"latency p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  "
+              f"p99 {latency['p99']:.3f}s  max {latency['max']:.3f}s")
+    for kind, stats in summary["by_kind"].items():
+        p95 = stats["latency"]["p95"]
+        print(f"  {kind:<9} {stats['requests']:>5} requests, {stats['errors']} errors, "
+              f"p95 {p95 if p95 is None else f'{p95:.3f}s'}")
+    if summary["peak_rss_mb"]:
+        print(f"peak RSS {summary['peak_rss_mb']:.1f} MB")
+    for error, count in summary["errors"].items():
+        print(f"  {count} x {error}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        regressions = compare(summary, baseline, args.max_regression)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Measure CPU throughput (pages/sec) for different workers x threads splits.
+
+Each combination starts ``workers`` fresh processes that configure their
+thread budget via ``ocr.device.configure_worker``, warm up the engine and
+then OCR the same page ``--pages`` times in total.
+
+Usage:
+    python -m benchmarks.sweep_threads demo_image.png --workers 1 2 4 --threads 1 2 4 8
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+
+def _init_worker(counter, workers: int, threads: int, pin: bool, image_path: str):
+    with counter.get_lock():
+        worker_index = counter.value
+        counter.value += 1
+
+    os.environ["OCR_DEVICE"] = "cpu"
+    from ocr.device import configure_worker
+    configure_worker(worker_index=worker_index, workers=workers,
+                     core_budget=workers * threads, pin=pin)
+
+    global _page, _engine
+    from ocr.engine import get_engine
+    from utils.preprocess import preprocess_for_ocr
+    _page = preprocess_for_ocr(Image.open(image_path))
+    _engine = get_engine()
+    # Warm-up: model load and first-run allocations are not measured
+    _engine.predict(_page)
+
+
+def _run_page(_):
+    _engine.predict(_page)
+    return 1
+
+
+def run_combination(image_path: str, workers: int, threads: int,
+                    pages: int, pin: bool) -> dict:
+    """Time ``pages`` predictions spread over ``workers`` processes."""
+    ctx = mp.get_context("spawn")
+    counter = ctx.Value("i", 0)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker,
+                             initargs=(counter, workers, threads, pin, image_path)) as pool:
+        # Make sure every worker has finished its warm-up before timing
+        list(pool.map(_run_page, range(workers)))
+        started = time.perf_counter()
+        done = sum(pool.map(_run_page, range(pages)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "workers": workers,
+        "threads": threads,
+        "cores": workers * threads,
+        "pages": done,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(done / elapsed, 3) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep workers x threads and report OCR pages/sec on this machine")
+    parser.add_argument("image", help="Page image to OCR repeatedly")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="Worker process counts to try")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4],
+                        help="Threads per worker to try")
+    parser.add_argument("--pages", type=int, default=20,
+                        help="Pages to process per combination (default: 20)")
+    parser.add_argument("--max-cores", type=int, default=os.cpu_count(),
+                        help="Skip combinations using more cores than this")
+    parser.add_argument("--pin", action="store_true",
+                        help="Pin each worker to its own cores")
+    parser.add_argument("--json", dest="json_path",
+                        help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'workers':>8} {'threads':>8} {'cores':>6} {'pages/s':>9} {'seconds':>8}")
+    for workers in args.workers:
+        for threads in args.threads:
+            if workers * threads > args.max_cores:
+                continue
+            result = run_combination(args.image, workers, threads,
+                                     args.pages, args.pin)
+            results.append(result)
+            print(f"{workers:>8} {threads:>8} {result['cores']:>6} "
+                  f"{result['pages_per_sec']:>9.2f} {result['seconds']:>8.2f}")
+
+    if results:
+        best = max(results, key=lambda r: r["pages_per_sec"])
+        print(f"\nBest: {best['workers']} workers x {best['threads']} threads "
+              f"= {best['pages_per_sec']:.2f} pages/sec")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
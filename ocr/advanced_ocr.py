@@ -1,22 +1,17 @@
-from paddleocr import PaddleOCR
+from ocr.engine import OCREngine, get_engine
+from ocr.layout import analyze_layout
+from ocr.result import PageResult
 import numpy as np
 from typing import List, Dict, Any
 import json
 
 
 class AdvancedOCR:
-    def __init__(self):
-        self.ocr = PaddleOCR(
-            use_doc_orientation_classify=True,
-            use_doc_unwarping=True,
-            use_textline_orientation=True,
-            lang="en",
-            # Use server models for better accuracy
-            text_detection_model_name="PP-OCRv5_server_det",
-            text_recognition_model_name="PP-OCRv5_server_rec",
-            # Enable GPU if available for better performance
-            device="gpu"  # Will fall back to CPU if GPU not available
-        )
+    def __init__(self, engine: OCREngine = None):
+        # Server models for better accuracy unless another engine is given.
+        # The loaded pipeline is shared through the model registry, so
+        # creating an AdvancedOCR is cheap.
+        self.engine = engine or get_engine('server')
 
     def process_image(self, image):
         """
@@ -38,21 +33,17 @@ class AdvancedOCR:
             img_array = (img_array * 255).astype(np.uint8)
 
         # Run OCR
-        result = self.ocr.predict(img_array)
-        return result
+        return self.engine.predict(img_array)
 
-    def create_structured_markdown(self, ocr_result, save_path="output"):
+    def create_structured_markdown(self, ocr_result: PageResult, save_path="output"):
         """
         Create well-structured markdown using text location and orientation information
         """
-        if not ocr_result:
+        if ocr_result is None:
             return None
 
-        # Get the first result (single image processing)
-        res = ocr_result[0]
-
         # Extract structured data
-        structured_data = self._extract_structured_data(res)
+        structured_data = self._extract_structured_data(ocr_result)
 
         # Generate markdown
         markdown_content = self._generate_markdown(structured_data)
@@ -69,7 +60,7 @@ class AdvancedOCR:
 
         return markdown_content
 
-    def _extract_structured_data(self, ocr_result):
+    def _extract_structured_data(self, ocr_result: PageResult):
         """
         Extract structured data from OCR result using location information
         """
@@ -81,76 +72,38 @@ class AdvancedOCR:
         }
 
         # Get text detection boxes and recognition results
-        rec_boxes = ocr_result.get('rec_boxes', [])
-        rec_texts = ocr_result.get('rec_texts', [])
-        rec_scores = ocr_result.get('rec_scores', [])
-
-        # Group text by Y-coordinate to identify lines
-        lines = {}
-        for i, (box, text, score) in enumerate(zip(rec_boxes, rec_texts, rec_scores)):
-            y_center = (box[1] + box[3]) / 2  # Average of y_min and y_max
-
-            # Find existing line or create new one
-            line_key = None
-            for existing_y in lines.keys():
-                if abs(existing_y - y_center) < 20:  # Tolerance for line grouping
-                    line_key = existing_y
-                    break
-
-            if line_key is None:
-                line_key = y_center
-                lines[line_key] = []
-
-            lines[line_key].append({
-                "text": text,
-                "score": float(score),
-                "box": box.tolist() if hasattr(box, 'tolist') else box,
-                "x_min": int(box[0]),
-                "x_max": int(box[2]),
-                "y_min": int(box[1]),
-                "y_max": int(box[3])
-            })
+        rec_boxes = ocr_result.boxes
+        rec_texts = ocr_result.texts
+        rec_scores = ocr_result.scores
+
+        # Reading order: columns, lines and paragraphs
+        layout = analyze_layout(rec_boxes)
 
-        # Sort lines by Y position and sort words within lines by X position
         sorted_lines = []
-        for y_pos in sorted(lines.keys()):
-            line_words = lines[y_pos]
-            sorted_words = sorted(line_words, key=lambda x: x['x_min'])
-            line_text = ' '.join([word['text'] for word in sorted_words])
+        for line in layout.lines():
+            words = [{
+                "text": rec_texts[i],
+                "score": float(rec_scores[i]),
+                "box": rec_boxes[i].tolist(),
+                "x_min": int(rec_boxes[i][0]),
+                "x_max": int(rec_boxes[i][2]),
+                "y_min": int(rec_boxes[i][1]),
+                "y_max": int(rec_boxes[i][3])
+            } for i in line]
 
             sorted_lines.append({
-                "y_position": y_pos,
-                "words": sorted_words,
-                "line_text": line_text,
-                "confidence": sum(word['score'] for word in sorted_words) / len(sorted_words) if sorted_words else 0
+                "y_position": float(np.mean((rec_boxes[line, 1] + rec_boxes[line, 3]) / 2)),
+                "words": words,
+                "line_text": ' '.join(word['text'] for word in words),
+                "confidence": float(np.mean(rec_scores[line]))
             })
 
-        # Group lines into paragraphs based on vertical spacing
         paragraphs = []
-        current_paragraph = []
-
-        for i, line in enumerate(sorted_lines):
-            if not current_paragraph:
-                current_paragraph.append(line)
-                continue
-
-            # Check vertical gap with previous line
-            prev_line = sorted_lines[i-1]
-            gap = line['y_position'] - prev_line['y_position']
-
-            if gap > 40:  # Large gap indicates new paragraph
-                paragraphs.append({
-                    "lines": current_paragraph,
-                    "paragraph_text": '\n'.join([l['line_text'] for l in current_paragraph])
-                })
-                current_paragraph = [line]
-            else:
-                current_paragraph.append(line)
-
-        if current_paragraph:
+        for line_numbers in layout.paragraphs():
+            paragraph_lines = [sorted_lines[n] for n in line_numbers]
             paragraphs.append({
-                "lines": current_paragraph,
-                "paragraph_text": '\n'.join([l['line_text'] for l in current_paragraph])
+                "lines": paragraph_lines,
+                "paragraph_text": '\n'.join([l['line_text'] for l in paragraph_lines])
             })
 
         structured_data['lines'] = sorted_lines
@@ -0,0 +1,132 @@
+"""
+Standalone text detectors.
+
+Detectors return text-line polygons without running recognition, for the
+split detection/recognition engine and detection-only requests. Paddle
+detectors are held by the model registry.
+
+The shared detector for detection-only requests is configured with
+``OCR_DET_MODEL`` (default PP-OCRv5 server det; ``stub`` for tests).
+"""
+import os
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+
+from ocr.device import resolve_device_kwargs
+from ocr.registry import get_registry
+from utils.profiling import stage
+
+SERVER_DET_MODEL = "PP-OCRv5_server_det"
+MOBILE_DET_MODEL = "PP-OCRv5_mobile_det"
+
+
+def polys_to_boxes(polys: np.ndarray) -> np.ndarray:
+    """(N, 4, 2) polygons to (N, 4) [x1, y1, x2, y2] bounding boxes."""
+    polys = np.asarray(polys).reshape(-1, 4, 2)
+    return np.concatenate([polys.min(axis=1), polys.max(axis=1)], axis=1)
+
+
+def boxes_to_polys(boxes: np.ndarray) -> np.ndarray:
+    """(N, 4) boxes to (N, 4, 2) clockwise polygons starting top-left."""
+    b = np.asarray(boxes).reshape(-1, 4)
+    return np.stack([b[:, [0, 1]], b[:, [2, 1]], b[:, [2, 3]], b[:, [0, 3]]], axis=1)
+
+
+def synthetic_line_boxes(height: int, width: int, n: int, columns: int,
+                         rng: np.random.Generator) -> np.ndarray:
+    """
+    Deterministic (N, 4) line boxes laid out in ``columns`` columns,
+    used by the stub engine and stub detector.
+    """
+    columns = max(1, columns)
+    rows_per_column = max(-(-n // columns), 1)
+    column_width = width / columns
+    row_height = height / rows_per_column
+    line_height = max(row_height * 0.6, 1.0)
+
+    index = np.arange(n)
+    column = index // rows_per_column
+    row = index % rows_per_column
+
+    x1 = column * column_width + column_width * 0.05
+    x2 = x1 + column_width * rng.uniform(0.4, 0.9, size=n)
+    y1 = row * row_height + (row_height - line_height) / 2
+    y2 = y1 + line_height
+    return np.stack([x1, y1, x2, y2], axis=1).round().astype(np.int32)
+
+
+class TextDetector:
+    """Base class for text-line detectors."""
+
+    name = "base"
+
+    def detect(self, image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Detect text lines on a page.
+
+        Returns:
+            ((N, 4, 2) int32 polygons, (N,) detection scores)
+        """
+        raise NotImplementedError
+
+
+class PaddleTextDetector(TextDetector):
+    """PaddleOCR ``TextDetection`` module (no recognition)."""
+
+    name = "paddle"
+    module_kind = "TextDetection"
+
+    def __init__(self, model_name: str = SERVER_DET_MODEL, **module_kwargs):
+        self.module_kwargs = {'model_name': model_name,
+                              **resolve_device_kwargs(module_kwargs), **module_kwargs}
+
+    def _build(self):
+        from paddleocr import TextDetection
+        return TextDetection(**self.module_kwargs)
+
+    def detect(self, image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        with get_registry().use(self.module_kind, self.module_kwargs, self._build) as model, \
+                stage(self.module_kind):
+            for res in model.predict(image):
+                polys = np.asarray(res['dt_polys'], dtype=np.int32).reshape(-1, 4, 2)
+                return polys, np.asarray(res['dt_scores'], dtype=np.float64)
+        return np.zeros((0, 4, 2), np.int32), np.zeros(0)
+
+
+class StubTextDetector(TextDetector):
+    """Deterministic fake detector (same layout as the stub engine)."""
+
+    name = "stub"
+
+    def __init__(self, lines_per_page: int = 40, columns: int = 1, seed: int = 0):
+        self.lines_per_page = lines_per_page
+        self.columns = columns
+        self.seed = seed
+
+    def detect(self, image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        height, width = image.shape[:2]
+        rng = np.random.default_rng(self.seed)
+        boxes = synthetic_line_boxes(height, width, self.lines_per_page, self.columns, rng)
+        return boxes_to_polys(boxes), np.full(len(boxes), 0.9)
+
+
+def create_detector(model_name: str = SERVER_DET_MODEL, **kwargs) -> TextDetector:
+    """Paddle detector for ``model_name``, or the stub detector for ``"stub"``."""
+    if model_name == "stub":
+        return StubTextDetector(**kwargs)
+    return PaddleTextDetector(model_name, **kwargs)
+
+
+_detectors: Dict[str, TextDetector] = {}
+_detectors_lock = threading.Lock()
+
+
+def get_detector() -> TextDetector:
+    """Shared detector for ``$OCR_DET_MODEL``."""
+    model_name = os.environ.get('OCR_DET_MODEL', SERVER_DET_MODEL)
+    with _detectors_lock:
+        if model_name not in _detectors:
+            _detectors[model_name] = create_detector(model_name)
+        return _detectors[model_name]
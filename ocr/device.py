@@ -0,0 +1,187 @@
+"""
+Device selection and CPU thread budgeting for Paddle pipelines.
+
+``OCR_DEVICE`` picks the device (``auto`` by default: GPU when Paddle was
+built with CUDA and a GPU is visible, otherwise CPU). On CPU the core budget
+(``OCR_CPU_CORES``, default: all cores available to the process) is split
+evenly across ``OCR_WORKERS`` worker processes, each predictor gets that many
+intra-op threads with MKL-DNN enabled, and ``OCR_CPU_AFFINITY=1`` pins each
+worker to its own slice of cores.
+
+A worker's slice follows its index: ``OCR_WORKER_INDEX`` when the process
+manager provides one, otherwise the first free slot among ``OCR_WORKERS``
+lock files (held until the process exits). A worker that gets no index is
+not pinned rather than pinned on top of another worker.
+"""
+import logging
+import os
+import tempfile
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS",
+                    "OPENBLAS_NUM_THREADS")
+
+
+def available_cores() -> List[int]:
+    """CPU ids this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def detect_device() -> str:
+    """
+    Resolve the inference device from ``OCR_DEVICE``.
+
+    Returns:
+        Paddle device string, e.g. ``"cpu"``, ``"gpu"`` or ``"gpu:1"``
+    """
+    device = os.environ.get("OCR_DEVICE", "auto").lower()
+    if device != "auto":
+        return device
+
+    try:
+        import paddle
+        if (paddle.device.is_compiled_with_cuda()
+                and paddle.device.cuda.device_count() > 0):
+            return "gpu"
+    except (ImportError, AttributeError, RuntimeError):
+        pass
+    return "cpu"
+
+
+def threads_per_worker(core_budget: int = None, workers: int = None) -> int:
+    """
+    Intra-op threads for one worker when ``core_budget`` cores are shared by ``workers`` processes.
+    """
+    if core_budget is None:
+        core_budget = int(os.environ.get("OCR_CPU_CORES", 0)) or len(available_cores())
+    if workers is None:
+        workers = int(os.environ.get("OCR_WORKERS", 1))
+    return max(1, core_budget // max(1, workers))
+
+
+def worker_cores(worker_index: int, threads: int) -> List[int]:
+    """The slice of available cores owned by ``worker_index``."""
+    cores = available_cores()
+    start = (worker_index * threads) % len(cores)
+    return [cores[(start + i) % len(cores)] for i in range(min(threads, len(cores)))]
+
+
+_slot = None     # (index, open lock file) claimed by this process
+
+
+def claim_worker_slot(workers: int) -> Optional[int]:
+    """
+    Claim the lowest free worker index below ``workers`` on this machine.
+
+    Each index is an exclusive lock on a file in the temp directory, held
+    for the life of the process, so the indices of live workers never
+    collide and those of exited workers are reused. Returns None when every
+    slot is taken or file locks are unavailable.
+    """
+    global _slot
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    if _slot is not None:
+        return _slot[0]
+
+    directory = os.path.join(tempfile.gettempdir(), "ocr-worker-slots")
+    os.makedirs(directory, exist_ok=True)
+    for index in range(workers):
+        f = open(os.path.join(directory, f"slot-{index}.lock"), "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _slot = (index, f)
+        return index
+    return None
+
+
+def configure_worker(worker_index: int = None, workers: int = None,
+                     core_budget: int = None, pin: bool = None) -> int:
+    """
+    Set up thread limits (and optionally CPU affinity) for this process.
+
+    Call before the first model is built. Thread environment variables are
+    only set if not already defined, so explicit settings win.
+
+    Args:
+        worker_index: Index of this worker (default: ``$OCR_WORKER_INDEX``, or a
+            claimed slot when pinning)
+        workers: Number of worker processes sharing the machine (default: ``$OCR_WORKERS``)
+        core_budget: Cores to divide among the workers (default: ``$OCR_CPU_CORES`` or all)
+        pin: Pin this process to its cores (default: ``$OCR_CPU_AFFINITY``)
+
+    Returns:
+        Threads per predictor for this worker
+    """
+    if workers is None:
+        workers = int(os.environ.get("OCR_WORKERS", 1))
+    if pin is None:
+        pin = os.environ.get("OCR_CPU_AFFINITY", "0").lower() in ("1", "true", "yes")
+    if worker_index is None and os.environ.get("OCR_WORKER_INDEX"):
+        worker_index = int(os.environ["OCR_WORKER_INDEX"])
+    if worker_index is None and pin:
+        worker_index = claim_worker_slot(max(1, workers))
+
+    threads = threads_per_worker(core_budget, workers)
+    os.environ["OCR_WORKERS"] = str(workers)
+    os.environ["OCR_CPU_THREADS"] = str(threads)
+    for var in _THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(threads))
+
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+    if pin and hasattr(os, "sched_setaffinity"):
+        if worker_index is None:
+            logger.warning("CPU affinity requested but no worker slot is free "
+                           "(OCR_WORKERS=%d); not pinning this process", workers)
+        else:
+            os.sched_setaffinity(0, worker_cores(worker_index, threads))
+
+    return threads
+
+
+def cpu_profile(threads: int = None) -> Dict[str, Any]:
+    """Paddle pipeline kwargs for CPU inference."""
+    if threads is None:
+        threads = int(os.environ.get("OCR_CPU_THREADS", 0)) or threads_per_worker()
+    return {
+        "device": "cpu",
+        "cpu_threads": threads,
+        "enable_mkldnn": os.environ.get("OCR_MKLDNN", "1") != "0",
+        "mkldnn_cache_capacity": 10,
+    }
+
+
+def device_kwargs() -> Dict[str, Any]:
+    """Paddle pipeline kwargs for the detected device."""
+    device = detect_device()
+    if device == "cpu":
+        return cpu_profile()
+    return {"device": device}
+
+
+def resolve_device_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Device/thread kwargs to merge under explicit model ``kwargs``.
+
+    An explicit ``device="cpu"`` still gets the CPU profile; any other
+    explicit device is left alone; otherwise the device is detected.
+    """
+    if kwargs.get("device") == "cpu":
+        return cpu_profile()
+    if "device" in kwargs:
+        return {}
+    return device_kwargs()
@@ -0,0 +1,444 @@
+"""
+OCR engine interface.
+
+An engine takes a preprocessed page (H, W, 3 uint8 array) and returns a
+PageResult. The Paddle pipelines live behind this interface so the rest of
+the code never parses Paddle output itself, and ``StubEngine`` produces
+synthetic results so ingest, preprocessing, layout, the API and
+serialization can be benchmarked without loading any model.
+
+Select the default engine with the ``OCR_ENGINE`` environment variable
+(``paddle``, ``server``, ``fast``, ``split``, ``cascade``, ``structure``
+or ``stub``).
+"""
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+from ocr.device import resolve_device_kwargs
+from ocr.registry import get_registry
+from ocr.detection import (TextDetector, create_detector, polys_to_boxes,
+                           synthetic_line_boxes)
+from ocr.rec_cache import with_cache
+from ocr.recognition import LineRecognizer, create_recognizer, crop_lines
+from ocr.result import PageResult, doc_preprocessor_angle
+from utils.profiling import stage
+
+
+# Results are reported in page coordinates. A page rotation by the orientation
+# model is undone on the boxes (PageResult.from_paddle), but unwarping is a
+# non-invertible dewarp, so it stays off unless an engine is built with
+# use_doc_unwarping=True (its boxes are then in the unwarped image)
+DEFAULT_PIPELINE_KWARGS = {
+    'use_doc_orientation_classify': True,
+    'use_doc_unwarping': False,
+    'use_textline_orientation': True,
+}
+
+# Server models are slower but more accurate than the PaddleOCR defaults
+SERVER_PIPELINE_KWARGS = {
+    **DEFAULT_PIPELINE_KWARGS,
+    'lang': "en",
+    'text_detection_model_name': "PP-OCRv5_server_det",
+    'text_recognition_model_name': "PP-OCRv5_server_rec",
+}
+
+# Mobile models: the fast first pass of the cascade
+FAST_PIPELINE_KWARGS = {
+    **DEFAULT_PIPELINE_KWARGS,
+    'text_detection_model_name': "PP-OCRv5_mobile_det",
+    'text_recognition_model_name': "PP-OCRv5_mobile_rec",
+}
+
+# The cascade re-reads weak lines from crops of its input image, so its fast
+# pass must recognize that image as given: no unwarping and no page rotation
+# (orientation=document rotates pages before OCR instead)
+CASCADE_FAST_PIPELINE_KWARGS = {
+    **FAST_PIPELINE_KWARGS,
+    'use_doc_orientation_classify': False,
+    'use_doc_unwarping': False,
+}
+
+STRUCTURE_PIPELINE_KWARGS = {
+    **DEFAULT_PIPELINE_KWARGS,
+    'use_chart_recognition': True,
+}
+
+# Pipeline kwargs that do not change results (left out of engine identities)
+_DEVICE_KEYS = ('device', 'cpu_threads', 'enable_mkldnn', 'mkldnn_cache_capacity')
+
+
+class OCREngine:
+    """Base class for OCR engines."""
+
+    name = "base"
+
+    def identity(self) -> str:
+        """
+        String identifying the engine's configuration; results of engines
+        with the same identity on the same page are interchangeable.
+        """
+        return self.name
+
+    def predict(self, image: np.ndarray) -> PageResult:
+        """
+        Run OCR on a single preprocessed page.
+
+        Args:
+            image: (H, W, 3) uint8 array
+
+        Returns:
+            PageResult with boxes in the coordinate space of ``image``
+        """
+        raise NotImplementedError
+
+    def predict_upright(self, image: np.ndarray) -> PageResult:
+        """
+        Like ``predict`` for a page known to be upright: engines with
+        orientation models skip them. Default: ``predict``.
+        """
+        return self.predict(image)
+
+
+class PaddleOCREngine(OCREngine):
+    """
+    PaddleOCR text pipeline (detection + recognition).
+
+    The pipeline itself is held by the model registry, so engines with the
+    same configuration share one loaded model.
+    """
+
+    name = "paddle"
+    pipeline_kind = "PaddleOCR"
+
+    def __init__(self, **pipeline_kwargs):
+        # Device and thread settings come from ocr.device unless given explicitly
+        self.pipeline_kwargs = {**DEFAULT_PIPELINE_KWARGS,
+                                **resolve_device_kwargs(pipeline_kwargs),
+                                **pipeline_kwargs}
+
+    def _build_pipeline(self):
+        from paddleocr import PaddleOCR
+        return PaddleOCR(**self.pipeline_kwargs)
+
+    def identity(self) -> str:
+        # Models and pipeline flags; device and thread settings do not change results
+        return self.name + ":" + ",".join(
+            f"{k}={v}" for k, v in sorted(self.pipeline_kwargs.items())
+            if k not in _DEVICE_KEYS)
+
+    @property
+    def pipeline(self):
+        """The underlying Paddle pipeline, built on first use."""
+        return get_registry().get(
+            self.pipeline_kind, self.pipeline_kwargs, self._build_pipeline)
+
+    def predict_raw(self, image: np.ndarray, **predict_kwargs) -> list:
+        """
+        Run the pipeline and return Paddle's own result objects.
+
+        ``predict_kwargs`` override pipeline flags for this call only
+        (e.g. ``use_doc_orientation_classify=False``).
+        """
+        with get_registry().use(self.pipeline_kind, self.pipeline_kwargs,
+                                self._build_pipeline) as pipeline:
+            with stage(self.pipeline_kind):
+                return list(pipeline.predict(image, **predict_kwargs))
+
+    def _to_page_result(self, res, image: np.ndarray) -> PageResult:
+        return PageResult.from_paddle(res, image_size=(image.shape[1], image.shape[0]))
+
+    def predict(self, image: np.ndarray) -> PageResult:
+        for res in self.predict_raw(image):
+            return self._to_page_result(res, image)
+        return PageResult()
+
+    def predict_upright(self, image: np.ndarray) -> PageResult:
+        # Same loaded pipeline, orientation models switched off for this call
+        for res in self.predict_raw(image, use_doc_orientation_classify=False,
+                                    use_textline_orientation=False):
+            return self._to_page_result(res, image)
+        return PageResult()
+
+
+class StructureEngine(PaddleOCREngine):
+    """PPStructureV3 pipeline (layout, tables, charts); returns its overall OCR lines."""
+
+    name = "structure"
+    pipeline_kind = "PPStructureV3"
+
+    def __init__(self, **pipeline_kwargs):
+        super().__init__(**{**STRUCTURE_PIPELINE_KWARGS, **pipeline_kwargs})
+
+    def _build_pipeline(self):
+        from paddleocr import PPStructureV3
+        return PPStructureV3(**self.pipeline_kwargs)
+
+    def _to_page_result(self, res, image: np.ndarray) -> PageResult:
+        # The document preprocessor runs once, ahead of the overall OCR
+        try:
+            return PageResult.from_paddle(res['overall_ocr_res'],
+                                          image_size=(image.shape[1], image.shape[0]),
+                                          angle=doc_preprocessor_angle(res))
+        except (KeyError, TypeError):
+            return PageResult()
+
+    def analyze(self, image: np.ndarray) -> Tuple[PageResult, Dict[str, Any]]:
+        """
+        Run layout/table/chart analysis and keep the result in memory.
+
+        Returns:
+            (PageResult of the overall OCR lines, structure dict with
+            'markdown', 'blocks' and 'tables')
+        """
+        for res in self.predict_raw(image):
+            return self._to_page_result(res, image), _structure_summary(res)
+        return PageResult(), {'markdown': '', 'blocks': [], 'tables': []}
+
+
+def _structure_summary(res) -> Dict[str, Any]:
+    """In-memory equivalent of what PPStructureV3 would save to markdown/JSON files."""
+    data = res.json.get('res', {}) if hasattr(res, 'json') else {}
+    blocks = [{
+        'label': block.get('block_label'),
+        'bbox': block.get('block_bbox'),
+        'content': block.get('block_content'),
+    } for block in data.get('parsing_res_list', [])]
+
+    markdown = ''
+    if hasattr(res, 'markdown'):
+        markdown = res.markdown.get('markdown_texts', '')
+
+    return {
+        'markdown': markdown,
+        'blocks': blocks,
+        'tables': [b for b in blocks if b['label'] == 'table'],
+    }
+
+
+class SplitEngine(OCREngine):
+    """
+    Detection and recognition run as separate modules.
+
+    Skips the pipeline's document orientation, unwarping and text-line
+    orientation models, and recognizes explicit line crops, which lets the
+    recognizer be wrapped (e.g. by the recognition cache).
+
+    Args:
+        detector: Text detector (default: PP-OCRv5 server det)
+        recognizer: Line recognizer (default: PP-OCRv5 server rec)
+        min_score: Drop lines recognized with a lower score
+    """
+
+    name = "split"
+
+    def __init__(self, detector: TextDetector = None, recognizer: LineRecognizer = None,
+                 min_score: float = 0.0):
+        self.detector = detector or create_detector()
+        self.recognizer = recognizer or create_recognizer()
+        self.min_score = min_score
+
+    def predict(self, image: np.ndarray) -> PageResult:
+        polys, _ = self.detector.detect(image)
+        if not len(polys):
+            return PageResult()
+
+        page = PageResult(texts=[''] * len(polys), boxes=polys_to_boxes(polys), polys=polys)
+        texts, scores = self.recognizer.recognize(crop_lines(image, page))
+        keep = [i for i, (text, score) in enumerate(zip(texts, scores))
+                if text and score >= self.min_score]
+
+        page.texts = list(texts)
+        page.scores = np.asarray(scores, dtype=np.float64)
+        return page.select(keep)
+
+
+class CascadeEngine(OCREngine):
+    """
+    Fast pipeline first, server recognizer only on weak lines.
+
+    Runs ``fast_engine`` on the whole page, then re-recognizes the crops of
+    lines whose score is below ``threshold`` with ``recognizer`` and keeps
+    the new text wherever it scores higher. Detection is never repeated.
+
+    The fast engine's boxes must be in the coordinates of the page it was
+    given, so the default first pass runs without document unwarping and
+    page orientation models (``CASCADE_FAST_PIPELINE_KWARGS``).
+
+    Args:
+        fast_engine: Engine for the first pass (default: mobile models)
+        recognizer: Recognizer for weak lines (default: PP-OCRv5 server)
+        threshold: Lines scoring below this are re-recognized
+    """
+
+    name = "cascade"
+
+    def __init__(self, fast_engine: OCREngine = None, recognizer: LineRecognizer = None,
+                 threshold: float = 0.9):
+        self.fast_engine = fast_engine or PaddleOCREngine(**CASCADE_FAST_PIPELINE_KWARGS)
+        self.recognizer = recognizer or create_recognizer()
+        self.threshold = threshold
+        self.stats = {'pages': 0, 'lines': 0, 'rerecognized': 0, 'improved': 0}
+        # One engine serves concurrent requests
+        self._stats_lock = threading.Lock()
+
+    def predict(self, image: np.ndarray) -> PageResult:
+        return self._refine(image, self.fast_engine.predict(image))
+
+    def predict_upright(self, image: np.ndarray) -> PageResult:
+        return self._refine(image, self.fast_engine.predict_upright(image))
+
+    def _refine(self, image: np.ndarray, page: PageResult) -> PageResult:
+        weak = np.flatnonzero(page.scores < self.threshold)
+        improved = 0
+
+        if len(weak):
+            texts, scores = self.recognizer.recognize(crop_lines(image, page, weak))
+            better = scores > page.scores[weak]
+            for i, text in zip(weak[better], np.asarray(texts, dtype=object)[better]):
+                page.texts[i] = text
+            page.scores[weak[better]] = scores[better]
+            improved = int(better.sum())
+
+        with self._stats_lock:
+            self.stats['pages'] += 1
+            self.stats['lines'] += len(page)
+            self.stats['rerecognized'] += len(weak)
+            self.stats['improved'] += improved
+        return page
+
+
+_STUB_WORDS = [
+    "invoice", "total", "date", "amount", "account", "number", "payment",
+    "due", "balance", "tax", "customer", "order", "item", "quantity",
+    "price", "report", "summary", "page", "section", "the", "of", "and",
+]
+
+
+class StubEngine(OCREngine):
+    """
+    Deterministic fake engine for benchmarking and load testing.
+
+    Lays out ``lines_per_page`` text lines over ``columns`` columns of the
+    input image. The same image always yields the same output. Set
+    ``seconds_per_page`` / ``seconds_per_line`` to emulate model latency.
+    """
+
+    name = "stub"
+
+    def __init__(self, lines_per_page: int = 40, columns: int = 1,
+                 seconds_per_page: float = 0.0, seconds_per_line: float = 0.0,
+                 seed: int = 0):
+        self.lines_per_page = lines_per_page
+        self.columns = max(1, columns)
+        self.seconds_per_page = seconds_per_page
+        self.seconds_per_line = seconds_per_line
+        self.seed = seed
+
+    def identity(self) -> str:
+        return f"{self.name}:{self.lines_per_page}:{self.columns}:{self.seed}"
+
+    def _image_seed(self, image: np.ndarray) -> int:
+        # Cheap content hash over a sparse sample of pixels
+        sample = np.ascontiguousarray(image[::32, ::32])
+        return zlib.crc32(sample.tobytes(), self.seed)
+
+    def predict(self, image: np.ndarray) -> PageResult:
+        height, width = image.shape[:2]
+        n = self.lines_per_page
+        rng = np.random.default_rng(self._image_seed(image))
+
+        boxes = synthetic_line_boxes(height, width, n, self.columns, rng)
+
+        word_ids = rng.integers(0, len(_STUB_WORDS), size=(n, 4))
+        texts = [' '.join(_STUB_WORDS[j] for j in ids) for ids in word_ids]
+        scores = rng.uniform(0.8, 1.0, size=n).round(4)
+
+        delay = self.seconds_per_page + self.seconds_per_line * n
+        if delay > 0:
+            time.sleep(delay)
+
+        return PageResult(texts=texts, boxes=boxes, scores=scores)
+
+
+ENGINES = {
+    'paddle': lambda **kw: PaddleOCREngine(**kw),
+    'server': lambda **kw: PaddleOCREngine(**{**SERVER_PIPELINE_KWARGS, **kw}),
+    'fast': lambda **kw: PaddleOCREngine(**{**FAST_PIPELINE_KWARGS, **kw}),
+    'split': lambda **kw: SplitEngine(**kw),
+    'cascade': lambda **kw: CascadeEngine(**kw),
+    'structure': lambda **kw: StructureEngine(**kw),
+    'stub': lambda **kw: StubEngine(**kw),
+}
+
+_default_engines: Dict[str, OCREngine] = {}
+
+
+def _stub_kwargs_from_env() -> Dict[str, Any]:
+    return {
+        'lines_per_page': int(os.environ.get('OCR_STUB_LINES', 40)),
+        'columns': int(os.environ.get('OCR_STUB_COLUMNS', 1)),
+        'seconds_per_page': float(os.environ.get('OCR_STUB_LATENCY_MS', 0)) / 1000,
+    }
+
+
+def _cascade_kwargs_from_env() -> Dict[str, Any]:
+    kwargs = {'threshold': float(os.environ.get('OCR_CASCADE_THRESHOLD', 0.9))}
+    # OCR_CASCADE_FAST=stub exercises the cascade without any model
+    if os.environ.get('OCR_CASCADE_FAST') == 'stub':
+        kwargs['fast_engine'] = StubEngine(**_stub_kwargs_from_env())
+        kwargs['recognizer'] = with_cache(create_recognizer('stub'))
+    else:
+        kwargs['recognizer'] = with_cache(create_recognizer())
+    return kwargs
+
+
+def _split_kwargs_from_env() -> Dict[str, Any]:
+    # OCR_SPLIT_MODELS=stub exercises the split path without any model
+    if os.environ.get('OCR_SPLIT_MODELS') == 'stub':
+        stub = _stub_kwargs_from_env()
+        return {
+            'detector': create_detector('stub', lines_per_page=stub['lines_per_page'],
+                                        columns=stub['columns']),
+            'recognizer': with_cache(create_recognizer('stub')),
+        }
+    return {'recognizer': with_cache(create_recognizer())}
+
+
+_ENV_KWARGS = {
+    'stub': _stub_kwargs_from_env,
+    'cascade': _cascade_kwargs_from_env,
+    'split': _split_kwargs_from_env,
+}
+
+
+def create_engine(name: str, **kwargs) -> OCREngine:
+    """
+    Create a new engine by name.
+
+    Args:
+        name: One of ``ENGINES``
+        **kwargs: Passed to the engine constructor
+
+    Returns:
+        OCREngine instance
+    """
+    if name not in ENGINES:
+        raise ValueError(
+            f"Unknown OCR engine: {name} (expected one of {', '.join(ENGINES)})")
+    return ENGINES[name](**kwargs)
+
+
+def get_engine(name: str = None) -> OCREngine:
+    """
+    Return the shared engine instance for ``name`` (default: ``$OCR_ENGINE`` or paddle).
+    """
+    name = name or os.environ.get('OCR_ENGINE', 'paddle')
+    if name not in _default_engines:
+        kwargs = _ENV_KWARGS[name]() if name in _ENV_KWARGS else {}
+        _default_engines[name] = create_engine(name, **kwargs)
+    return _default_engines[name]
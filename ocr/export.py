@@ -0,0 +1,424 @@
+"""
+Streaming export of page results.
+
+Writers consume pages one at a time and write straight to a binary stream
+(file or HTTP response), so memory stays flat regardless of page count.
+Supported formats:
+
+- ``md``: markdown, one section per page
+- ``txt``: arranged text, pages separated by form feeds
+- ``hocr``: hOCR 1.2 (HTML with ocr_page/ocr_par/ocr_line/ocrx_word)
+- ``alto``: ALTO XML v4
+- ``pdf``: searchable PDF, page image with an invisible text layer
+
+Coordinates are written in original page space when the page result knows
+its source size, otherwise in the preprocessed image space.
+"""
+import io
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+from PIL import Image
+
+from ocr.layout import analyze_layout
+from ocr.result import PageResult
+from utils.profiling import stage
+
+PageItem = Union[PageResult, Tuple[PageResult, Optional[Image.Image]]]
+
+
+def page_geometry(page: PageResult) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """Boxes and (width, height) in original page space when known."""
+    sx, sy = page.source_scale()
+    boxes = np.rint(page.boxes * [sx, sy, sx, sy]).astype(np.int64)
+    size = page.source_size or page.image_size
+    if not size:
+        size = (int(boxes[:, 2].max()) + 1, int(boxes[:, 3].max()) + 1) if len(page) else (1, 1)
+    return boxes, (int(size[0]), int(size[1]))
+
+
+class PageWriter:
+    """
+    Base class for streaming writers.
+
+    Call ``begin()``, then ``write_page()`` for each page, then ``end()``.
+    """
+
+    format = None
+    media_type = "application/octet-stream"
+    extension = "bin"
+
+    def __init__(self, stream, title: str = "document"):
+        self.stream = stream
+        self.title = title
+        self.pages_written = 0
+
+    def _write(self, text: str):
+        self.stream.write(text.encode('utf-8'))
+
+    def begin(self):
+        pass
+
+    def write_page(self, page: PageResult, image: Image.Image = None):
+        self.pages_written += 1
+        with stage(f"export {self.format}"):
+            self._write_page(self.pages_written if page.page_number is None else page.page_number,
+                             page, image)
+
+    def _write_page(self, page_number: int, page: PageResult, image: Optional[Image.Image]):
+        raise NotImplementedError
+
+    def end(self):
+        pass
+
+
+class MarkdownWriter(PageWriter):
+    format = "md"
+    media_type = "text/markdown; charset=utf-8"
+    extension = "md"
+
+    def begin(self):
+        self._write(f"# OCR Results: {self.title}\n\n"
+                    f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n---\n\n")
+
+    def _write_page(self, page_number, page, image):
+        parts = [f"## Page {page_number}\n\n"]
+
+        if not len(page):
+            parts.append("*No text detected on this page*\n\n")
+        else:
+            for line_num, line in enumerate(analyze_layout(page.boxes).lines(), 1):
+                line_text = ' '.join(page.texts[i] for i in line)
+                avg_conf = float(page.scores[line].mean())
+                parts.append(f"{line_text}  \n")
+                parts.append(f"<!-- Line {line_num} - Confidence: {avg_conf:.2f} -->\n")
+            parts.append("\n---\n\n")
+
+        self._write(''.join(parts))
+
+
+class TextWriter(PageWriter):
+    format = "txt"
+    media_type = "text/plain; charset=utf-8"
+    extension = "txt"
+
+    def _write_page(self, page_number, page, image):
+        if self.pages_written > 1:
+            self._write("\f")
+        self._write(page.arranged_text or ' '.join(page.texts))
+        self._write("\n")
+
+
+class HOCRWriter(PageWriter):
+    format = "hocr"
+    media_type = "text/html; charset=utf-8"
+    extension = "hocr"
+
+    def begin(self):
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" '
+            '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">\n<head>\n'
+            f'<title>{escape(self.title)}</title>\n'
+            '<meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>\n'
+            '<meta name="ocr-system" content="ocr-tech"/>\n'
+            '<meta name="ocr-capabilities" content="ocr_page ocr_par ocr_line ocrx_word"/>\n'
+            '</head>\n<body>\n')
+
+    def _write_page(self, page_number, page, image):
+        boxes, (width, height) = page_geometry(page)
+        parts = [f'<div class="ocr_page" id="page_{page_number}" '
+                 f'title="ppageno {page_number - 1}; bbox 0 0 {width} {height}">\n']
+
+        if len(page):
+            layout = analyze_layout(page.boxes)
+            lines = layout.lines()
+            for par_no, line_numbers in enumerate(layout.paragraphs(), 1):
+                par_boxes = boxes[np.concatenate([lines[n] for n in line_numbers])]
+                parts.append(f'<p class="ocr_par" id="par_{page_number}_{par_no}" '
+                             f'title="bbox {_bbox(par_boxes)}">\n')
+                for n in line_numbers:
+                    line = lines[n]
+                    parts.append(f'<span class="ocr_line" id="line_{page_number}_{n + 1}" '
+                                 f'title="bbox {_bbox(boxes[line])}">')
+                    for i in line:
+                        x1, y1, x2, y2 = boxes[i]
+                        conf = int(round(float(page.scores[i]) * 100))
+                        parts.append(f'<span class="ocrx_word" id="word_{page_number}_{i + 1}" '
+                                     f'title="bbox {x1} {y1} {x2} {y2}; x_wconf {conf}">'
+                                     f'{escape(page.texts[i])}</span> ')
+                    parts.append('</span>\n')
+                parts.append('</p>\n')
+
+        parts.append('</div>\n')
+        self._write(''.join(parts))
+
+    def end(self):
+        self._write('</body>\n</html>\n')
+
+
+def _bbox(boxes: np.ndarray) -> str:
+    return (f"{boxes[:, 0].min()} {boxes[:, 1].min()} "
+            f"{boxes[:, 2].max()} {boxes[:, 3].max()}")
+
+
+class ALTOWriter(PageWriter):
+    format = "alto"
+    media_type = "application/xml; charset=utf-8"
+    extension = "xml"
+
+    def begin(self):
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:schemaLocation="http://www.loc.gov/standards/alto/ns-v4# '
+            'http://www.loc.gov/alto/v4/alto-4-2.xsd">\n'
+            '<Description>\n<MeasurementUnit>pixel</MeasurementUnit>\n'
+            f'<sourceImageInformation><fileName>{escape(self.title)}</fileName>'
+            '</sourceImageInformation>\n'
+            '<OCRProcessing ID="OCR_0"><ocrProcessingStep><processingSoftware>'
+            '<softwareName>ocr-tech</softwareName></processingSoftware>'
+            '</ocrProcessingStep></OCRProcessing>\n'
+            '</Description>\n<Layout>\n')
+
+    def _write_page(self, page_number, page, image):
+        boxes, (width, height) = page_geometry(page)
+        p = f"P{page_number}"
+        parts = [f'<Page ID="{p}" PHYSICAL_IMG_NR="{page_number}" '
+                 f'WIDTH="{width}" HEIGHT="{height}">\n'
+                 f'<PrintSpace HPOS="0" VPOS="0" WIDTH="{width}" HEIGHT="{height}">\n']
+
+        if len(page):
+            layout = analyze_layout(page.boxes)
+            lines = layout.lines()
+            for block_no, line_numbers in enumerate(layout.paragraphs(), 1):
+                block_boxes = boxes[np.concatenate([lines[n] for n in line_numbers])]
+                parts.append(f'<TextBlock ID="{p}_B{block_no}" {_alto_pos(block_boxes)}>\n')
+                for n in line_numbers:
+                    line = lines[n]
+                    parts.append(f'<TextLine ID="{p}_L{n + 1}" {_alto_pos(boxes[line])}>\n')
+                    for k, i in enumerate(line):
+                        if k:
+                            parts.append('<SP/>\n')
+                        parts.append(f'<String ID="{p}_S{i + 1}" CONTENT={quoteattr(page.texts[i])} '
+                                     f'WC="{float(page.scores[i]):.3f}" '
+                                     f'{_alto_pos(boxes[i:i + 1])}/>\n')
+                    parts.append('</TextLine>\n')
+                parts.append('</TextBlock>\n')
+
+        parts.append('</PrintSpace>\n</Page>\n')
+        self._write(''.join(parts))
+
+    def end(self):
+        self._write('</Layout>\n</alto>\n')
+
+
+def _alto_pos(boxes: np.ndarray) -> str:
+    x1, y1 = boxes[:, 0].min(), boxes[:, 1].min()
+    x2, y2 = boxes[:, 2].max(), boxes[:, 3].max()
+    return f'HPOS="{x1}" VPOS="{y1}" WIDTH="{x2 - x1}" HEIGHT="{y2 - y1}"'
+
+
+class SearchablePDFWriter(PageWriter):
+    """
+    Minimal PDF writer: each page is the page image with the recognized
+    text drawn invisibly (render mode 3) on top, so it can be searched and
+    copied. Objects are written as soon as a page is done; only their byte
+    offsets are kept for the cross-reference table.
+
+    The text layer uses the standard Helvetica font, so characters outside
+    Latin-1 are written as '?'.
+
+    Args:
+        dpi: Resolution of the page pixels, used to size pages in points
+            when a page does not carry the DPI it was rendered at
+        jpeg_quality: Quality of the embedded page images
+    """
+
+    format = "pdf"
+    media_type = "application/pdf"
+    extension = "pdf"
+
+    _CATALOG, _PAGES, _FONT = 1, 2, 3
+
+    def __init__(self, stream, title: str = "document", dpi: int = 300,
+                 jpeg_quality: int = 75):
+        super().__init__(stream, title)
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self._offsets = {}
+        self._position = 0
+        self._next_id = 4
+        self._page_ids = []
+
+    def _raw(self, data: bytes):
+        self.stream.write(data)
+        self._position += len(data)
+
+    def _object(self, obj_id: int, body: bytes, stream: bytes = None):
+        self._offsets[obj_id] = self._position
+        self._raw(f"{obj_id} 0 obj\n".encode('ascii') + body)
+        if stream is not None:
+            self._raw(b"\nstream\n" + stream + b"\nendstream")
+        self._raw(b"\nendobj\n")
+
+    def _allocate(self, count: int = 1) -> List[int]:
+        ids = list(range(self._next_id, self._next_id + count))
+        self._next_id += count
+        return ids
+
+    def begin(self):
+        self._raw(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(self._FONT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                                 b"/Encoding /WinAnsiEncoding >>")
+
+    def _write_page(self, page_number, page, image):
+        boxes, (width, height) = page_geometry(page)
+        # Page pixels -> points at the DPI the page was rendered at; the
+        # image is drawn over the whole page whatever its own pixel size
+        scale = 72.0 / (page.dpi or self.dpi)
+        page_w, page_h = width * scale, height * scale
+
+        page_id, content_id, image_id = self._allocate(3)
+        content = []
+        resources = f"/Font << /F1 {self._FONT} 0 R >>"
+
+        if image is not None:
+            rgb = image.convert('L' if image.mode in ('1', 'L') else 'RGB')
+            buffer = io.BytesIO()
+            rgb.save(buffer, format='JPEG', quality=self.jpeg_quality)
+            colorspace = '/DeviceGray' if rgb.mode == 'L' else '/DeviceRGB'
+            data = buffer.getvalue()
+            self._object(image_id, (
+                f"<< /Type /XObject /Subtype /Image /Width {rgb.width} /Height {rgb.height} "
+                f"/ColorSpace {colorspace} /BitsPerComponent 8 /Filter /DCTDecode "
+                f"/Length {len(data)} >>").encode('ascii'), data)
+            resources += f" /XObject << /Im0 {image_id} 0 R >>"
+            content.append(f"q {page_w:.2f} 0 0 {page_h:.2f} 0 0 cm /Im0 Do Q")
+
+        if len(page):
+            content.append("BT 3 Tr")
+            for i, text in enumerate(page.texts):
+                x1, y1, x2, y2 = boxes[i]
+                box_h = max((y2 - y1) * scale, 1.0)
+                box_w = max((x2 - x1) * scale, 1.0)
+                size = box_h * 0.8
+                # Helvetica averages about half an em per character
+                natural = max(len(text), 1) * size * 0.5
+                stretch = 100.0 * box_w / natural
+                baseline = page_h - y2 * scale + box_h * 0.2
+                content.append(f"/F1 {size:.2f} Tf {stretch:.1f} Tz "
+                               f"1 0 0 1 {x1 * scale:.2f} {baseline:.2f} Tm "
+                               f"({_pdf_string(text)}) Tj")
+            content.append("ET")
+
+        stream = '\n'.join(content).encode('latin-1')
+        self._object(content_id, f"<< /Length {len(stream)} >>".encode('ascii'), stream)
+        self._object(page_id, (
+            f"<< /Type /Page /Parent {self._PAGES} 0 R "
+            f"/MediaBox [0 0 {page_w:.2f} {page_h:.2f}] "
+            f"/Resources << {resources} >> /Contents {content_id} 0 R >>").encode('ascii'))
+        self._page_ids.append(page_id)
+
+    def end(self):
+        kids = ' '.join(f"{i} 0 R" for i in self._page_ids)
+        self._object(self._PAGES, f"<< /Type /Pages /Kids [{kids}] "
+                                  f"/Count {len(self._page_ids)} >>".encode('ascii'))
+        self._object(self._CATALOG, f"<< /Type /Catalog /Pages {self._PAGES} 0 R >>".encode('ascii'))
+
+        info_id, = self._allocate()
+        self._object(info_id, f"<< /Title ({_pdf_string(self.title)}) "
+                              f"/Producer (ocr-tech) >>".encode('latin-1'))
+
+        xref_offset = self._position
+        lines = [f"xref\n0 {self._next_id}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, self._next_id):
+            offset = self._offsets.get(obj_id)
+            lines.append(f"{offset:010d} 00000 n \n" if offset is not None
+                         else "0000000000 65535 f \n")
+        lines.append(f"trailer\n<< /Size {self._next_id} /Root {self._CATALOG} 0 R "
+                     f"/Info {info_id} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._raw(''.join(lines).encode('ascii'))
+
+
+def _pdf_string(text: str) -> str:
+    text = text.encode('latin-1', errors='replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') \
+        .replace('\r', ' ').replace('\n', ' ')
+
+
+WRITERS = {
+    writer.format: writer
+    for writer in (MarkdownWriter, TextWriter, HOCRWriter, ALTOWriter, SearchablePDFWriter)
+}
+
+
+def create_writer(fmt: str, stream, title: str = "document", **kwargs) -> PageWriter:
+    """Writer for ``fmt`` (one of ``WRITERS``) writing to a binary stream."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(WRITERS)})")
+    return WRITERS[fmt](stream, title=title, **kwargs)
+
+
+def _split_item(item: PageItem) -> Tuple[PageResult, Optional[Image.Image]]:
+    if isinstance(item, tuple):
+        return item
+    return item, None
+
+
+def export_pages(pages: Iterable[PageItem], fmt: str, stream,
+                 title: str = "document", **kwargs) -> int:
+    """
+    Write pages to a binary stream as they arrive.
+
+    Args:
+        pages: PageResults, or (PageResult, page image) pairs for the PDF image layer
+        fmt: Output format (see ``WRITERS``)
+        stream: Binary file-like object
+        title: Document title
+
+    Returns:
+        Number of pages written
+    """
+    writer = create_writer(fmt, stream, title, **kwargs)
+    writer.begin()
+    for item in pages:
+        writer.write_page(*_split_item(item))
+    writer.end()
+    return writer.pages_written
+
+
+class _ChunkBuffer:
+    """Write target that hands its contents back as chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes):
+        self._chunks.append(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_export(pages: Iterable[PageItem], fmt: str, title: str = "document",
+                **kwargs) -> Iterator[bytes]:
+    """
+    Generator version of ``export_pages`` yielding one chunk per page,
+    for streaming HTTP responses.
+    """
+    buffer = _ChunkBuffer()
+    writer = create_writer(fmt, buffer, title, **kwargs)
+    writer.begin()
+    yield buffer.drain()
+    for item in pages:
+        writer.write_page(*_split_item(item))
+        yield buffer.drain()
+    writer.end()
+    yield buffer.drain()
@@ -0,0 +1,295 @@
+"""
+Reading-order analysis for OCR boxes.
+
+A recursive XY-cut over the (N, 4) box array splits the page into blocks:
+horizontal cuts at vertical whitespace wider than ``block_gap`` text heights,
+vertical cuts (columns) at horizontal whitespace wider than ``column_gap``
+text heights. A column cut is rejected when one side is narrow and its
+items are row-aligned with the other side (key/value forms, tables), so those read row by row.
+Inside each block, boxes are grouped into lines by centre distance relative
+to the median text height and ordered left to right.
+
+Scanned pages are rarely straight, and a degree of skew is enough to close
+the whitespace between columns at the top or bottom of the page. The skew
+is estimated first (the left edges of a column line up when the page is
+sheared upright), and the cuts run on deskewed boxes.
+
+Every step is a sort plus vectorized numpy work, so the whole analysis is
+O(n log n) in the number of boxes.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+# Thresholds, in multiples of the median text height
+LINE_THRESHOLD = 0.5
+BLOCK_GAP = 0.8
+COLUMN_GAP = 1.5
+PARAGRAPH_GAP = 2.0
+SHORT_ITEM = 8.0
+ROW_ALIGNED_FRACTION = 0.8
+
+MAX_SKEW_DEGREES = 5.0
+MIN_SKEW_BOXES = 6
+SKEW_SAMPLE = 2000        # boxes used for the skew estimate
+SKEW_TOLERANCE = 0.05     # relative edge-alignment score treated as a tie
+
+_MAX_DEPTH = 64
+
+
+class Layout:
+    """
+    Reading order for the boxes of one page.
+
+    Attributes:
+        order: (N,) indices into the page arrays, in reading order
+        line_starts: (L,) offsets into ``order`` where each line begins
+        paragraph_starts: (P,) line numbers where each paragraph begins
+        line_height: Median text height used for the thresholds
+    """
+
+    __slots__ = ('order', 'line_starts', 'paragraph_starts', 'line_height')
+
+    def __init__(self, order: np.ndarray, line_starts: np.ndarray,
+                 paragraph_starts: np.ndarray, line_height: float):
+        self.order = order
+        self.line_starts = line_starts
+        self.paragraph_starts = paragraph_starts
+        self.line_height = line_height
+
+    def lines(self) -> List[np.ndarray]:
+        """Box indices of each line, in reading order."""
+        if not len(self.order):
+            return []
+        return np.split(self.order, self.line_starts[1:])
+
+    def paragraphs(self) -> List[List[int]]:
+        """Line numbers of each paragraph."""
+        bounds = list(self.paragraph_starts) + [len(self.line_starts)]
+        return [list(range(bounds[i], bounds[i + 1]))
+                for i in range(len(bounds) - 1)]
+
+
+def _split(starts: np.ndarray, ends: np.ndarray, gap: float) -> List[np.ndarray]:
+    """
+    Split intervals at gaps wider than ``gap`` in their 1-D projection.
+
+    Returns:
+        Index arrays (into ``starts``) of each group, in ascending position
+    """
+    order = np.argsort(starts, kind='stable')
+    reach = np.maximum.accumulate(ends[order])
+    gaps = starts[order][1:] - reach[:-1]
+    cuts = np.flatnonzero(gaps > gap) + 1
+    return np.split(order, cuts) if len(cuts) else [order]
+
+
+def _looks_like_rows(left: np.ndarray, right: np.ndarray, boxes: np.ndarray,
+                     line_height: float) -> bool:
+    """
+    True if two side-by-side groups are short items sharing rows
+    (labels and values, table cells) rather than text columns.
+    """
+    # A lone box beside another group is part of that group's rows
+    if min(len(left), len(right)) < 2:
+        return True
+
+    # Text columns are wide on both sides; label or cell columns are narrow
+    spans = [boxes[side, 2].max() - boxes[side, 0].min() for side in (left, right)]
+    if min(spans) >= SHORT_ITEM * line_height:
+        return False
+
+    # For each item of the smaller side, distance to the nearest row centre
+    # on the other side
+    small, large = (left, right) if len(left) <= len(right) else (right, left)
+    centers = (boxes[:, 1] + boxes[:, 3]) / 2
+    other = np.sort(centers[large])
+    probe = centers[small]
+    pos = np.searchsorted(other, probe)
+    after = other[np.minimum(pos, len(other) - 1)]
+    before = other[np.maximum(pos - 1, 0)]
+    nearest = np.minimum(np.abs(after - probe), np.abs(before - probe))
+
+    aligned = np.mean(nearest <= LINE_THRESHOLD * line_height)
+    return aligned >= ROW_ALIGNED_FRACTION
+
+
+def _xy_cut(boxes: np.ndarray, idx: np.ndarray, line_height: float,
+            blocks: List[np.ndarray], depth: int = 0):
+    if len(idx) <= 1 or depth >= _MAX_DEPTH:
+        blocks.append(idx)
+        return
+
+    region = boxes[idx]
+
+    # Horizontal cuts: blocks stacked top to bottom
+    bands = _split(region[:, 1], region[:, 3], BLOCK_GAP * line_height)
+    if len(bands) > 1:
+        for band in bands:
+            _xy_cut(boxes, idx[band], line_height, blocks, depth + 1)
+        return
+
+    # Vertical cuts: columns left to right
+    columns = _split(region[:, 0], region[:, 2], COLUMN_GAP * line_height)
+    if len(columns) > 1 and not any(
+            _looks_like_rows(idx[a], idx[b], boxes, line_height)
+            for a, b in zip(columns, columns[1:])):
+        for column in columns:
+            _xy_cut(boxes, idx[column], line_height, blocks, depth + 1)
+        return
+
+    blocks.append(idx)
+
+
+def _edge_alignment(x: np.ndarray, y: np.ndarray, slopes: np.ndarray,
+                    bin_width: float) -> np.ndarray:
+    """
+    How sharply the left edges ``x`` line up after shearing by each slope
+    (x - slope * y): the sum of squared counts of a histogram of the
+    sheared edges, taken over pairs of neighbouring bins.
+    """
+    sheared = (x[None, :] - slopes[:, None] * y[None, :]) / bin_width
+    # An empty bin on either side, so every bin is in two pairs
+    bins = np.floor(sheared - sheared.min(axis=1, keepdims=True)).astype(np.intp) + 1
+    n_bins = int(bins.max()) + 2
+    rows = np.arange(len(slopes))[:, None] * n_bins
+    counts = np.bincount((bins + rows).ravel(), minlength=len(slopes) * n_bins)
+    counts = counts.reshape(len(slopes), n_bins).astype(np.float64)
+    pairs = counts[:, :-1] + counts[:, 1:]
+    return (pairs ** 2).sum(axis=1)
+
+
+def estimate_skew(boxes: np.ndarray, line_height: float) -> float:
+    """
+    Page skew as horizontal drift per pixel down the page (tan of the angle;
+    positive when lower lines sit further right).
+
+    The left edges of the lines of a column line up only when the page is
+    sheared upright, so the slope under which they align best wins (a
+    coarse then a fine search). Full-width titles and ragged right edges do
+    not disturb this. Among slopes scoring within ``SKEW_TOLERANCE`` of the
+    best, the smallest is taken, so straight pages are left alone.
+    """
+    if len(boxes) < MIN_SKEW_BOXES:
+        return 0.0
+    sample = boxes[::max(1, len(boxes) // SKEW_SAMPLE)]
+    x = sample[:, 0]
+    y = (sample[:, 1] + sample[:, 3]) / 2
+    bin_width = max(line_height / 6, 1.0)
+
+    def search(angles):
+        scores = _edge_alignment(x, y, np.tan(np.radians(angles)), bin_width)
+        close = np.flatnonzero(scores >= scores.max() * (1 - SKEW_TOLERANCE))
+        return angles[close[np.argmin(np.abs(angles[close]))]]
+
+    coarse_step = 0.25
+    angle = search(np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 1e-9, coarse_step))
+    angle = search(np.linspace(angle - coarse_step, angle + coarse_step, 21))
+    return float(np.tan(np.radians(angle)))
+
+
+def deskew_boxes(boxes: np.ndarray, skew: float) -> np.ndarray:
+    """
+    Boxes rotated upright by ``skew`` (from ``estimate_skew``), about the origin.
+
+    Centres are rotated; heights lose the part a tilted line adds to its
+    axis-aligned box (``|skew| * width``), down to a third of the original.
+    """
+    if not skew:
+        return boxes
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    width = boxes[:, 2] - boxes[:, 0]
+    height = boxes[:, 3] - boxes[:, 1]
+    height = np.maximum(height - abs(skew) * width, height / 3)
+    cx, cy = cx - skew * cy, cy + skew * cx
+    return np.stack([cx - width / 2, cy - height / 2, cx + width / 2, cy + height / 2], axis=1)
+
+
+def analyze_layout(boxes, line_threshold: float = None) -> Layout:
+    """
+    Compute the reading order of a page.
+
+    Args:
+        boxes: (N, 4) array-like of [x1, y1, x2, y2]
+        line_threshold: Absolute centre distance (pixels) for two boxes to be
+            on the same line; default is ``LINE_THRESHOLD`` text heights
+
+    Returns:
+        Layout
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    n = len(boxes)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return Layout(empty, empty, empty, 0.0)
+
+    skew = estimate_skew(boxes, max(float(np.median(boxes[:, 3] - boxes[:, 1])), 1.0))
+    boxes = deskew_boxes(boxes, skew)
+
+    heights = boxes[:, 3] - boxes[:, 1]
+    line_height = max(float(np.median(heights)), 1.0)
+    if line_threshold is None:
+        line_threshold = LINE_THRESHOLD * line_height
+
+    blocks: List[np.ndarray] = []
+    _xy_cut(boxes, np.arange(n), line_height, blocks)
+
+    centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    order_parts = []
+    line_starts = []
+    paragraph_starts = []
+    offset = 0
+    line_count = 0
+
+    for block in blocks:
+        # Group into lines by centre-y, then order each line by x
+        block = block[np.argsort(centers_y[block], kind='stable')]
+        cy = centers_y[block]
+        new_line = np.empty(len(block), dtype=bool)
+        new_line[0] = True
+        new_line[1:] = np.diff(cy) > line_threshold
+        line_ids = np.cumsum(new_line)
+        block = block[np.lexsort((boxes[block, 0], line_ids))]
+
+        starts = np.flatnonzero(new_line)
+        line_y = np.add.reduceat(cy, starts) / np.diff(np.append(starts, len(block)))
+        new_paragraph = np.empty(len(starts), dtype=bool)
+        new_paragraph[0] = True
+        new_paragraph[1:] = np.diff(line_y) > PARAGRAPH_GAP * line_height
+
+        paragraph_starts.append(np.flatnonzero(new_paragraph) + line_count)
+        line_starts.append(starts + offset)
+        order_parts.append(block)
+        offset += len(block)
+        line_count += len(starts)
+
+    return Layout(
+        order=np.concatenate(order_parts),
+        line_starts=np.concatenate(line_starts),
+        paragraph_starts=np.concatenate(paragraph_starts),
+        line_height=line_height,
+    )
+
+
+def arrange_text(texts: Sequence[str], boxes, line_threshold: float = None) -> str:
+    """
+    Join recognized text in reading order.
+
+    Lines are joined with newlines and paragraphs (including column and
+    block changes) are separated by a blank line.
+    """
+    if not len(texts) or not len(boxes):
+        return ""
+
+    layout = analyze_layout(boxes, line_threshold)
+    ordered = [texts[i] for i in layout.order.tolist()]
+    bounds = layout.line_starts.tolist() + [len(ordered)]
+    paragraph_starts = set(layout.paragraph_starts.tolist())
+
+    result_lines = []
+    for line_no in range(len(bounds) - 1):
+        if line_no in paragraph_starts and line_no > 0:
+            result_lines.append('')
+        result_lines.append(' '.join(ordered[bounds[line_no]:bounds[line_no + 1]]))
+    return '\n'.join(result_lines)
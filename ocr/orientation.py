@@ -0,0 +1,214 @@
+"""
+Document-level page orientation.
+
+The Paddle pipeline classifies the orientation of every page (and of every
+text line), although nearly all pages of a scanned document share one
+orientation. In document mode a standalone orientation classifier looks at
+the first few pages; when they agree, every later page is rotated by that
+angle during preprocessing and recognized with the pipeline's orientation
+models switched off (``OCREngine.predict_upright``), saving one to two model
+passes per page.
+
+A page recognized upright whose mean confidence falls below
+``min_confidence`` is recognized again with per-page classification and the
+better result is kept. After ``max_fallbacks`` such pages (or when the
+sampled pages disagree) the document goes back to per-page classification.
+
+Configured with ``OCR_ORIENTATION`` (``page``, the default, or
+``document``), ``OCR_ORIENTATION_SAMPLE`` (pages classified, default 3),
+``OCR_ORIENTATION_MIN_CONFIDENCE`` (0.8) and ``OCR_ORIENTATION_MODEL``
+(classifier model, ``stub`` for tests).
+"""
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ocr.device import resolve_device_kwargs
+from ocr.registry import get_registry
+from utils.profiling import stage
+
+DOC_ORIENTATION_MODEL = "PP-LCNet_x1_0_doc_ori"
+ORIENTATION_MODES = ("page", "document")
+
+
+class OrientationClassifier:
+    """Base class for whole-page orientation classifiers."""
+
+    name = "base"
+
+    def classify(self, image: np.ndarray) -> Tuple[int, float]:
+        """
+        Orientation of a page.
+
+        Returns:
+            (angle in degrees, one of 0/90/180/270, score). Rotating the page
+            counter-clockwise by the angle makes it upright.
+        """
+        raise NotImplementedError
+
+
+class PaddleOrientationClassifier(OrientationClassifier):
+    """PaddleOCR ``DocImgOrientationClassification`` module."""
+
+    name = "paddle"
+    module_kind = "DocImgOrientationClassification"
+
+    def __init__(self, model_name: str = DOC_ORIENTATION_MODEL, **module_kwargs):
+        self.module_kwargs = {'model_name': model_name,
+                              **resolve_device_kwargs(module_kwargs), **module_kwargs}
+
+    def _build(self):
+        from paddleocr import DocImgOrientationClassification
+        return DocImgOrientationClassification(**self.module_kwargs)
+
+    def classify(self, image: np.ndarray) -> Tuple[int, float]:
+        with get_registry().use(self.module_kind, self.module_kwargs, self._build) as model, \
+                stage(self.module_kind):
+            for res in model.predict(image, batch_size=1):
+                return int(res['label_names'][0]), float(res['scores'][0])
+        return 0, 0.0
+
+
+class StubOrientationClassifier(OrientationClassifier):
+    """Fixed answer, for exercising document mode without a model."""
+
+    name = "stub"
+
+    def __init__(self, angle: int = 0, score: float = 0.99):
+        self.angle = angle
+        self.score = score
+
+    def classify(self, image: np.ndarray) -> Tuple[int, float]:
+        return self.angle, self.score
+
+
+def create_orientation_classifier(model_name: str = DOC_ORIENTATION_MODEL,
+                                  **kwargs) -> OrientationClassifier:
+    """Paddle classifier for ``model_name``, or the stub classifier for ``"stub"``."""
+    if model_name == "stub":
+        return StubOrientationClassifier(**kwargs)
+    return PaddleOrientationClassifier(model_name, **kwargs)
+
+
+_classifiers: Dict[str, OrientationClassifier] = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_orientation_classifier() -> OrientationClassifier:
+    """Shared classifier for ``$OCR_ORIENTATION_MODEL``."""
+    model_name = os.environ.get('OCR_ORIENTATION_MODEL', DOC_ORIENTATION_MODEL)
+    with _classifiers_lock:
+        if model_name not in _classifiers:
+            _classifiers[model_name] = create_orientation_classifier(model_name)
+        return _classifiers[model_name]
+
+
+def mean_confidence(page) -> float:
+    return float(page.scores.mean()) if len(page) else 0.0
+
+
+class DocumentOrientation:
+    """
+    Orientation decision for the pages of one document (thread-safe, as
+    pipeline stages run pages concurrently).
+
+    Args:
+        classifier: Page orientation classifier
+        sample_pages: Pages classified before deciding for the document
+        min_confidence: Upright pages scoring below this are recognized again
+            with per-page classification
+        max_fallbacks: Fallbacks after which the document returns to
+            per-page classification
+    """
+
+    def __init__(self, classifier: OrientationClassifier = None, sample_pages: int = 3,
+                 min_confidence: float = 0.8, max_fallbacks: int = 2):
+        self.classifier = classifier or get_orientation_classifier()
+        self.sample_pages = max(1, sample_pages)
+        self.min_confidence = min_confidence
+        self.max_fallbacks = max_fallbacks
+        self.angle = None
+        self.per_page = False
+        self.votes: List[int] = []
+        self.upright_pages = 0
+        self.fallbacks: List[int] = []
+        self._lock = threading.Lock()
+
+    def resolve(self, image: Image.Image) -> Tuple[int, bool]:
+        """
+        Rotation for a page and whether it can be recognized upright.
+
+        Returns:
+            (counter-clockwise rotation to apply, True when the pipeline's
+            orientation models can be skipped for the page)
+        """
+        with self._lock:
+            if self.per_page:
+                return 0, False
+            if self.angle is not None:
+                self.upright_pages += 1
+                return self.angle, True
+
+        with stage("orientation"):
+            # Classifier input is BGR, like the OCR pipeline's
+            angle, _ = self.classifier.classify(np.asarray(image.convert("RGB"))[:, :, ::-1])
+
+        with self._lock:
+            self.votes.append(angle)
+            self.upright_pages += 1
+            if self.angle is None and not self.per_page and len(self.votes) >= self.sample_pages:
+                common, count = Counter(self.votes).most_common(1)[0]
+                if count == len(self.votes):
+                    self.angle = common
+                else:
+                    # Mixed orientations: leave it to the per-page classifiers
+                    self.per_page = True
+        return angle, True
+
+    def recognize(self, engine, image: np.ndarray, upright: bool, page_number: int = None):
+        """
+        Run ``engine`` on a resolved page, falling back to per-page
+        classification when an upright page scores low.
+        """
+        if not upright:
+            return engine.predict(image)
+        page = engine.predict_upright(image)
+        if len(page) and mean_confidence(page) < self.min_confidence:
+            fallback = engine.predict(image)
+            with self._lock:
+                self.fallbacks.append(page_number)
+                if len(self.fallbacks) >= self.max_fallbacks:
+                    self.per_page = True
+            if mean_confidence(fallback) > mean_confidence(page):
+                return fallback
+        return page
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': 'page' if self.per_page else 'document',
+                'angle': self.angle,
+                'votes': list(self.votes),
+                'upright_pages': self.upright_pages,
+                'fallback_pages': sorted(p for p in self.fallbacks if p is not None),
+            }
+
+
+def document_orientation(mode: str = None):
+    """
+    A ``DocumentOrientation`` for ``mode`` (default: ``$OCR_ORIENTATION``),
+    or None for per-page classification.
+    """
+    mode = mode or os.environ.get('OCR_ORIENTATION', 'page')
+    if mode not in ORIENTATION_MODES:
+        raise ValueError(f"Unknown orientation mode: {mode} "
+                         f"(expected one of {', '.join(ORIENTATION_MODES)})")
+    if mode == 'page':
+        return None
+    return DocumentOrientation(
+        sample_pages=int(os.environ.get('OCR_ORIENTATION_SAMPLE', 3)),
+        min_confidence=float(os.environ.get('OCR_ORIENTATION_MIN_CONFIDENCE', 0.8)))
@@ -1,170 +1,203 @@
 from utils.preprocess import preprocess_for_ocr
-from paddleocr import PaddleOCR
-from paddleocr import PPStructureV3
+from ocr.engine import OCREngine, get_engine
+from ocr.detection import TextDetector, get_detector, polys_to_boxes
+from ocr.layout import arrange_text
+from ocr.result import PageResult
+from utils.profiling import stage
 from PIL import Image
 import numpy as np
 import json
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Sequence, Callable
 import sys
 from pathlib import Path
 
 # Add the parent directory to path to import utils
 sys.path.append(str(Path(__file__).parent.parent))
 
-# Initialize OCR (only once)
-ocr = PaddleOCR(
-    use_doc_orientation_classify=True,
-    use_doc_unwarping=True,
-    use_textline_orientation=True,
-    device="gpu",
-)
 
-
-def arrange_text_by_position(rec_texts: List[str], rec_boxes: List[List[float]], y_threshold: int = 15) -> str:
+def arrange_text_by_position(rec_texts: List[str], rec_boxes, y_threshold: float = None) -> str:
     """
-    Arrange text based on spatial position (top-to-bottom, left-to-right)
+    Arrange text based on spatial position (columns, then top-to-bottom, left-to-right)
 
     Args:
         rec_texts: List of recognized text strings
-        rec_boxes: List of bounding boxes [x1, y1, x2, y2]
-        y_threshold: Vertical distance threshold to consider lines as same row
+        rec_boxes: Bounding boxes [x1, y1, x2, y2] (list or (N, 4) array)
+        y_threshold: Vertical distance threshold to consider lines as same row;
+            by default derived from the median text height
 
     Returns:
         String with spatially arranged text
     """
-    if not rec_texts or not rec_boxes:
-        return ""
-
-    # Combine text with position info
-    text_items = []
-    for i, (text, box) in enumerate(zip(rec_texts, rec_boxes)):
-        if len(box) >= 4:
-            x1, y1, x2, y2 = box[:4]
-            center_y = (y1 + y2) / 2
-            center_x = (x1 + x2) / 2
-            text_items.append({
-                'text': text,
-                'center_y': center_y,
-                'center_x': center_x,
-                'box': box
-            })
-
-    if not text_items:
-        return ""
-
-    # Sort by Y first (top to bottom), then by X (left to right)
-    text_items.sort(key=lambda item: (item['center_y'], item['center_x']))
-
-    # Group items that are on similar Y levels (same row/line)
-    grouped_lines = []
-    current_line = []
-    current_y = None
-
-    for item in text_items:
-        if current_y is None or abs(item['center_y'] - current_y) <= y_threshold:
-            # Same line
-            current_line.append(item)
-            current_y = item['center_y'] if current_y is None else current_y
-        else:
-            # New line
-            if current_line:
-                # Sort current line by X coordinate
-                current_line.sort(key=lambda x: x['center_x'])
-                grouped_lines.append(current_line)
-            current_line = [item]
-            current_y = item['center_y']
-
-    # Don't forget the last line
-    if current_line:
-        current_line.sort(key=lambda x: x['center_x'])
-        grouped_lines.append(current_line)
-
-    # Convert to text with appropriate spacing
-    result_lines = []
-    prev_y = None
-
-    for line_group in grouped_lines:
-        # Join texts in the same line with spaces
-        line_text = ' '.join([item['text'] for item in line_group])
-
-        # Add extra spacing for significant Y gaps (new paragraphs/sections)
-        current_y = line_group[0]['center_y']
-        if prev_y is not None and current_y - prev_y > 30:  # Large gap = new section
-            result_lines.append('')  # Add blank line
-
-        result_lines.append(line_text)
-        prev_y = current_y
-
-    return '\n'.join(result_lines)
-
-
-def process_image_direct(image) -> Dict[str, Any]:
+    return arrange_text(rec_texts, rec_boxes, line_threshold=y_threshold)
+
+
+def query_region(page: PageResult, bbox: Sequence[float], space: str = "page",
+                 mode: str = "center") -> PageResult:
+    """
+    Return the lines of a page that fall inside a rectangle, in reading order.
+
+    Args:
+        page: OCR result for the page
+        bbox: Rectangle [x1, y1, x2, y2]
+        space: ``page`` for original page coordinates, ``image`` for the
+            preprocessed image the boxes were detected on
+        mode: ``center`` (box centre inside), ``intersect`` or ``inside``
+
+    Returns:
+        PageResult with the matching lines (boxes in ``space``) and their arranged text
+    """
+    if space not in ("page", "image"):
+        raise ValueError(f"Unknown coordinate space: {space}")
+
+    sx, sy = page.source_scale() if space == "page" else (1.0, 1.0)
+    x1, y1, x2, y2 = bbox
+    rect = (x1 / sx, y1 / sy, x2 / sx, y2 / sy)
+
+    region = page.select(page.spatial_index().query(rect, mode))
+    if space == "page":
+        region.boxes = np.rint(region.boxes * [sx, sy, sx, sy]).astype(np.int32)
+        if region.polys is not None:
+            region.polys = np.rint(region.polys * [sx, sy]).astype(np.int32)
+        region.image_size = region.source_size or region.image_size
+    region.arranged_text = arrange_text_by_position(region.texts, region.boxes)
+    return region
+
+
+def arrange_text_in_region(page: PageResult, bbox: Sequence[float], space: str = "page",
+                           mode: str = "center") -> str:
+    """
+    Arrange the text inside a rectangle of a page (see ``query_region``).
+    """
+    return query_region(page, bbox, space, mode).arranged_text
+
+
+def to_pil_image(image) -> Image.Image:
+    """Accept a PIL Image or numpy array and return a PIL Image."""
+    if hasattr(image, 'shape'):
+        # Already a numpy array - convert to PIL Image for preprocessing
+        if len(image.shape) == 3 and image.shape[2] == 3:
+            # Convert BGR to RGB if needed (OpenCV format)
+            if image.dtype != np.uint8:
+                image = (image * 255).astype(np.uint8)
+            return Image.fromarray(image)
+        # Handle other numpy array formats
+        return Image.fromarray(image)
+    # Already a PIL Image
+    return image
+
+
+def prepare_page(image) -> Tuple[Image.Image, np.ndarray]:
+    """
+    Convert and preprocess a page for OCR.
+
+    Returns:
+        (original PIL image, preprocessed (H, W, 3) array)
+    """
+    with stage("preprocess"):
+        pil_image = to_pil_image(image)
+        # Apply preprocessing (resize to max 1024px, enhance contrast, etc.)
+        return pil_image, preprocess_for_ocr(pil_image)
+
+
+def ocr_page(image, engine: OCREngine = None) -> Tuple[PageResult, np.ndarray]:
+    """
+    Preprocess one page, run OCR and arrange its text.
+
+    Args:
+        image: PIL Image or numpy array
+        engine: OCR engine to use (default: ``get_engine()``)
+
+    Returns:
+        (PageResult, preprocessed image the boxes refer to)
+    """
+    pil_image, preprocessed_img = prepare_page(image)
+    page = infer_page(pil_image, preprocessed_img, engine)
+    return arrange_page(page), preprocessed_img
+
+
+def infer_page(pil_image: Image.Image, preprocessed_img: np.ndarray,
+               engine: OCREngine = None,
+               predict: Callable[[np.ndarray], PageResult] = None) -> PageResult:
+    """
+    Run OCR on a prepared page and record its image and source sizes.
+
+    ``predict`` replaces ``engine.predict`` (e.g. an orientation-aware call).
+    """
+    predict = predict or (engine or get_engine()).predict
+    with stage("infer"):
+        page = predict(preprocessed_img)
+    page.image_size = (preprocessed_img.shape[1], preprocessed_img.shape[0])
+    page.source_size = pil_image.size
+    return page
+
+
+def detect_page(image, detector: TextDetector = None) -> PageResult:
+    """
+    Detection only: text-line boxes and polygons of a page, without
+    recognition (texts are empty, scores are detection scores).
+
+    Args:
+        image: PIL Image or numpy array
+        detector: Text detector (default: ``get_detector()``)
+    """
+    detector = detector or get_detector()
+    pil_image, preprocessed_img = prepare_page(image)
+    with stage("detect"):
+        polys, scores = detector.detect(preprocessed_img)
+    return PageResult(texts=[''] * len(polys), boxes=polys_to_boxes(polys), scores=scores,
+                      polys=polys, image_size=(preprocessed_img.shape[1],
+                                               preprocessed_img.shape[0]),
+                      source_size=pil_image.size)
+
+
+def detections_to_dict(page: PageResult, space: str = "page") -> Dict[str, Any]:
+    """
+    JSON form of a ``detect_page`` result.
+
+    Args:
+        page: Detection result
+        space: ``page`` for original page coordinates, ``image`` for the
+            preprocessed image the regions were detected on
+    """
+    if space not in ("page", "image"):
+        raise ValueError(f"Unknown coordinate space: {space}")
+    sx, sy = page.source_scale() if space == "page" else (1.0, 1.0)
+    size = (page.source_size or page.image_size) if space == "page" else page.image_size
+    polys = page.polys if page.polys is not None else np.zeros((0, 4, 2), np.int32)
+    result = {
+        'boxes': np.rint(page.boxes * [sx, sy, sx, sy]).astype(np.int64).tolist(),
+        'polys': np.rint(polys * [sx, sy]).astype(np.int64).tolist(),
+        'scores': page.scores.tolist(),
+        'size': list(size) if size else None,
+    }
+    if page.page_number is not None:
+        result = {'page_number': page.page_number, **result}
+    return result
+
+
+def arrange_page(page: PageResult) -> PageResult:
+    """Fill in the page's arranged text (reading order)."""
+    if len(page):
+        with stage("layout"):
+            page.arranged_text = arrange_text_by_position(page.texts, page.boxes)
+    return page
+
+
+def process_image_direct(image, engine: OCREngine = None) -> Dict[str, Any]:
     """
     Process an image through OCR and return structured results without saving files.
 
     Args:
         image: PIL Image or numpy array
+        engine: OCR engine to use (default: ``get_engine()``)
 
     Returns:
-        Dictionary with OCR results including text, boxes, and arranged text
+        Dictionary with a list of PageResult under 'results' (see
+        ``ocr.result.pages_to_dicts`` for the JSON form)
     """
     try:
-        # Preprocess the image first (resize, enhance, etc.)
-        if hasattr(image, 'shape'):
-            # Already a numpy array - convert to PIL Image for preprocessing
-            if len(image.shape) == 3 and image.shape[2] == 3:
-                # Convert BGR to RGB if needed (OpenCV format)
-                if image.dtype != np.uint8:
-                    image = (image * 255).astype(np.uint8)
-                pil_image = Image.fromarray(image)
-            else:
-                # Handle other numpy array formats
-                pil_image = Image.fromarray(image)
-        else:
-            # Already a PIL Image
-            pil_image = image
-
-        # Apply preprocessing (resize to max 1024px, enhance contrast, etc.)
-        preprocessed_img = preprocess_for_ocr(pil_image)
-
-        # Run OCR on the preprocessed image
-        output = ocr.predict(preprocessed_img)
-
-        # Extract text and boxes from OCR results
-        results = []
-        for res in output:
-            # Check if the result has the expected OCR data in JSON
-            if hasattr(res, 'json') and 'res' in res.json:
-                json_data = res.json['res']
-                rec_texts = json_data.get('rec_texts', [])
-                rec_boxes = json_data.get('rec_boxes', [])
-                rec_scores = json_data.get('rec_scores', [])
-
-                if rec_texts and rec_boxes:
-                    arranged_text = arrange_text_by_position(
-                        rec_texts, rec_boxes)
-                    results.append({
-                        'texts': rec_texts,
-                        'boxes': rec_boxes,
-                        'scores': rec_scores,
-                        'arranged_text': arranged_text
-                    })
-                else:
-                    # Still add an empty result to maintain structure
-                    results.append({
-                        'texts': [],
-                        'boxes': [],
-                        'scores': [],
-                        'arranged_text': ''
-                    })
-            else:
-                # Still add an empty result to maintain structure
-                results.append({
-                    'texts': [],
-                    'boxes': [],
-                    'scores': [],
-                    'arranged_text': ''
-                })
+        page, _ = ocr_page(image, engine)
+        results = [page]
 
         return {
             'success': True,
@@ -191,22 +224,7 @@ def ocr_document(images: list, output_dir="output"):
         print(f"Processing image {i + 1}")
 
         # Preprocess the image first (resize, enhance, etc.)
-        if hasattr(image, 'shape'):
-            # Already a numpy array - convert to PIL Image for preprocessing
-            if len(image.shape) == 3 and image.shape[2] == 3:
-                # Convert BGR to RGB if needed (OpenCV format)
-                if image.dtype != np.uint8:
-                    image = (image * 255).astype(np.uint8)
-                pil_image = Image.fromarray(image)
-            else:
-                # Handle other numpy array formats
-                pil_image = Image.fromarray(image)
-        else:
-            # Already a PIL Image
-            pil_image = image
-
-        # Apply preprocessing (resize to max 1024px, enhance contrast, etc.)
-        preprocessed_img = preprocess_for_ocr(pil_image)
+        pil_image, preprocessed_img = prepare_page(image)
 
         print(
             f"Original image shape: {np.array(pil_image).shape if hasattr(pil_image, 'size') else image.shape}")
@@ -216,7 +234,7 @@ def ocr_document(images: list, output_dir="output"):
         # Run OCR
         print("Running OCR...")
         try:
-            output = ocr.predict(preprocessed_img)
+            output = get_engine('paddle').predict_raw(preprocessed_img)
             print("OCR completed successfully")
 
             # Save the result as Markdown
@@ -0,0 +1,454 @@
+"""
+Staged, pipelined page processing.
+
+A document's pages flow through rasterize -> preprocess -> infer -> layout.
+Each stage has its own worker threads and a bounded input queue, so the
+rasterizer (poppler subprocesses), OpenCV preprocessing and inference
+overlap. Wall time for a long document approaches that of the slowest stage
+rather than the sum of all stages, and only a few pages are in memory at a
+time. Results come out in page order.
+
+The output queue is bounded too, and the feeder takes a new item only
+while fewer than ``max_in_flight`` items are ahead of the consumer, so a
+slow consumer (a client reading a streamed export) stalls the workers
+instead of letting finished pages pile up in the reorder buffer.
+
+Stage concurrency and queue size are configured with
+``OCR_PIPELINE_RASTERIZE_WORKERS`` (default 2),
+``OCR_PIPELINE_PREPROCESS_WORKERS`` (2), ``OCR_PIPELINE_INFER_WORKERS`` (1),
+``OCR_PIPELINE_LAYOUT_WORKERS`` (1) and ``OCR_PIPELINE_QUEUE_SIZE`` (4).
+Queue occupancy and busy time per stage are reported by
+``pipeline_stats()``.
+
+Given a result store (``ocr.store``), each preprocessed page is
+fingerprinted and a page already in the store skips inference and layout:
+its stored result is reused and marked ``reused``. A revised document is
+then only recognized on the pages that changed.
+
+Given a ``DocumentOrientation`` (``ocr.orientation``), the preprocess stage
+rotates pages by the orientation agreed for the document and the infer
+stage recognizes them with the engine's orientation models switched off.
+"""
+import contextvars
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from PIL import Image
+
+from ocr.engine import OCREngine, get_engine
+from ocr.orientation import DocumentOrientation
+from ocr.paddle import arrange_page, infer_page, prepare_page, to_pil_image
+from ocr.store import ResultStore, page_fingerprint
+from utils.profiling import profile_page, stage
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One pipeline step.
+
+    Args:
+        name: Stage name (used in stats)
+        fn: Function applied to each item
+        workers: Threads running ``fn`` concurrently
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+
+
+class _StageState:
+    def __init__(self, stage: Stage, queue_size: int):
+        self.stage = stage
+        self.input: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.busy = 0
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.max_queued = 0
+        self.finished_workers = 0
+        self.lock = threading.Lock()
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        capacity = elapsed * self.stage.workers
+        return {
+            'workers': self.stage.workers,
+            'queued': self.input.qsize(),
+            'queue_size': self.input.maxsize,
+            'max_queued': self.max_queued,
+            'busy': self.busy,
+            'processed': self.processed,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'utilization': round(self.busy_seconds / capacity, 3) if capacity else 0.0,
+        }
+
+
+def max_in_flight(stages: List[Stage], queue_size: int) -> int:
+    """
+    Most items fed to a pipeline and not yet taken by its consumer: one per
+    worker, plus a full input queue for every stage after the first.
+    """
+    return sum(stage.workers for stage in stages) + (len(stages) - 1) * queue_size
+
+
+class PipelineRun:
+    """
+    A running pipeline: iterate for the results, in input order.
+
+    Worker threads start on construction and run in copies of the creating
+    thread's context (recognition cache, profiler). ``close()`` stops them
+    early; iteration to the end closes automatically. At most
+    ``max_in_flight(stages, queue_size)`` items are between the feeder and
+    the consumer at any time.
+    """
+
+    def __init__(self, stages: List[Stage], items: Iterable[Any], queue_size: int,
+                 name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self._states = [_StageState(stage, queue_size) for stage in stages]
+        self._output: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._pending: Dict[int, Any] = {}
+        self._next = 0
+        self._window = max_in_flight(stages, queue_size)
+        self._consumed = threading.Condition()
+        self._fed = 0
+        self._total = None
+        self._finished = False
+        self._threads = []
+
+        self._start(self._feed, items)
+        for index, state in enumerate(self._states):
+            for _ in range(state.stage.workers):
+                self._start(self._work, index)
+        _register(self)
+
+    def _start(self, target, *args):
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(target, *args), daemon=True,
+                                  name=f"pipeline-{self.name}-{getattr(target, '__name__', '')}")
+        thread.start()
+        self._threads.append(thread)
+
+    def _put(self, q: "queue.Queue", item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, error: BaseException):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _wait_for_room(self, seq: int) -> bool:
+        """Block until item ``seq`` is within the in-flight window of the consumer."""
+        with self._consumed:
+            while seq >= self._next + self._window:
+                if self._stop.is_set():
+                    return False
+                self._consumed.wait(0.1)
+        return not self._stop.is_set()
+
+    def _feed(self, items: Iterable[Any]):
+        first = self._states[0]
+        count = 0
+        try:
+            iterator = iter(items)
+            while True:
+                if not self._wait_for_room(count):
+                    return
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                if not self._put(first.input, (count, item)):
+                    return
+                count += 1
+                self._fed = count
+                with first.lock:
+                    first.max_queued = max(first.max_queued, first.input.qsize())
+        except BaseException as e:
+            self._fail(e)
+            return
+        self._total = count
+        for _ in range(first.stage.workers):
+            self._put(first.input, _DONE)
+
+    def _work(self, index: int):
+        state = self._states[index]
+        last = index == len(self._states) - 1
+        target = self._output if last else self._states[index + 1].input
+
+        while not self._stop.is_set():
+            try:
+                entry = state.input.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if entry is _DONE:
+                with state.lock:
+                    state.finished_workers += 1
+                    all_done = state.finished_workers == state.stage.workers
+                if all_done:
+                    if last:
+                        self._put(self._output, _DONE)
+                    else:
+                        for _ in range(self._states[index + 1].stage.workers):
+                            self._put(target, _DONE)
+                return
+
+            seq, item = entry
+            with state.lock:
+                state.busy += 1
+            started = time.perf_counter()
+            try:
+                with profile_page(seq + 1):
+                    result = state.stage.fn(item)
+            except BaseException as e:
+                self._fail(e)
+                return
+            finally:
+                with state.lock:
+                    state.busy -= 1
+                    state.processed += 1
+                    state.busy_seconds += time.perf_counter() - started
+
+            if not self._put(target, (seq, result)):
+                return
+            if not last:
+                nxt = self._states[index + 1]
+                with nxt.lock:
+                    nxt.max_queued = max(nxt.max_queued, nxt.input.qsize())
+
+    def __iter__(self) -> Iterator[Any]:
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        while self._next not in self._pending:
+            if self._error is not None:
+                self.close()
+                raise self._error
+            try:
+                entry = self._output.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if entry is _DONE:
+                if self._error is not None:
+                    continue
+                if self._total is not None and self._next >= self._total:
+                    self._finished = True
+                    self.close()
+                    raise StopIteration
+                continue
+            seq, result = entry
+            self._pending[seq] = result
+        result = self._pending.pop(self._next)
+        with self._consumed:
+            self._next += 1
+            self._consumed.notify()
+        return result
+
+    def close(self):
+        """Stop the worker threads (results not yet taken are dropped)."""
+        self._stop.set()
+        current = threading.current_thread()
+        for thread in self._threads:
+            if thread is not current:
+                # Workers finish the item in hand, then see the stop flag
+                thread.join()
+        _unregister(self)
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'name': self.name,
+            'seconds': round(elapsed, 3),
+            'in_flight': self._fed - self._next,
+            'max_in_flight': self._window,
+            'stages': {state.stage.name: state.stats(elapsed) for state in self._states},
+        }
+
+
+class Pipeline:
+    """
+    Ordered chain of stages connected by bounded queues.
+
+    Args:
+        stages: Stages in order
+        queue_size: Capacity of each stage's input queue
+        name: Label reported in stats
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 4, name: str = "pipeline"):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.name = name
+
+    def run(self, items: Iterable[Any]) -> PipelineRun:
+        return PipelineRun(self.stages, items, self.queue_size, self.name)
+
+
+# Active runs and cumulative per-stage totals, for metrics
+_active: Dict[int, PipelineRun] = {}
+_totals: Dict[str, Dict[str, float]] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(run: PipelineRun):
+    with _registry_lock:
+        _active[id(run)] = run
+
+
+def _unregister(run: PipelineRun):
+    with _registry_lock:
+        if _active.pop(id(run), None) is None:
+            return
+        for state in run._states:
+            totals = _totals.setdefault(state.stage.name,
+                                        {'processed': 0, 'busy_seconds': 0.0, 'max_queued': 0})
+            totals['processed'] += state.processed
+            totals['busy_seconds'] = round(totals['busy_seconds'] + state.busy_seconds, 3)
+            totals['max_queued'] = max(totals['max_queued'], state.max_queued)
+
+
+def pipeline_stats() -> Dict[str, Any]:
+    """Occupancy of running pipelines and per-stage totals of finished ones."""
+    with _registry_lock:
+        active = [run.stats() for run in _active.values()]
+        totals = {name: dict(values) for name, values in _totals.items()}
+    return {'active': active, 'totals': totals}
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _stage_workers(stage_name: str, default: int, workers: Dict[str, int]) -> int:
+    return workers.get(stage_name) or _env_int(
+        f"OCR_PIPELINE_{stage_name.upper()}_WORKERS", default)
+
+
+def document_pages_in_flight(**workers) -> int:
+    """
+    Most rendered pages a document pipeline holds at once.
+
+    The pipeline's in-flight window (``max_in_flight``: one page per
+    rasterize worker, plus a full queue and one page per worker for each
+    later stage), plus the page being consumed.
+    """
+    stages = [Stage(stage_name, None, _stage_workers(stage_name, default, workers))
+              for stage_name, default in (("rasterize", 2), ("preprocess", 2),
+                                          ("infer", 1), ("layout", 1))]
+    return max_in_flight(stages, _env_int("OCR_PIPELINE_QUEUE_SIZE", 4)) + 1
+
+
+def document_pipeline(engine: OCREngine = None, render: Callable[[int], Image.Image] = None,
+                      store: ResultStore = None, orientation: DocumentOrientation = None,
+                      **workers) -> Pipeline:
+    """
+    The rasterize -> preprocess -> infer -> layout pipeline.
+
+    Items are page numbers when ``render`` is given (pages are rasterized
+    by the pipeline), otherwise ``(page number, image)`` pairs. Results are
+    ``(PageResult, page image)`` pairs with the page number set.
+
+    Args:
+        engine: OCR engine (default: ``get_engine()``)
+        render: Page number -> PIL Image, e.g. ``DocumentSource.render``
+        store: Result store to reuse the results of already recognized pages from
+        orientation: Document-level orientation (default: per-page classification
+            by the engine)
+        **workers: Per-stage worker overrides (``rasterize=3``, ``infer=2``, ...)
+    """
+    engine = engine or get_engine()
+
+    def count(stage_name: str, default: int) -> int:
+        return _stage_workers(stage_name, default, workers)
+
+    def rasterize(page_number):
+        return page_number, render(page_number)
+
+    identity = engine.identity() if store is not None else None
+
+    def preprocess(item):
+        page_number, image = item
+        dpi = getattr(image, "info", {}).get("render_dpi")
+        upright = False
+        if orientation is not None:
+            image = to_pil_image(image)
+            angle, upright = orientation.resolve(image)
+            if angle:
+                with stage("rotate"):
+                    # Counter-clockwise, like the engine's own orientation correction
+                    image = image.rotate(angle, expand=True)
+        pil_image, preprocessed = prepare_page(image)
+        fingerprint = None
+        if store is not None:
+            with stage("fingerprint"):
+                fingerprint = page_fingerprint(preprocessed, identity)
+        return page_number, pil_image, preprocessed, fingerprint, upright, dpi
+
+    def infer(item):
+        page_number, pil_image, preprocessed, fingerprint, upright, dpi = item
+        page = store.find_page(fingerprint) if fingerprint else None
+        if page is not None:
+            page.reused = True
+        else:
+            predict = None
+            if orientation is not None:
+                def predict(image):
+                    return orientation.recognize(engine, image, upright, page_number)
+            page = infer_page(pil_image, preprocessed, engine, predict)
+            page.fingerprint = fingerprint
+        page.page_number = page_number
+        page.dpi = dpi
+        return page, pil_image
+
+    def layout(item):
+        page, pil_image = item
+        if page.reused:
+            # Stored with its arranged text
+            return page, pil_image
+        return arrange_page(page), pil_image
+
+    stages = []
+    if render is not None:
+        stages.append(Stage("rasterize", rasterize, count("rasterize", 2)))
+    stages += [
+        Stage("preprocess", preprocess, count("preprocess", 2)),
+        Stage("infer", infer, count("infer", 1)),
+        Stage("layout", layout, count("layout", 1)),
+    ]
+    return Pipeline(stages, queue_size=_env_int("OCR_PIPELINE_QUEUE_SIZE", 4), name="document")
+
+
+def ocr_pages(images: Iterable[Image.Image] = None, source=None, engine: OCREngine = None,
+              store: ResultStore = None, orientation: DocumentOrientation = None,
+              **workers) -> PipelineRun:
+    """
+    Pipelined OCR of a document's pages, yielding ``(PageResult, image)`` in page order.
+
+    Pass either ``images`` (already rendered pages) or ``source`` (a
+    ``utils.ingest.DocumentSource``, rendered page by page inside the
+    pipeline). With ``store``, unchanged pages reuse stored results; with
+    ``orientation``, pages are oriented once per document.
+    """
+    if source is not None:
+        return document_pipeline(engine, render=source.render, store=store,
+                                 orientation=orientation, **workers).run(
+            range(1, source.page_count + 1))
+    return document_pipeline(engine, store=store, orientation=orientation,
+                             **workers).run(enumerate(images, 1))
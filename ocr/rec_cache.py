@@ -0,0 +1,304 @@
+"""
+Recognition cache for repeated line crops.
+
+Letterheads, footers and boilerplate repeat on every page of long
+documents. Each line crop is reduced to a perceptual hash (grayscale, cut
+to its ink and scaled to a fixed grid, horizontal gradient signs), and a
+crop whose hash is close to one seen before reuses the earlier recognition
+result instead of going through the recognizer again. Closeness is judged
+block by block, so scan noise, JPEG artifacts and a box that is off by a
+pixel still hit, while a line that differs in one character does not.
+
+Two scopes are supported: a process-wide global cache and a per-document
+cache that lives for one ``document_cache()`` block. Configure with
+``OCR_REC_CACHE`` (``off``, ``document``, ``global`` or ``both``) and
+``OCR_REC_CACHE_SIZE`` (entries per cache).
+"""
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ocr.recognition import LineRecognizer
+
+HASH_HEIGHT = 12
+HASH_BLOCK = 6                 # columns per block, about one glyph at HASH_HEIGHT
+HASH_BLOCKS = 42
+HASH_WIDTH = HASH_BLOCK * HASH_BLOCKS
+EDGE_MARGIN = 8                # gray levels a gradient must exceed to set a bit
+MAX_BLOCK_DISTANCE = 0.09      # share of any one block's bits that may differ
+ASPECT_STEP = 1.05             # ratio between neighbouring aspect-ratio buckets
+MAX_ASPECT_DIFFERENCE = 0.03
+
+# Set bits per byte value, for Hamming distances of packed bits
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class CropHash:
+    """
+    Perceptual hash of a line crop.
+
+    Attributes:
+        bucket: Aspect-ratio bucket of the inked area (the key's prefix)
+        aspect: Width / height of the inked area
+        bits: (HASH_BLOCKS, bytes per block) packed gradient bits, block by block
+    """
+
+    __slots__ = ('bucket', 'aspect', 'bits')
+
+    def __init__(self, aspect: float, bits: np.ndarray):
+        self.aspect = aspect
+        self.bucket = int(round(np.log(max(aspect, 1e-3)) / np.log(ASPECT_STEP)))
+        self.bits = bits
+
+
+def _ink_box(gray: np.ndarray) -> np.ndarray:
+    """``gray`` cropped to its ink, so a box that is off by a pixel or two hashes the same."""
+    threshold, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    ink = gray < min(threshold, 200)
+    # Two ink pixels per row/column, so a lone speck does not widen the box
+    rows = np.flatnonzero(np.count_nonzero(ink, axis=1) >= 2)
+    cols = np.flatnonzero(np.count_nonzero(ink, axis=0) >= 2)
+    if not len(rows) or not len(cols):
+        return gray
+    return gray[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def crop_hash(crop: np.ndarray) -> CropHash:
+    """
+    Perceptual hash of a line crop, normalized for position, size and brightness.
+
+    The crop is cut to its inked area and scaled to a fixed
+    ``HASH_HEIGHT`` x ``HASH_WIDTH`` grid. Each cell is compared with its
+    right neighbour, and a bit is set for a clear rise and for a clear fall
+    (by more than ``EDGE_MARGIN``), so flat paper and faint noise give no
+    bits. The aspect ratio of the inked area is kept next to the bits.
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    gray = _ink_box(gray)
+    height, width = gray.shape[:2]
+    small = cv2.resize(gray, (HASH_WIDTH + 1, HASH_HEIGHT),
+                       interpolation=cv2.INTER_AREA).astype(np.int16)
+    gradient = small[:, 1:] - small[:, :-1]
+    planes = np.stack([gradient > EDGE_MARGIN, gradient < -EDGE_MARGIN])
+    # (2, H, W) -> (blocks, 2 * H * HASH_BLOCK), so a block's bits are contiguous
+    blocks = planes.reshape(2, HASH_HEIGHT, HASH_BLOCKS, HASH_BLOCK).transpose(2, 0, 1, 3)
+    bits = np.packbits(blocks.reshape(HASH_BLOCKS, -1), axis=1)
+    return CropHash(width / max(height, 1), bits)
+
+
+def block_distances(bits: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """
+    Largest share of differing bits in any one block, for each candidate.
+
+    A different digit or letter changes a block or two almost completely,
+    while noise and compression flip a few bits spread over the line, so
+    the worst block separates the two far better than the whole line would.
+    """
+    differing = _POPCOUNT[np.bitwise_xor(candidates, bits)].sum(axis=2, dtype=np.int32)
+    return differing.max(axis=1) / (bits.shape[1] * 8)
+
+
+class RecognitionCache:
+    """
+    Bounded LRU of crop hash -> (text, score), with hit-rate metrics.
+
+    A lookup hits an entry whose hash is within ``MAX_BLOCK_DISTANCE`` in
+    every block and whose aspect ratio is within ``MAX_ASPECT_DIFFERENCE``.
+    Entries are bucketed by the aspect-ratio prefix of their hash, and only
+    the lookup's bucket and its two neighbours are compared (in one
+    vectorized pass each).
+
+    Args:
+        max_entries: Maximum cached lines
+        scope: Label reported in stats (``global`` or ``document``)
+    """
+
+    def __init__(self, max_entries: int = 10000, scope: str = "global"):
+        self.max_entries = max_entries
+        self.scope = scope
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[int, Tuple[CropHash, str, float]]" = OrderedDict()
+        self._buckets: Dict[int, Dict[int, None]] = {}
+        # Stacked bits of a bucket's entries, rebuilt after the bucket changes
+        self._matrices: Dict[int, Tuple[List[int], np.ndarray]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _matrix(self, bucket: int) -> Optional[Tuple[List[int], np.ndarray]]:
+        members = self._buckets.get(bucket)
+        if not members:
+            return None
+        cached = self._matrices.get(bucket)
+        if cached is None:
+            ids = list(members)
+            cached = (ids, np.stack([self._entries[i][0].bits for i in ids]))
+            self._matrices[bucket] = cached
+        return cached
+
+    def _find(self, key: CropHash) -> Optional[int]:
+        """The closest entry within ``MAX_BLOCK_DISTANCE`` (and aspect), if any."""
+        best, best_distance = None, MAX_BLOCK_DISTANCE
+        for bucket in (key.bucket - 1, key.bucket, key.bucket + 1):
+            matrix = self._matrix(bucket)
+            if matrix is None:
+                continue
+            ids, bits = matrix
+            distances = block_distances(key.bits, bits)
+            candidates = np.flatnonzero(distances <= best_distance)
+            if not len(candidates):
+                continue
+            aspects = np.array([self._entries[ids[i]][0].aspect for i in candidates.tolist()])
+            candidates = candidates[np.abs(aspects / key.aspect - 1) <= MAX_ASPECT_DIFFERENCE]
+            if not len(candidates):
+                continue
+            i = candidates[np.argmin(distances[candidates])]
+            if best is None or distances[i] < best_distance:
+                best, best_distance = ids[i], distances[i]
+        return best
+
+    def get(self, key: CropHash) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry_id = self._find(key)
+            if entry_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            _, text, score = self._entries[entry_id]
+            return text, score
+
+    def put(self, key: CropHash, text: str, score: float):
+        with self._lock:
+            entry_id, self._next_id = self._next_id, self._next_id + 1
+            self._entries[entry_id] = (key, text, score)
+            self._buckets.setdefault(key.bucket, {})[entry_id] = None
+            self._matrices.pop(key.bucket, None)
+            while len(self._entries) > self.max_entries:
+                old_id, (old_key, _, _) = self._entries.popitem(last=False)
+                members = self._buckets[old_key.bucket]
+                del members[old_id]
+                if not members:
+                    del self._buckets[old_key.bucket]
+                self._matrices.pop(old_key.bucket, None)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'scope': self.scope,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def cache_mode() -> str:
+    return os.environ.get('OCR_REC_CACHE', 'off').lower()
+
+
+def _cache_size() -> int:
+    return int(os.environ.get('OCR_REC_CACHE_SIZE', 10000))
+
+
+_global_cache = RecognitionCache(max_entries=_cache_size(), scope="global")
+_document_cache: ContextVar[Optional[RecognitionCache]] = ContextVar(
+    'ocr_document_rec_cache', default=None)
+
+
+def get_global_cache() -> RecognitionCache:
+    return _global_cache
+
+
+@contextmanager
+def document_cache(enabled: bool = None):
+    """
+    Scope a per-document cache to this block (and the current context).
+
+    Yields:
+        The document RecognitionCache, or None when document caching is off
+    """
+    if enabled is None:
+        enabled = cache_mode() in ('document', 'both')
+    if not enabled:
+        yield None
+        return
+
+    cache = RecognitionCache(max_entries=_cache_size(), scope="document")
+    token = _document_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _document_cache.reset(token)
+
+
+class CachedRecognizer(LineRecognizer):
+    """
+    Wraps a recognizer with the document and/or global recognition cache.
+
+    Only cache misses are sent to the wrapped recognizer, in one batch.
+    """
+
+    name = "cached"
+
+    def __init__(self, recognizer: LineRecognizer, use_global: bool = True):
+        self.recognizer = recognizer
+        self.use_global = use_global
+
+    def _caches(self) -> List[RecognitionCache]:
+        caches = []
+        document = _document_cache.get()
+        if document is not None:
+            caches.append(document)
+        if self.use_global:
+            caches.append(_global_cache)
+        return caches
+
+    def recognize(self, crops: List[np.ndarray]) -> Tuple[List[str], np.ndarray]:
+        caches = self._caches()
+        if not caches:
+            return self.recognizer.recognize(crops)
+
+        texts: List[Optional[str]] = [None] * len(crops)
+        scores = np.zeros(len(crops))
+        keys = [crop_hash(crop) for crop in crops]
+        missing = []
+
+        for i, key in enumerate(keys):
+            for cache in caches:
+                hit = cache.get(key)
+                if hit is not None:
+                    texts[i], scores[i] = hit
+                    break
+            else:
+                missing.append(i)
+
+        if missing:
+            new_texts, new_scores = self.recognizer.recognize([crops[i] for i in missing])
+            for i, text, score in zip(missing, new_texts, new_scores):
+                texts[i], scores[i] = text, float(score)
+                for cache in caches:
+                    cache.put(keys[i], text, float(score))
+
+        return texts, scores
+
+
+def with_cache(recognizer: LineRecognizer) -> LineRecognizer:
+    """Wrap ``recognizer`` according to ``OCR_REC_CACHE`` (unchanged when off)."""
+    mode = cache_mode()
+    if mode == 'off':
+        return recognizer
+    return CachedRecognizer(recognizer, use_global=mode in ('global', 'both'))
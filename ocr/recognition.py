@@ -0,0 +1,152 @@
+"""
+Line-crop helpers and standalone text recognizers.
+
+Recognizers take already-cropped text lines and run only the recognition
+model, which is what the cascade (re-recognizing weak lines) and any other
+crop-level path need. Paddle recognizers are held by the model registry.
+
+The shared recognizer for crop-only requests is configured with
+``OCR_REC_MODEL`` (default PP-OCRv5 server rec; ``stub`` for tests).
+"""
+import os
+import threading
+import zlib
+from typing import Dict, List, Tuple, Sequence
+
+import cv2
+import numpy as np
+
+from ocr.device import resolve_device_kwargs
+from ocr.registry import get_registry
+from ocr.result import PageResult
+from utils.profiling import stage
+
+SERVER_REC_MODEL = "PP-OCRv5_server_rec"
+MOBILE_REC_MODEL = "PP-OCRv5_mobile_rec"
+
+
+def crop_quad(image: np.ndarray, quad: np.ndarray, rotate_vertical: bool = True) -> np.ndarray:
+    """
+    Perspective-crop a text line given its 4-point polygon.
+
+    Tall crops (vertical text) are rotated to horizontal, as Paddle does,
+    unless ``rotate_vertical`` is false.
+    """
+    quad = np.asarray(quad, dtype=np.float32).reshape(4, 2)
+    width = int(max(np.linalg.norm(quad[0] - quad[1]), np.linalg.norm(quad[2] - quad[3])))
+    height = int(max(np.linalg.norm(quad[0] - quad[3]), np.linalg.norm(quad[1] - quad[2])))
+    width, height = max(width, 1), max(height, 1)
+
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(quad, target)
+    crop = cv2.warpPerspective(image, matrix, (width, height),
+                               borderMode=cv2.BORDER_REPLICATE,
+                               flags=cv2.INTER_CUBIC)
+    if rotate_vertical and height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def crop_box(image: np.ndarray, box: Sequence[float]) -> np.ndarray:
+    """Axis-aligned crop of [x1, y1, x2, y2], clipped to the image."""
+    height, width = image.shape[:2]
+    x1, y1, x2, y2 = (int(round(v)) for v in box[:4])
+    x1 = min(max(x1, 0), width - 1)
+    y1 = min(max(y1, 0), height - 1)
+    x2 = min(max(x2, x1 + 1), width)
+    y2 = min(max(y2, y1 + 1), height)
+    return image[y1:y2, x1:x2]
+
+
+def crop_lines(image: np.ndarray, page: PageResult, indices=None) -> List[np.ndarray]:
+    """
+    Crops of the given lines of a page (all lines by default).
+
+    Uses the detection polygons when available, otherwise the boxes.
+    """
+    if indices is None:
+        indices = range(len(page))
+    with stage("crop"):
+        if page.polys is not None:
+            return [crop_quad(image, page.polys[i]) for i in indices]
+        return [crop_box(image, page.boxes[i]) for i in indices]
+
+
+class LineRecognizer:
+    """Base class for crop-level text recognizers."""
+
+    name = "base"
+
+    def recognize(self, crops: List[np.ndarray]) -> Tuple[List[str], np.ndarray]:
+        """
+        Recognize a batch of line crops.
+
+        Returns:
+            (texts, scores) with one entry per crop
+        """
+        raise NotImplementedError
+
+
+class PaddleLineRecognizer(LineRecognizer):
+    """PaddleOCR ``TextRecognition`` module (no detection or orientation models)."""
+
+    name = "paddle"
+    module_kind = "TextRecognition"
+
+    def __init__(self, model_name: str = SERVER_REC_MODEL, batch_size: int = 16,
+                 **module_kwargs):
+        self.batch_size = batch_size
+        self.module_kwargs = {'model_name': model_name,
+                              **resolve_device_kwargs(module_kwargs), **module_kwargs}
+
+    def _build(self):
+        from paddleocr import TextRecognition
+        return TextRecognition(**self.module_kwargs)
+
+    def recognize(self, crops: List[np.ndarray]) -> Tuple[List[str], np.ndarray]:
+        if not crops:
+            return [], np.zeros(0)
+
+        texts, scores = [], []
+        with get_registry().use(self.module_kind, self.module_kwargs, self._build) as model, \
+                stage(self.module_kind):
+            for res in model.predict(crops, batch_size=self.batch_size):
+                texts.append(res['rec_text'])
+                scores.append(float(res['rec_score']))
+        return texts, np.asarray(scores)
+
+
+class StubLineRecognizer(LineRecognizer):
+    """Deterministic fake recognizer for benchmarking crop-level paths."""
+
+    name = "stub"
+
+    def __init__(self, score: float = 0.99):
+        self.score = score
+
+    def recognize(self, crops: List[np.ndarray]) -> Tuple[List[str], np.ndarray]:
+        texts = [f"line-{zlib.crc32(np.ascontiguousarray(c[::4, ::4]).tobytes()):08x}"
+                 for c in crops]
+        return texts, np.full(len(crops), self.score)
+
+
+def create_recognizer(model_name: str = SERVER_REC_MODEL, **kwargs) -> LineRecognizer:
+    """Paddle recognizer for ``model_name``, or the stub recognizer for ``"stub"``."""
+    if model_name == "stub":
+        return StubLineRecognizer(**kwargs)
+    return PaddleLineRecognizer(model_name, **kwargs)
+
+
+_recognizers: Dict[str, LineRecognizer] = {}
+_recognizers_lock = threading.Lock()
+
+
+def get_recognizer() -> LineRecognizer:
+    """Shared recognizer for ``$OCR_REC_MODEL``, behind the recognition cache."""
+    from ocr.rec_cache import with_cache
+
+    model_name = os.environ.get('OCR_REC_MODEL', SERVER_REC_MODEL)
+    with _recognizers_lock:
+        if model_name not in _recognizers:
+            _recognizers[model_name] = with_cache(create_recognizer(model_name))
+        return _recognizers[model_name]
@@ -0,0 +1,216 @@
+"""
+Process-wide registry of loaded Paddle models.
+
+Each pipeline configuration (kind + constructor kwargs) is built once on
+first use and shared by every engine that asks for the same configuration.
+The registry records an approximate memory footprint per model (RSS delta
+while building) and, when a memory budget is set, evicts the least recently
+used idle models until the resident set fits again.
+
+Configured with ``OCR_MODEL_MEMORY_BUDGET_MB`` (0 = unlimited) and
+``OCR_MODEL_IDLE_SECONDS`` (0 = never evict on idleness alone).
+"""
+import gc
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+from utils.memory import current_rss
+from utils.profiling import stage
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def model_key(kind: str, kwargs: Dict[str, Any]) -> str:
+    """Stable identifier for a pipeline configuration."""
+    params = ','.join(f"{k}={kwargs[k]!r}" for k in sorted(kwargs))
+    return f"{kind}({params})"
+
+
+class _Entry:
+    __slots__ = ('key', 'kind', 'model', 'memory_bytes', 'loaded_at',
+                 'last_used', 'uses', 'in_use')
+
+    def __init__(self, key: str, kind: str, model, memory_bytes: int):
+        self.key = key
+        self.kind = kind
+        self.model = model
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+        self.in_use = 0
+
+
+class ModelRegistry:
+    """
+    Build-once cache of model pipelines with a memory budget.
+
+    Args:
+        memory_budget_mb: Evict idle models when the total estimated size
+            exceeds this (0 = unlimited)
+        idle_seconds: Evict models unused for this long (0 = never)
+        max_events: Number of load/evict events kept for inspection
+    """
+
+    def __init__(self, memory_budget_mb: float = 0, idle_seconds: float = 0,
+                 max_events: int = 200):
+        self.memory_budget_bytes = int(memory_budget_mb * MB)
+        self.idle_seconds = idle_seconds
+        self.events = deque(maxlen=max_events)
+        self._entries: Dict[str, _Entry] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def use(self, kind: str, kwargs: Dict[str, Any], factory: Callable[[], Any]):
+        """
+        Context manager yielding the model for a configuration, building it if needed.
+
+        Models are never evicted while inside this block.
+        """
+        entry = self._acquire(kind, kwargs, factory)
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+
+    def get(self, kind: str, kwargs: Dict[str, Any], factory: Callable[[], Any]):
+        """Return the model for a configuration without pinning it."""
+        with self.use(kind, kwargs, factory) as model:
+            return model
+
+    def _acquire(self, kind: str, kwargs: Dict[str, Any], factory: Callable[[], Any]) -> _Entry:
+        key = model_key(kind, kwargs)
+
+        with self._lock:
+            if self.idle_seconds:
+                self._enforce_limits()
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.in_use += 1
+                entry.uses += 1
+                entry.last_used = time.time()
+                return entry
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            # Another thread may have finished building while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.in_use += 1
+                    entry.uses += 1
+                    entry.last_used = time.time()
+                    return entry
+
+            rss_before = current_rss()
+            started = time.perf_counter()
+            with stage(f"load {kind}"):
+                model = factory()
+            load_seconds = time.perf_counter() - started
+            memory_bytes = max(current_rss() - rss_before, 0)
+
+            with self._lock:
+                entry = _Entry(key, kind, model, memory_bytes)
+                entry.in_use = 1
+                entry.uses = 1
+                self._entries[key] = entry
+                self._record('load', entry, load_seconds=round(load_seconds, 3))
+                self._enforce_limits()
+            return entry
+
+    def _record(self, event: str, entry: _Entry, **extra):
+        info = {
+            'time': time.time(),
+            'event': event,
+            'key': entry.key,
+            'memory_mb': round(entry.memory_bytes / MB, 1),
+            **extra
+        }
+        self.events.append(info)
+        logger.info("model %s: %s (%.1f MB)", event, entry.key, info['memory_mb'])
+
+    def _evict(self, entry: _Entry, reason: str):
+        del self._entries[entry.key]
+        self._record('evict', entry, reason=reason)
+        entry.model = None
+        gc.collect()
+
+    def _enforce_limits(self):
+        now = time.time()
+        idle = [e for e in self._entries.values() if e.in_use == 0]
+
+        if self.idle_seconds:
+            for entry in idle:
+                if now - entry.last_used > self.idle_seconds:
+                    self._evict(entry, 'idle')
+            idle = [e for e in idle if e.key in self._entries]
+
+        if self.memory_budget_bytes:
+            # Least recently used first
+            for entry in sorted(idle, key=lambda e: e.last_used):
+                if self.total_memory_bytes() <= self.memory_budget_bytes:
+                    break
+                self._evict(entry, 'memory_budget')
+
+    def evict_idle(self):
+        """Apply the idle timeout and memory budget now."""
+        with self._lock:
+            self._enforce_limits()
+
+    def clear(self):
+        """Drop every model that is not currently in use."""
+        with self._lock:
+            for entry in [e for e in self._entries.values() if e.in_use == 0]:
+                self._evict(entry, 'clear')
+
+    def total_memory_bytes(self) -> int:
+        return sum(e.memory_bytes for e in self._entries.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Resident models, budget usage and recent load/evict events."""
+        with self._lock:
+            now = time.time()
+            models: List[Dict[str, Any]] = [{
+                'key': e.key,
+                'kind': e.kind,
+                'memory_mb': round(e.memory_bytes / MB, 1),
+                'uses': e.uses,
+                'in_use': e.in_use,
+                'idle_seconds': round(now - e.last_used, 1),
+                'loaded_at': e.loaded_at,
+            } for e in self._entries.values()]
+            return {
+                'memory_budget_mb': round(self.memory_budget_bytes / MB, 1),
+                'memory_used_mb': round(self.total_memory_bytes() / MB, 1),
+                'idle_seconds': self.idle_seconds,
+                'models': models,
+                'events': list(self.events),
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """Return the process-wide registry, configured from the environment."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry(
+                memory_budget_mb=float(
+                    os.environ.get('OCR_MODEL_MEMORY_BUDGET_MB', 0)),
+                idle_seconds=float(
+                    os.environ.get('OCR_MODEL_IDLE_SECONDS', 0)),
+            )
+        return _registry
@@ -0,0 +1,222 @@
+from typing import List, Dict, Any, Sequence, Tuple
+
+import numpy as np
+
+from ocr.spatial import GridIndex
+
+
+class PageResult:
+    """
+    Recognized text lines for a single page.
+
+    Texts are a plain list; boxes, scores and (optional) polygons are
+    contiguous numpy arrays so pages with thousands of lines cost a handful
+    of allocations instead of one dict per line. Coordinates are in the
+    space of the image that was passed to the engine (the preprocessed page),
+    even when the engine rotated that image before recognizing it.
+
+    Attributes:
+        texts: Recognized strings, one per line
+        boxes: (N, 4) int32 array of [x1, y1, x2, y2]
+        scores: (N,) float64 array of recognition confidences
+        polys: (N, 4, 2) int32 array of detection quadrilaterals, or None
+        arranged_text: Text in reading order (filled in by the layout step)
+        page_number: 1-based page number within the source document, if known
+        image_size: (width, height) of the image the boxes refer to
+        source_size: (width, height) of the original page before preprocessing
+        dpi: Resolution the original page was rendered at, if known
+        fingerprint: Hash of the preprocessed page raster and engine, if computed
+        reused: True when the result was taken from the result store instead of OCR
+    """
+
+    __slots__ = ('texts', 'boxes', 'scores', 'polys', 'arranged_text',
+                 'page_number', 'image_size', 'source_size', 'dpi', 'fingerprint', 'reused',
+                 '_spatial_index')
+
+    def __init__(self, texts: Sequence[str] = (), boxes=None, scores=None,
+                 polys=None, arranged_text: str = "", page_number: int = None,
+                 image_size: Tuple[int, int] = None, source_size: Tuple[int, int] = None,
+                 fingerprint: str = None, dpi: int = None):
+        self.texts = list(texts)
+        n = len(self.texts)
+        self.boxes = (np.ascontiguousarray(boxes, dtype=np.int32).reshape(-1, 4)
+                      if boxes is not None and len(boxes) else np.zeros((n, 4), np.int32))
+        self.scores = (np.ascontiguousarray(scores, dtype=np.float64).reshape(-1)
+                       if scores is not None and len(scores) else np.ones(n))
+        self.polys = (np.ascontiguousarray(polys, dtype=np.int32).reshape(-1, 4, 2)
+                      if polys is not None and len(polys) else None)
+        self.arranged_text = arranged_text
+        self.page_number = page_number
+        self.image_size = tuple(image_size) if image_size else None
+        self.source_size = tuple(source_size) if source_size else None
+        self.dpi = dpi
+        self.fingerprint = fingerprint
+        self.reused = False
+        self._spatial_index = None
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __repr__(self) -> str:
+        return f"PageResult(lines={len(self)}, page_number={self.page_number})"
+
+    @classmethod
+    def from_paddle(cls, res, image_size: Tuple[int, int] = None,
+                    angle: int = None) -> "PageResult":
+        """
+        Build a page result straight from a PaddleOCR prediction.
+
+        Reads the arrays off the result object instead of going through
+        ``res.json``, which would serialize the whole result. When the
+        pipeline's document orientation model rotated the page, boxes and
+        polygons are rotated back into the input image.
+
+        Args:
+            res: One item of the list returned by ``PaddleOCR.predict``
+                (or the ``overall_ocr_res`` of a PPStructureV3 result)
+            image_size: (width, height) of the image given to the pipeline;
+                without it, rotated results are left as they are
+            angle: Rotation applied by the pipeline (default: read from
+                ``res['doc_preprocessor_res']``)
+
+        Returns:
+            PageResult (empty if the prediction carries no OCR data)
+        """
+        try:
+            texts = res['rec_texts']
+        except (KeyError, TypeError):
+            return cls()
+        if not len(texts):
+            return cls()
+
+        polys = res.get('rec_polys')
+        page = cls(
+            texts=texts,
+            boxes=res.get('rec_boxes'),
+            scores=res.get('rec_scores'),
+            polys=polys if polys is not None and len(polys) == len(texts) else None,
+        )
+        if angle is None:
+            angle = doc_preprocessor_angle(res)
+        if angle and image_size:
+            page.unrotate(angle, image_size)
+        return page
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PageResult":
+        """
+        Build a page result from an API result dict ('texts', 'boxes', ...)
+        or a raw Paddle result dict ('rec_texts', 'rec_boxes', ...).
+        """
+        if not data:
+            return cls()
+        prefix = 'rec_' if 'rec_texts' in data else ''
+        return cls(
+            texts=data.get(f'{prefix}texts', []),
+            boxes=data.get(f'{prefix}boxes'),
+            scores=data.get(f'{prefix}scores'),
+            polys=data.get(f'{prefix}polys'),
+            arranged_text=data.get('arranged_text', ''),
+            page_number=data.get('page_number'),
+            image_size=data.get('image_size'),
+            source_size=data.get('source_size'),
+            fingerprint=data.get('fingerprint'),
+            dpi=data.get('dpi'),
+        )
+
+    def select(self, indices) -> "PageResult":
+        """Return a new page result holding only the lines at ``indices``."""
+        indices = np.asarray(indices, dtype=np.intp)
+        return PageResult(
+            texts=[self.texts[i] for i in indices],
+            boxes=self.boxes[indices],
+            scores=self.scores[indices],
+            polys=self.polys[indices] if self.polys is not None else None,
+            page_number=self.page_number,
+            image_size=self.image_size,
+            source_size=self.source_size,
+            dpi=self.dpi,
+        )
+
+    def unrotate(self, angle: int, size: Tuple[int, int]):
+        """
+        Map boxes and polygons found on a copy of the image rotated
+        counter-clockwise by ``angle`` (a multiple of 90, canvas expanded)
+        back into the unrotated image of ``size`` (width, height).
+        """
+        corners = self.boxes[:, [0, 1, 2, 3, 0, 3, 2, 1]].reshape(-1, 4, 2)
+        corners = unrotate_points(corners, angle, size)
+        self.boxes = np.concatenate([corners.min(axis=1), corners.max(axis=1)],
+                                    axis=1).astype(np.int32)
+        if self.polys is not None:
+            self.polys = unrotate_points(self.polys, angle, size).astype(np.int32)
+        self._spatial_index = None
+
+    def source_scale(self) -> Tuple[float, float]:
+        """(x, y) factors mapping image coordinates to original page coordinates."""
+        if not self.image_size or not self.source_size:
+            return 1.0, 1.0
+        return (self.source_size[0] / self.image_size[0],
+                self.source_size[1] / self.image_size[1])
+
+    def spatial_index(self) -> GridIndex:
+        """Grid index over ``boxes``, built on first use."""
+        if self._spatial_index is None:
+            self._spatial_index = GridIndex(self.boxes)
+        return self._spatial_index
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the JSON-friendly dict returned by the API."""
+        result = {
+            'texts': self.texts,
+            'boxes': self.boxes.tolist(),
+            'scores': self.scores.tolist(),
+            'arranged_text': self.arranged_text
+        }
+        if self.page_number is not None:
+            result['page_number'] = self.page_number
+        if self.image_size:
+            result['image_size'] = list(self.image_size)
+        if self.source_size:
+            result['source_size'] = list(self.source_size)
+        if self.dpi:
+            result['dpi'] = self.dpi
+        if self.fingerprint:
+            result['fingerprint'] = self.fingerprint
+        if self.reused:
+            result['reused'] = True
+        return result
+
+
+def doc_preprocessor_angle(res) -> int:
+    """Page rotation applied by a Paddle pipeline's document preprocessor (0 if none)."""
+    try:
+        angle = res['doc_preprocessor_res']['angle']
+    except (KeyError, TypeError, IndexError):
+        return 0
+    return int(angle) % 360 if angle is not None and int(angle) > 0 else 0
+
+
+def unrotate_points(points, angle: int, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Points (..., 2) of an image rotated counter-clockwise by ``angle`` (90,
+    180 or 270, canvas expanded) in the coordinates of the unrotated image
+    of ``size`` (width, height).
+    """
+    points = np.asarray(points)
+    x, y = points[..., 0], points[..., 1]
+    width, height = size
+    if angle == 90:
+        x, y = width - y, x
+    elif angle == 180:
+        x, y = width - x, height - y
+    elif angle == 270:
+        x, y = y, height - x
+    elif angle:
+        raise ValueError(f"Unsupported rotation: {angle}")
+    return np.stack([x, y], axis=-1)
+
+
+def pages_to_dicts(pages: List[PageResult]) -> List[Dict[str, Any]]:
+    """Serialize a list of page results for a JSON response."""
+    return [page.to_dict() for page in pages]
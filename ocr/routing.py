@@ -0,0 +1,150 @@
+"""
+Cheap page checks deciding whether a page needs PPStructureV3.
+
+Signals, all computed on the preprocessed page plus the fast OCR result:
+
+- ruling lines: horizontal/vertical strokes found by morphological opening
+  (ruled tables, forms)
+- tabular rows: reading-order lines with several separate, short cells
+  and wide gaps between them (unruled tables); text columns that merely
+  line up are long and fill their row, so they do not count
+- graphics: the area of large ink shapes outside the detected text boxes
+  and ruling lines (charts, figures); speckle and stray glyphs are too
+  small to count
+"""
+from typing import Dict, Any, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from ocr.layout import analyze_layout
+from ocr.result import PageResult
+
+MIN_RULING_LINES = 3          # horizontal and vertical lines for a ruled table
+MIN_TABULAR_ROWS = 3          # rows with MIN_CELLS_PER_ROW cells
+MIN_CELLS_PER_ROW = 3
+MAX_CELL_CHARS = 24           # median text length of a table row's cells
+MAX_ROW_FILL = 0.7            # share of a table row's width covered by its cells
+MIN_GRAPHICS_FRACTION = 0.02  # share of the page covered by graphics
+MIN_GRAPHIC_SIZE = 0.04       # smallest graphic, as a fraction of the page's long side
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """Single-channel view of an (H, W) or (H, W, 3) page."""
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Binary mask (255 = ink) robust to uneven background."""
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                 cv2.THRESH_BINARY_INV, 15, 10)
+
+
+def ruling_lines(gray: np.ndarray, min_length_ratio: float = 1 / 30) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Masks of horizontal and vertical ruling lines.
+
+    Args:
+        gray: Grayscale page
+        min_length_ratio: Minimum line length as a fraction of page width/height
+
+    Returns:
+        (horizontal, vertical) uint8 masks
+    """
+    ink = ink_mask(gray)
+    height, width = gray.shape[:2]
+    h_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(int(width * min_length_ratio), 10), 1))
+    v_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (1, max(int(height * min_length_ratio), 10)))
+    horizontal = cv2.morphologyEx(ink, cv2.MORPH_OPEN, h_kernel)
+    vertical = cv2.morphologyEx(ink, cv2.MORPH_OPEN, v_kernel)
+    return horizontal, vertical
+
+
+def _count_components(mask: np.ndarray) -> int:
+    return cv2.connectedComponents(mask, connectivity=8)[0] - 1
+
+
+def tabular_rows(page: PageResult, indices: Sequence[int] = None) -> int:
+    """
+    Reading-order lines of ``page`` (or of its ``indices``) that look like
+    table rows: at least ``MIN_CELLS_PER_ROW`` cells with short text
+    (median ``MAX_CELL_CHARS``) covering at most ``MAX_ROW_FILL`` of the
+    row's width.
+    """
+    indices = np.arange(len(page)) if indices is None else np.asarray(indices, dtype=int)
+    if not len(indices):
+        return 0
+    boxes = page.boxes[indices]
+    rows = 0
+    for line in analyze_layout(boxes).lines():
+        if len(line) < MIN_CELLS_PER_ROW:
+            continue
+        cells = boxes[line]
+        span = cells[:, 2].max() - cells[:, 0].min()
+        fill = (cells[:, 2] - cells[:, 0]).sum() / max(span, 1)
+        chars = np.median([len(page.texts[i]) for i in indices[line]])
+        if fill <= MAX_ROW_FILL and chars <= MAX_CELL_CHARS:
+            rows += 1
+    return rows
+
+
+def graphics_fraction(ink: np.ndarray) -> float:
+    """
+    Share of the page covered by the bounding boxes of large ink shapes.
+
+    ``ink`` is the ink mask with text and ruling lines already blanked.
+    Speckle is opened away first; shapes shorter and narrower than
+    ``MIN_GRAPHIC_SIZE`` of the page's long side (stray glyphs, noise
+    clusters) are ignored.
+    """
+    ink = cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    min_size = MIN_GRAPHIC_SIZE * max(ink.shape[:2])
+    covered = np.zeros(ink.shape[:2], dtype=np.uint8)
+    for x, y, w, h, _ in stats[1:count].tolist():
+        if max(w, h) >= min_size:
+            covered[y:y + h, x:x + w] = 1
+    return float(np.count_nonzero(covered)) / covered.size
+
+
+def page_signals(image: np.ndarray, page: PageResult) -> Dict[str, Any]:
+    """Structure signals for one page (see module docstring)."""
+    gray = to_gray(image)
+    horizontal, vertical = ruling_lines(gray)
+
+    # Ink left after blanking text boxes and ruling lines
+    ink = ink_mask(gray)
+    ink[horizontal > 0] = 0
+    ink[vertical > 0] = 0
+    for x1, y1, x2, y2 in page.boxes.tolist():
+        ink[max(y1, 0):y2, max(x1, 0):x2] = 0
+
+    return {
+        'horizontal_lines': _count_components(horizontal),
+        'vertical_lines': _count_components(vertical),
+        'ruling_density': round(float(np.count_nonzero(horizontal | vertical)) / gray.size, 4),
+        'tabular_rows': tabular_rows(page),
+        'graphics_fraction': round(graphics_fraction(ink), 4),
+    }
+
+
+def needs_structure(signals: Dict[str, Any]) -> Tuple[bool, list]:
+    """
+    Decide from ``page_signals`` whether a page should go to PPStructureV3.
+
+    Returns:
+        (flag, reasons)
+    """
+    reasons = []
+    if (signals['horizontal_lines'] >= MIN_RULING_LINES
+            and signals['vertical_lines'] >= MIN_RULING_LINES):
+        reasons.append('ruled_table')
+    if signals['tabular_rows'] >= MIN_TABULAR_ROWS:
+        reasons.append('tabular_rows')
+    if signals['graphics_fraction'] >= MIN_GRAPHICS_FRACTION:
+        reasons.append('graphics')
+    return bool(reasons), reasons
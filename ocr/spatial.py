@@ -0,0 +1,108 @@
+"""
+Uniform-grid spatial index over the boxes of a page.
+
+Each box is registered in every grid cell it overlaps; the (cell, box)
+pairs are kept sorted by cell in two flat arrays (CSR layout), so a
+rectangle query touches only the cells it covers and finishes with one
+vectorized containment test over the candidates.
+"""
+from typing import Sequence
+
+import numpy as np
+
+# Region membership modes
+CENTER = "center"        # box centre inside the rectangle
+INTERSECT = "intersect"  # any overlap with the rectangle
+INSIDE = "inside"        # box entirely inside the rectangle
+MODES = (CENTER, INTERSECT, INSIDE)
+
+
+class GridIndex:
+    """
+    Grid index over (N, 4) [x1, y1, x2, y2] boxes.
+
+    Args:
+        boxes: (N, 4) array-like
+        cell_size: Grid cell size in pixels (default: about 4 median text heights)
+    """
+
+    __slots__ = ('boxes', 'cell_size', 'cols', 'rows', '_cell_offsets', '_box_ids')
+
+    def __init__(self, boxes, cell_size: float = None):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        n = len(self.boxes)
+
+        if cell_size is None:
+            heights = self.boxes[:, 3] - self.boxes[:, 1]
+            cell_size = 4 * float(np.median(heights)) if n else 64.0
+        self.cell_size = max(cell_size, 1.0)
+
+        extent = self.boxes[:, 2:].max(axis=0) if n else np.zeros(2)
+        self.cols = int(extent[0] // self.cell_size) + 1
+        self.rows = int(extent[1] // self.cell_size) + 1
+
+        # Cell range covered by each box
+        lo = np.clip((self.boxes[:, :2] // self.cell_size).astype(np.int64), 0, None)
+        hi = np.clip((self.boxes[:, 2:] // self.cell_size).astype(np.int64),
+                     0, [self.cols - 1, self.rows - 1])
+        hi = np.maximum(hi, lo)
+        span_x = hi[:, 0] - lo[:, 0] + 1
+        span_y = hi[:, 1] - lo[:, 1] + 1
+        counts = span_x * span_y
+
+        # Expand every box into the list of cells it covers
+        box_ids = np.repeat(np.arange(n), counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        k = np.arange(len(box_ids)) - first
+        cx = lo[box_ids, 0] + k % span_x[box_ids]
+        cy = lo[box_ids, 1] + k // span_x[box_ids]
+        cells = cy * self.cols + cx
+
+        order = np.argsort(cells, kind='stable')
+        self._box_ids = box_ids[order]
+        self._cell_offsets = np.searchsorted(
+            cells[order], np.arange(self.rows * self.cols + 1))
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def query(self, rect: Sequence[float], mode: str = CENTER) -> np.ndarray:
+        """
+        Indices of the boxes in a rectangle, in ascending index order.
+
+        Args:
+            rect: [x1, y1, x2, y2] in the same space as the indexed boxes
+            mode: ``center``, ``intersect`` or ``inside``
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown region mode: {mode} (expected one of {', '.join(MODES)})")
+
+        x1, y1, x2, y2 = (float(v) for v in rect)
+        if not len(self.boxes) or x2 < x1 or y2 < y1:
+            return np.zeros(0, dtype=np.intp)
+
+        c1 = max(int(x1 // self.cell_size), 0)
+        r1 = max(int(y1 // self.cell_size), 0)
+        c2 = min(int(x2 // self.cell_size), self.cols - 1)
+        r2 = min(int(y2 // self.cell_size), self.rows - 1)
+        if c1 > c2 or r1 > r2:
+            return np.zeros(0, dtype=np.intp)
+
+        # Each grid row of the query is one contiguous run of cells
+        parts = [self._box_ids[self._cell_offsets[r * self.cols + c1]:
+                               self._cell_offsets[r * self.cols + c2 + 1]]
+                 for r in range(r1, r2 + 1)]
+        candidates = np.unique(np.concatenate(parts))
+        if not len(candidates):
+            return candidates
+
+        b = self.boxes[candidates]
+        if mode == CENTER:
+            cx = (b[:, 0] + b[:, 2]) / 2
+            cy = (b[:, 1] + b[:, 3]) / 2
+            hit = (cx >= x1) & (cx <= x2) & (cy >= y1) & (cy <= y2)
+        elif mode == INSIDE:
+            hit = (b[:, 0] >= x1) & (b[:, 1] >= y1) & (b[:, 2] <= x2) & (b[:, 3] <= y2)
+        else:
+            hit = (b[:, 0] <= x2) & (b[:, 2] >= x1) & (b[:, 1] <= y2) & (b[:, 3] >= y1)
+        return candidates[hit]
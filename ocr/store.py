@@ -0,0 +1,268 @@
+"""
+Persistent store of OCR results with full-text search.
+
+Documents are keyed by the SHA-256 of their content, so the same file
+uploaded twice (or found twice by the batch CLI) is one document. Each
+page's result is stored as JSON next to its text, and every line is
+indexed in an SQLite FTS5 table together with its box in original page
+coordinates, so a search returns documents, pages and the rectangles of
+the matching lines without re-running OCR.
+
+Pages are also indexed by fingerprint (``page_fingerprint``: a hash of the
+preprocessed raster and the engine configuration), so a revised document
+reuses the stored results of its unchanged pages (see ``ocr.pipeline``).
+
+The API store is configured with ``OCR_RESULT_STORE`` (path of the SQLite
+file, default ``ocr_results.sqlite`` in the data directory, see
+``utils.paths``; ``off`` disables it).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ocr.export import page_geometry
+from ocr.result import PageResult
+from utils.paths import data_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    sha256 TEXT PRIMARY KEY,
+    filename TEXT,
+    total_pages INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL REFERENCES documents (sha256) ON DELETE CASCADE,
+    page_number INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    result TEXT NOT NULL,
+    fingerprint TEXT,
+    UNIQUE (sha256, page_number)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5 (
+    text, content='pages', content_rowid='id'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5 (
+    text, page_id UNINDEXED, line UNINDEXED,
+    x1 UNINDEXED, y1 UNINDEXED, x2 UNINDEXED, y2 UNINDEXED
+);
+"""
+
+
+def fts_query(query: str) -> str:
+    """
+    FTS5 expression matching all words of ``query``.
+
+    Words are quoted so punctuation is taken literally; a trailing ``*``
+    keeps its prefix-match meaning.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith('*') and len(word) > 1
+        word = word.rstrip('*') if prefix else word
+        terms.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return " ".join(terms)
+
+
+def page_fingerprint(preprocessed: np.ndarray, identity: str) -> str:
+    """
+    Fingerprint of a preprocessed page for the engine ``identity``.
+
+    Preprocessing normalizes the raster (grayscale, contrast, 1024 px long
+    side), so hashing one channel and the shape identifies the page as the
+    engine sees it: the same page rendered again at the same DPI gets the
+    same fingerprint, any change to its content a different one.
+    """
+    plane = preprocessed[..., 0] if preprocessed.ndim == 3 else preprocessed
+    plane = np.ascontiguousarray(plane)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(identity.encode('utf-8'))
+    digest.update(repr(plane.shape).encode('ascii'))
+    digest.update(plane.tobytes())
+    return digest.hexdigest()
+
+
+def _page_text(page: PageResult) -> str:
+    return page.arranged_text or "\n".join(page.texts)
+
+
+class ResultStore:
+    """
+    SQLite result store (thread-safe; one connection behind a lock).
+
+    Args:
+        path: SQLite file (created if missing)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        if 'fingerprint' not in columns:
+            # Stores created before page fingerprints
+            self._conn.execute("ALTER TABLE pages ADD COLUMN fingerprint TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pages_fingerprint ON pages (fingerprint)")
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def has(self, sha256: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM documents WHERE sha256 = ?", (sha256,)).fetchone() is not None
+
+    def save(self, sha256: str, filename: str, pages: Iterable[PageResult]):
+        """Store (or replace) the results of a document."""
+        pages = list(pages)
+        now = time.time()
+        with self._lock, self._conn:
+            self._delete_pages(sha256)
+            self._conn.execute(
+                "INSERT INTO documents (sha256, filename, total_pages, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (sha256) DO UPDATE SET "
+                "filename = excluded.filename, total_pages = excluded.total_pages, "
+                "updated_at = excluded.updated_at",
+                (sha256, filename, len(pages), now, now))
+            for index, page in enumerate(pages, 1):
+                text = _page_text(page)
+                cursor = self._conn.execute(
+                    "INSERT INTO pages (sha256, page_number, text, result, fingerprint) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (sha256, page.page_number or index, text, json.dumps(page.to_dict()),
+                     page.fingerprint))
+                page_id = cursor.lastrowid
+                self._conn.execute("INSERT INTO pages_fts (rowid, text) VALUES (?, ?)",
+                                   (page_id, text))
+                boxes, _ = page_geometry(page)
+                self._conn.executemany(
+                    "INSERT INTO lines_fts (text, page_id, line, x1, y1, x2, y2) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(t, page_id, i, *map(int, boxes[i])) for i, t in enumerate(page.texts)])
+
+    def _delete_pages(self, sha256: str):
+        rows = self._conn.execute(
+            "SELECT id, text FROM pages WHERE sha256 = ?", (sha256,)).fetchall()
+        for page_id, text in rows:
+            # External-content FTS rows are removed with the 'delete' command
+            self._conn.execute("INSERT INTO pages_fts (pages_fts, rowid, text) "
+                               "VALUES ('delete', ?, ?)", (page_id, text))
+            self._conn.execute("DELETE FROM lines_fts WHERE page_id = ?", (page_id,))
+        self._conn.execute("DELETE FROM pages WHERE sha256 = ?", (sha256,))
+
+    def delete(self, sha256: str) -> bool:
+        with self._lock, self._conn:
+            self._delete_pages(sha256)
+            cursor = self._conn.execute("DELETE FROM documents WHERE sha256 = ?", (sha256,))
+            return cursor.rowcount > 0
+
+    def document(self, sha256: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, filename, total_pages, created_at, updated_at "
+                "FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('sha256', 'filename', 'total_pages', 'created_at', 'updated_at'), row))
+
+    def page(self, sha256: str, page_number: int) -> Optional[PageResult]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM pages WHERE sha256 = ? AND page_number = ?",
+                (sha256, page_number)).fetchone()
+        return PageResult.from_dict(json.loads(row[0])) if row else None
+
+    def find_page(self, fingerprint: str) -> Optional[PageResult]:
+        """Stored result of a page with this fingerprint (any document), or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM pages WHERE fingerprint = ? ORDER BY id DESC LIMIT 1",
+                (fingerprint,)).fetchone()
+        return PageResult.from_dict(json.loads(row[0])) if row else None
+
+    def pages(self, sha256: str) -> List[PageResult]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result FROM pages WHERE sha256 = ? ORDER BY page_number",
+                (sha256,)).fetchall()
+        return [PageResult.from_dict(json.loads(row[0])) for row in rows]
+
+    def search(self, query: str, limit: int = 20, lines_per_page: int = 20) -> Dict[str, Any]:
+        """
+        Pages matching all words of ``query``, best first, grouped by document.
+
+        Each page carries a snippet and the matching lines with their boxes
+        in original page coordinates.
+        """
+        expression = fts_query(query)
+        if not expression:
+            return {'query': query, 'documents': []}
+
+        with self._lock:
+            hits = self._conn.execute(
+                "SELECT p.id, p.sha256, p.page_number, d.filename, "
+                "snippet(pages_fts, 0, '[', ']', '...', 12), bm25(pages_fts) "
+                "FROM pages_fts JOIN pages p ON p.id = pages_fts.rowid "
+                "JOIN documents d ON d.sha256 = p.sha256 "
+                "WHERE pages_fts MATCH ? ORDER BY bm25(pages_fts) LIMIT ?",
+                (expression, limit)).fetchall()
+
+            documents: Dict[str, Dict[str, Any]] = {}
+            for page_id, sha256, page_number, filename, snippet, rank in hits:
+                lines = self._conn.execute(
+                    "SELECT line, text, x1, y1, x2, y2 FROM lines_fts "
+                    "WHERE lines_fts MATCH ? AND page_id = ? ORDER BY rank LIMIT ?",
+                    (expression, page_id, lines_per_page)).fetchall()
+                document = documents.setdefault(sha256, {
+                    'sha256': sha256, 'filename': filename, 'pages': []})
+                document['pages'].append({
+                    'page_number': page_number,
+                    'score': round(-rank, 4),
+                    'snippet': snippet,
+                    'matches': [{'line': line, 'text': text, 'box': [x1, y1, x2, y2]}
+                                for line, text, x1, y1, x2, y2 in lines],
+                })
+
+        return {'query': query, 'documents': list(documents.values())}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            documents, = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+            pages, = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+        return {'path': self.path, 'documents': documents, 'pages': pages}
+
+
+_store: Optional[ResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """The process-wide store from ``OCR_RESULT_STORE``, or None when it is off."""
+    global _store
+    path = os.environ.get('OCR_RESULT_STORE')
+    if path is not None and (not path or path == 'off'):
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore(path or data_path('ocr_results.sqlite'))
+        return _store
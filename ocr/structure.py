@@ -1,16 +1,87 @@
 
-from paddleocr import PPStructureV3
+from ocr.engine import OCREngine, get_engine
+from ocr.paddle import ocr_page
+from ocr.routing import (MIN_CELLS_PER_ROW, MIN_TABULAR_ROWS, page_signals,
+                         needs_structure, tabular_rows)
+from ocr.result import PageResult
+from ocr.tables import extract_tables, tables_summary
+from utils.profiling import stage
 from PIL import Image
 import numpy as np
+import os
+from typing import Dict, Any, Optional
 
+TABLE_MODES = ("structure", "fast")
+
+
+def _fast_tables(preprocessed_img: np.ndarray, page: PageResult,
+                 reasons: list) -> Optional[Dict[str, Any]]:
+    """
+    Ruled tables via ``ocr.tables`` when they explain everything the
+    routing checks flagged, else None (the page needs PPStructureV3).
+    """
+    if 'ruled_table' not in reasons or 'graphics' in reasons:
+        return None
+    with stage("tables"):
+        tables = extract_tables(preprocessed_img, page)
+    if not tables:
+        return None
+    # Tabular rows left outside the ruled tables are an unruled table
+    in_tables = {i for table in tables for cell in table.cells for i in cell.lines}
+    rest = [i for i in range(len(page)) if i not in in_tables]
+    if (len(rest) >= MIN_TABULAR_ROWS * MIN_CELLS_PER_ROW
+            and tabular_rows(page, rest) >= MIN_TABULAR_ROWS):
+        return None
+    return tables_summary(tables)
+
+
+def analyze_page(image, force: bool = False, engine: OCREngine = None,
+                 table_mode: str = None) -> Dict[str, Any]:
+    """
+    OCR a page and run PPStructureV3 on it only if it looks like it has tables or charts.
+
+    The page first goes through the regular OCR engine; ruling lines,
+    tabular rows and non-text graphics (see ``ocr.routing``) decide whether
+    it is also sent to the structure pipeline. With ``table_mode="fast"``,
+    pages whose only structure is ruled tables get them from the OpenCV
+    extractor (``ocr.tables``) instead.
+
+    Args:
+        image: PIL Image or numpy array
+        force: Send the page to PPStructureV3 regardless of the checks
+        engine: OCR engine for the regular path (default: ``get_engine()``)
+        table_mode: ``structure`` or ``fast`` (default: ``$OCR_TABLE_MODE`` or structure)
+
+    Returns:
+        Dictionary with 'route' ('ocr', 'tables' or 'structure'), 'reasons',
+        'signals', 'page' (PageResult) and 'structure' (None for plain-text
+        pages)
+    """
+    table_mode = table_mode or os.environ.get('OCR_TABLE_MODE', 'structure')
+    if table_mode not in TABLE_MODES:
+        raise ValueError(f"Unknown table mode: {table_mode} "
+                         f"(expected one of {', '.join(TABLE_MODES)})")
+    page, preprocessed_img = ocr_page(image, engine)
+    signals = page_signals(preprocessed_img, page)
+    flagged, reasons = needs_structure(signals)
+
+    structure = None
+    route = 'ocr'
+    if table_mode == 'fast' and not force:
+        structure = _fast_tables(preprocessed_img, page, reasons)
+        route = 'tables' if structure is not None else route
+    if structure is None and (flagged or force):
+        _, structure = get_engine('structure').analyze(preprocessed_img)
+        route = 'structure'
+
+    return {
+        'route': route,
+        'reasons': reasons if not force else reasons + ['forced'],
+        'signals': signals,
+        'page': page,
+        'structure': structure,
+    }
 
-pipeline = PPStructureV3(
-    use_doc_orientation_classify=True,
-    use_doc_unwarping=True,
-    use_textline_orientation=True,
-    use_chart_recognition=True,
-    device="gpu",
-)
 
 # Process each page
 
@@ -47,7 +118,7 @@ def ocr_document(images: list, output_dir="output"):
         # Run OCR
         print("Running OCR...")
         try:
-            output = pipeline.predict(img_array)
+            output = get_engine('structure').predict_raw(img_array)
             print("OCR completed successfully")
 
             # Save the result as Markdown
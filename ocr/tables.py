@@ -0,0 +1,304 @@
+"""
+Ruled-table extraction without PPStructureV3.
+
+Simple ruled tables (invoices, statements) are recovered from the page
+raster and the regular OCR result alone:
+
+1. horizontal and vertical ruling lines are found by morphological opening
+   (``ocr.routing.ruling_lines``) on the preprocessed page;
+2. connected groups of ruling lines that contain both directions become
+   table regions;
+3. the line positions inside a region give the row and column boundaries,
+   and a missing separator between two neighbouring cells merges them
+   (row and column spans);
+4. the OCR lines whose centres fall inside a cell become its text, in
+   reading order.
+
+Tables come back as rows of cells, with CSV, markdown and HTML renderings;
+``tables_summary`` shapes them like the structure pipeline's output
+(``ocr.engine.StructureEngine.analyze``). Boxes are in the coordinates of
+the image the tables were extracted from (the preprocessed page).
+"""
+import bisect
+import csv
+import html
+import io
+from typing import Any, Dict, List, Sequence
+
+import cv2
+import numpy as np
+
+from ocr.layout import arrange_text
+from ocr.result import PageResult
+from ocr.routing import ruling_lines, to_gray
+
+MIN_TABLE_LINES = 2        # horizontal and vertical boundaries of the smallest table
+MIN_SEPARATOR_COVERAGE = 0.6  # share of a cell edge a ruling line must cover
+
+
+class TableCell:
+    """
+    One (possibly spanning) cell.
+
+    Attributes:
+        row, col: Top-left grid position
+        rowspan, colspan: Grid rows/columns covered
+        bbox: [x1, y1, x2, y2]
+        text: OCR text of the lines inside, in reading order
+        lines: Indices of those lines in the page result
+    """
+
+    __slots__ = ('row', 'col', 'rowspan', 'colspan', 'bbox', 'text', 'lines')
+
+    def __init__(self, row: int, col: int, rowspan: int, colspan: int,
+                 bbox: Sequence[int], text: str = "", lines: Sequence[int] = ()):
+        self.row = row
+        self.col = col
+        self.rowspan = rowspan
+        self.colspan = colspan
+        self.bbox = [int(v) for v in bbox]
+        self.text = text
+        self.lines = list(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'row': self.row, 'col': self.col, 'rowspan': self.rowspan,
+                'colspan': self.colspan, 'bbox': self.bbox, 'text': self.text,
+                'lines': self.lines}
+
+
+class Table:
+    """
+    A ruled table: its grid boundaries and cells (row-major).
+
+    Args:
+        row_bounds: (rows + 1) y positions of the horizontal boundaries
+        col_bounds: (columns + 1) x positions of the vertical boundaries
+        cells: Cells, each listed once at its top-left grid position
+    """
+
+    def __init__(self, row_bounds: Sequence[int], col_bounds: Sequence[int],
+                 cells: List[TableCell]):
+        self.row_bounds = [int(v) for v in row_bounds]
+        self.col_bounds = [int(v) for v in col_bounds]
+        self.cells = cells
+
+    @property
+    def rows(self) -> int:
+        return len(self.row_bounds) - 1
+
+    @property
+    def columns(self) -> int:
+        return len(self.col_bounds) - 1
+
+    @property
+    def bbox(self) -> List[int]:
+        return [self.col_bounds[0], self.row_bounds[0], self.col_bounds[-1], self.row_bounds[-1]]
+
+    def grid(self) -> List[List[str]]:
+        """Text as a rows x columns grid; a spanning cell fills its top-left slot."""
+        grid = [[""] * self.columns for _ in range(self.rows)]
+        for cell in self.cells:
+            grid[cell.row][cell.col] = cell.text
+        return grid
+
+    def to_csv(self) -> str:
+        out = io.StringIO()
+        csv.writer(out, lineterminator="\n").writerows(self.grid())
+        return out.getvalue()
+
+    def to_markdown(self) -> str:
+        """GitHub-flavoured markdown; the first row is the header."""
+        rows = [[text.replace("|", "\\|") for text in row] for row in self.grid()]
+        if not rows:
+            return ""
+        lines = ["| " + " | ".join(rows[0]) + " |",
+                 "|" + "---|" * self.columns]
+        lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+        return "\n".join(lines)
+
+    def to_html(self) -> str:
+        """HTML table with row/column spans (the structure pipeline's table format)."""
+        by_row: Dict[int, List[TableCell]] = {}
+        for cell in self.cells:
+            by_row.setdefault(cell.row, []).append(cell)
+        parts = ["<table>"]
+        for row in range(self.rows):
+            parts.append("<tr>")
+            for cell in sorted(by_row.get(row, []), key=lambda c: c.col):
+                spans = "".join(f' {name}="{value}"' for name, value in
+                                (("rowspan", cell.rowspan), ("colspan", cell.colspan))
+                                if value > 1)
+                parts.append(f"<td{spans}>{html.escape(cell.text)}</td>")
+            parts.append("</tr>")
+        parts.append("</table>")
+        return "".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'bbox': self.bbox,
+            'rows': self.rows,
+            'columns': self.columns,
+            'cells': [cell.to_dict() for cell in self.cells],
+            'grid': self.grid(),
+            'csv': self.to_csv(),
+            'markdown': self.to_markdown(),
+            'html': self.to_html(),
+        }
+
+
+def _segments(mask: np.ndarray) -> np.ndarray:
+    """(N, 4) [x, y, w, h] of the connected components of a line mask."""
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    return stats[1:count, :4]
+
+
+def _cluster(positions: Sequence[float], tolerance: float) -> List[int]:
+    """Merge positions closer than ``tolerance`` into their mean."""
+    bounds, group = [], []
+    for value in sorted(positions):
+        if group and value - group[-1] > tolerance:
+            bounds.append(int(round(np.mean(group))))
+            group = []
+        group.append(value)
+    if group:
+        bounds.append(int(round(np.mean(group))))
+    return bounds
+
+
+def _coverage(mask: np.ndarray, start: int, end: int, position: int, tolerance: int,
+              along_x: bool) -> float:
+    """Share of ``start..end`` covered by a line near ``position`` in ``mask``."""
+    low, high = max(position - tolerance, 0), position + tolerance + 1
+    if along_x:
+        band = mask[low:high, start:end]
+        covered = band.any(axis=0)
+    else:
+        band = mask[start:end, low:high]
+        covered = band.any(axis=1)
+    return float(covered.mean()) if covered.size else 0.0
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _build_table(horizontal: np.ndarray, vertical: np.ndarray, region: Sequence[int],
+                 tolerance: int):
+    x, y, w, h = region
+    h_segments = _segments(horizontal[y:y + h, x:x + w])
+    v_segments = _segments(vertical[y:y + h, x:x + w])
+    row_bounds = [y + b for b in _cluster(h_segments[:, 1] + h_segments[:, 3] / 2, tolerance)]
+    col_bounds = [x + b for b in _cluster(v_segments[:, 0] + v_segments[:, 2] / 2, tolerance)]
+    if len(row_bounds) < MIN_TABLE_LINES or len(col_bounds) < MIN_TABLE_LINES:
+        return None
+
+    rows, columns = len(row_bounds) - 1, len(col_bounds) - 1
+    parent = list(range(rows * columns))
+
+    def union(a, b):
+        parent[_find(parent, a)] = _find(parent, b)
+
+    for r in range(rows):
+        top, bottom = row_bounds[r] + tolerance, row_bounds[r + 1] - tolerance
+        for c in range(columns - 1):
+            # No vertical rule between (r, c) and (r, c + 1): one cell spans both
+            if _coverage(vertical, top, bottom, col_bounds[c + 1], tolerance,
+                         along_x=False) < MIN_SEPARATOR_COVERAGE:
+                union(r * columns + c, r * columns + c + 1)
+    for c in range(columns):
+        left, right = col_bounds[c] + tolerance, col_bounds[c + 1] - tolerance
+        for r in range(rows - 1):
+            if _coverage(horizontal, left, right, row_bounds[r + 1], tolerance,
+                         along_x=True) < MIN_SEPARATOR_COVERAGE:
+                union(r * columns + c, (r + 1) * columns + c)
+
+    groups: Dict[int, List[int]] = {}
+    for index in range(rows * columns):
+        groups.setdefault(_find(parent, index), []).append(index)
+    cells = []
+    for members in groups.values():
+        member_rows = [m // columns for m in members]
+        member_cols = [m % columns for m in members]
+        r0, r1 = min(member_rows), max(member_rows) + 1
+        c0, c1 = min(member_cols), max(member_cols) + 1
+        cells.append(TableCell(r0, c0, r1 - r0, c1 - c0,
+                               [col_bounds[c0], row_bounds[r0], col_bounds[c1], row_bounds[r1]]))
+    if len(cells) < 2:
+        # A frame around a single block of text
+        return None
+    cells.sort(key=lambda cell: (cell.row, cell.col))
+    return Table(row_bounds, col_bounds, cells)
+
+
+def _fill_cells(table: Table, page: PageResult, taken: np.ndarray):
+    """Assign the OCR lines whose centres fall in the table to its cells."""
+    if not len(page):
+        return
+    slots = {}
+    for cell in table.cells:
+        for r in range(cell.row, cell.row + cell.rowspan):
+            for c in range(cell.col, cell.col + cell.colspan):
+                slots[r, c] = cell
+
+    x1, y1, x2, y2 = table.bbox
+    centers = (page.boxes[:, :2] + page.boxes[:, 2:4]) / 2
+    inside = np.flatnonzero((centers[:, 0] > x1) & (centers[:, 0] < x2)
+                            & (centers[:, 1] > y1) & (centers[:, 1] < y2) & ~taken)
+    members: Dict[int, List[int]] = {}
+    for i in inside.tolist():
+        r = min(max(bisect.bisect_right(table.row_bounds, centers[i, 1]) - 1, 0), table.rows - 1)
+        c = min(max(bisect.bisect_right(table.col_bounds, centers[i, 0]) - 1, 0),
+                table.columns - 1)
+        members.setdefault(id(slots[r, c]), []).append(i)
+        taken[i] = True
+    for cell in table.cells:
+        lines = members.get(id(cell), [])
+        if lines:
+            arranged = arrange_text([page.texts[i] for i in lines], page.boxes[lines])
+            cell.text = " ".join(arranged.split())
+            cell.lines = lines
+
+
+def extract_tables(image: np.ndarray, page: PageResult,
+                   min_length_ratio: float = 1 / 30) -> List[Table]:
+    """
+    Ruled tables of a page, top to bottom, with their cells filled from ``page``.
+
+    Args:
+        image: The page the OCR boxes refer to (the preprocessed page)
+        page: OCR result of ``image``
+        min_length_ratio: Shortest ruling line, as a fraction of page width/height
+    """
+    gray = to_gray(image)
+    horizontal, vertical = ruling_lines(gray, min_length_ratio)
+    tolerance = max(3, int(round(max(gray.shape[:2]) * 0.004)))
+
+    # Ruling lines that touch (after closing small gaps at the crossings) form one table
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * tolerance + 1, 2 * tolerance + 1))
+    grid = cv2.dilate(horizontal | vertical, kernel)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(grid, connectivity=8)
+
+    tables = []
+    for x, y, w, h, _ in sorted(stats[1:count].tolist(), key=lambda s: (s[1], s[0])):
+        table = _build_table(horizontal, vertical, (x, y, w, h), tolerance)
+        if table is not None:
+            tables.append(table)
+
+    taken = np.zeros(len(page), dtype=bool)
+    for table in tables:
+        _fill_cells(table, page, taken)
+    return tables
+
+
+def tables_summary(tables: List[Table]) -> Dict[str, Any]:
+    """Tables in the shape of the structure pipeline's summary (markdown, blocks, tables)."""
+    blocks = [{'label': 'table', 'bbox': table.bbox, 'content': table.to_html(),
+               **table.to_dict()} for table in tables]
+    return {
+        'markdown': "\n\n".join(table.to_markdown() for table in tables),
+        'blocks': blocks,
+        'tables': blocks,
+    }
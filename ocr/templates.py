@@ -0,0 +1,472 @@
+"""
+Template-driven field extraction for known form layouts.
+
+A template names the regions of a fixed form in normalized page coordinates
+(0..1 of the page width/height). Extraction crops only those regions from
+the page and runs the line recognizer on them: no orientation, unwarping or
+full-page detection, which for a form with a handful of fields is an order
+of magnitude less work than ``process_image_direct``.
+
+Scans are rarely placed exactly. Optional anchors (printed text at a known
+position, e.g. the form title) correct for that: text is detected in a small
+window around each anchor, the line matching the anchor text is located and
+the offset/scale/rotation between expected and found anchor boxes is applied
+to every field of the page.
+
+Template JSON::
+
+    {
+      "name": "w9",
+      "fields": {
+        "name": [0.06, 0.16, 0.60, 0.18],
+        "address": {"box": [0.06, 0.30, 0.60, 0.36], "multiline": true},
+        "signature_date": {"box": [0.62, 0.78, 0.90, 0.80], "page": 2}
+      },
+      "anchors": [{"text": "Request for Taxpayer", "box": [0.25, 0.02, 0.70, 0.05]}]
+    }
+
+Templates are kept by a ``TemplateStore``; with ``OCR_TEMPLATE_DIR`` set
+they are persisted there as ``<name>.json``.
+"""
+import json
+import os
+import re
+import threading
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from ocr.detection import MOBILE_DET_MODEL, TextDetector, create_detector
+from ocr.rec_cache import with_cache
+from ocr.recognition import (SERVER_REC_MODEL, LineRecognizer, crop_quad,
+                             create_recognizer)
+from ocr.routing import ink_mask, ruling_lines, to_gray
+from utils.preprocess import preprocess_for_ocr
+from utils.profiling import stage
+
+ANCHOR_MARGIN = 0.05     # search window around an anchor (fraction of the page)
+ANCHOR_MIN_SCORE = 0.7   # text similarity for an anchor match
+MAX_SCALE_CHANGE = 0.2   # alignments scaling more than this are rejected
+MAX_ROTATION_DEG = 5.0
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def _normalized_box(value, what: str) -> List[float]:
+    try:
+        box = [float(v) for v in value]
+    except (TypeError, ValueError):
+        raise ValueError(f"{what}: box must be four numbers")
+    if len(box) != 4:
+        raise ValueError(f"{what}: box must be four numbers")
+    x1, y1, x2, y2 = box
+    if not (0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1):
+        raise ValueError(f"{what}: box must be normalized [x1, y1, x2, y2] with x1 < x2, y1 < y2")
+    return box
+
+
+class TemplateField:
+    """
+    A named region of a form page.
+
+    Args:
+        name: Field name (key of the result)
+        box: Normalized [x1, y1, x2, y2]
+        page: 1-based page number
+        multiline: Split the region into text rows before recognition
+    """
+
+    def __init__(self, name: str, box: Sequence[float], page: int = 1, multiline: bool = False):
+        self.name = name
+        self.box = _normalized_box(box, f"field {name!r}")
+        self.page = int(page)
+        self.multiline = bool(multiline)
+
+    @classmethod
+    def from_dict(cls, name: str, data) -> "TemplateField":
+        if isinstance(data, (list, tuple)):
+            return cls(name, data)
+        if not isinstance(data, dict) or 'box' not in data:
+            raise ValueError(f"field {name!r}: expected a box or an object with 'box'")
+        return cls(name, data['box'], page=data.get('page', 1),
+                   multiline=data.get('multiline', False))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'box': self.box, 'page': self.page, 'multiline': self.multiline}
+
+
+class TemplateAnchor:
+    """
+    Printed text at a known position, used to align a page.
+
+    Args:
+        text: Text to look for
+        box: Normalized [x1, y1, x2, y2] where the text is on a perfectly placed page
+        page: 1-based page number
+        margin: Search window around ``box`` (fraction of the page)
+    """
+
+    def __init__(self, text: str, box: Sequence[float], page: int = 1,
+                 margin: float = ANCHOR_MARGIN):
+        if not text or not str(text).strip():
+            raise ValueError("anchor: text must not be empty")
+        self.text = str(text)
+        self.box = _normalized_box(box, f"anchor {text!r}")
+        self.page = int(page)
+        self.margin = float(margin)
+
+    @classmethod
+    def from_dict(cls, data) -> "TemplateAnchor":
+        if not isinstance(data, dict) or 'text' not in data or 'box' not in data:
+            raise ValueError("anchor: expected an object with 'text' and 'box'")
+        return cls(data['text'], data['box'], page=data.get('page', 1),
+                   margin=data.get('margin', ANCHOR_MARGIN))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'text': self.text, 'box': self.box, 'page': self.page, 'margin': self.margin}
+
+
+class FormTemplate:
+    """A registered form layout: named fields plus optional anchors."""
+
+    def __init__(self, name: str, fields: List[TemplateField],
+                 anchors: List[TemplateAnchor] = None, description: str = ""):
+        if not name or not _NAME_RE.match(name):
+            raise ValueError("template name must be non-empty and use only letters, "
+                             "digits, '_', '-' and '.'")
+        if not fields:
+            raise ValueError(f"template {name!r} has no fields")
+        self.name = name
+        self.fields = fields
+        self.anchors = anchors or []
+        self.description = description
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FormTemplate":
+        if not isinstance(data, dict):
+            raise ValueError("template must be a JSON object")
+        fields = data.get('fields') or {}
+        if not isinstance(fields, dict):
+            raise ValueError("template fields must be an object of name -> box")
+        return cls(
+            data.get('name', ''),
+            [TemplateField.from_dict(name, spec) for name, spec in fields.items()],
+            [TemplateAnchor.from_dict(a) for a in data.get('anchors') or []],
+            description=data.get('description', ''),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'description': self.description,
+            'fields': {f.name: f.to_dict() for f in self.fields},
+            'anchors': [a.to_dict() for a in self.anchors],
+        }
+
+    @property
+    def pages(self) -> List[int]:
+        """Page numbers the template reads from."""
+        return sorted({f.page for f in self.fields} | {a.page for a in self.anchors})
+
+
+class TemplateStore:
+    """
+    Thread-safe registry of templates, optionally backed by a directory.
+
+    Args:
+        directory: Where templates are persisted as ``<name>.json`` (None = memory only)
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory
+        self._templates: Dict[str, FormTemplate] = {}
+        self._lock = threading.Lock()
+        if directory and os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith('.json'):
+                    self._load(filename[:-len('.json')])
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _load(self, name: str) -> Optional[FormTemplate]:
+        path = self._path(name)
+        if not _NAME_RE.match(name) or not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            template = FormTemplate.from_dict(json.load(f))
+        self._templates[template.name] = template
+        return template
+
+    def register(self, template: FormTemplate) -> FormTemplate:
+        """Add or replace a template."""
+        with self._lock:
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = self._path(template.name) + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(template.to_dict(), f, indent=2)
+                os.replace(tmp_path, self._path(template.name))
+            self._templates[template.name] = template
+        return template
+
+    def get(self, name: str) -> Optional[FormTemplate]:
+        with self._lock:
+            template = self._templates.get(name)
+            # Registered by another worker process sharing the directory
+            if template is None and self.directory:
+                template = self._load(name)
+            return template
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            found = self._templates.pop(name, None) is not None
+            if self.directory and _NAME_RE.match(name) and os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+                found = True
+            return found
+
+    def list(self) -> List[FormTemplate]:
+        with self._lock:
+            return [self._templates[name] for name in sorted(self._templates)]
+
+
+_store: Optional[TemplateStore] = None
+_models: Dict[str, Any] = {}
+_store_lock = threading.Lock()
+
+
+def get_template_store() -> TemplateStore:
+    """The process-wide store (``OCR_TEMPLATE_DIR`` for persistence)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TemplateStore(os.environ.get('OCR_TEMPLATE_DIR') or None)
+        return _store
+
+
+def _default_recognizer() -> LineRecognizer:
+    with _store_lock:
+        if 'recognizer' not in _models:
+            _models['recognizer'] = with_cache(create_recognizer(
+                os.environ.get('OCR_TEMPLATE_REC_MODEL', SERVER_REC_MODEL)))
+        return _models['recognizer']
+
+
+def _default_detector() -> TextDetector:
+    with _store_lock:
+        if 'detector' not in _models:
+            _models['detector'] = create_detector(
+                os.environ.get('OCR_TEMPLATE_DET_MODEL', MOBILE_DET_MODEL))
+        return _models['detector']
+
+
+def _to_pixels(box: Sequence[float], width: int, height: int) -> np.ndarray:
+    """Normalized box to its (4, 2) pixel quad, clockwise from top-left."""
+    x1, y1, x2, y2 = box
+    return np.float32([[x1 * width, y1 * height], [x2 * width, y1 * height],
+                       [x2 * width, y2 * height], [x1 * width, y2 * height]])
+
+
+def _text_score(anchor: str, text: str) -> Tuple[float, float, float]:
+    """
+    Similarity of a recognized line to the anchor text.
+
+    Returns:
+        (score, start, end): ``start``/``end`` are the fractions of the line
+        covered by the anchor when it is only part of the line
+    """
+    anchor = " ".join(anchor.casefold().split())
+    text = " ".join(text.casefold().split())
+    if not text:
+        return 0.0, 0.0, 1.0
+    index = text.find(anchor)
+    if index >= 0:
+        return 1.0, index / len(text), (index + len(anchor)) / len(text)
+    return SequenceMatcher(None, anchor, text).ratio(), 0.0, 1.0
+
+
+def _locate_anchor(image: np.ndarray, anchor: TemplateAnchor, detector: TextDetector,
+                   recognizer: LineRecognizer) -> Optional[np.ndarray]:
+    """Pixel quad of ``anchor`` on the page, or None when it is not found."""
+    height, width = image.shape[:2]
+    x1, y1, x2, y2 = anchor.box
+    wx1 = int(max(x1 - anchor.margin, 0) * width)
+    wy1 = int(max(y1 - anchor.margin, 0) * height)
+    wx2 = int(min(x2 + anchor.margin, 1) * width)
+    wy2 = int(min(y2 + anchor.margin, 1) * height)
+    window = image[wy1:wy2, wx1:wx2]
+    if window.size == 0:
+        return None
+
+    polys, _ = detector.detect(np.ascontiguousarray(window))
+    if len(polys) == 0:
+        return None
+    texts, _ = recognizer.recognize([crop_quad(window, p) for p in polys])
+
+    best, best_score = None, ANCHOR_MIN_SCORE
+    for poly, text in zip(polys, texts):
+        score, start, end = _text_score(anchor.text, text)
+        if score >= best_score:
+            quad = np.asarray(poly, dtype=np.float32).reshape(4, 2) + (wx1, wy1)
+            # Narrow the line down to the part holding the anchor text
+            top = quad[0] + (quad[1] - quad[0]) * np.float32([[start], [end]])
+            bottom = quad[3] + (quad[2] - quad[3]) * np.float32([[start], [end]])
+            best = np.float32([top[0], top[1], bottom[1], bottom[0]])
+            best_score = score
+    return best
+
+
+def align_page(image: np.ndarray, anchors: List[TemplateAnchor], detector: TextDetector = None,
+               recognizer: LineRecognizer = None) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Estimate the transform from template to page coordinates from anchors.
+
+    Returns:
+        (2x3 affine matrix or None when the page could not be aligned,
+        number of anchors found)
+    """
+    if not anchors:
+        return None, 0
+    detector = detector or _default_detector()
+    recognizer = recognizer or _default_recognizer()
+    height, width = image.shape[:2]
+
+    expected, found = [], []
+    with stage("template align"):
+        for anchor in anchors:
+            quad = _locate_anchor(image, anchor, detector, recognizer)
+            if quad is not None:
+                expected.append(_to_pixels(anchor.box, width, height))
+                found.append(quad)
+    if not found:
+        return None, 0
+
+    matrix, _ = cv2.estimateAffinePartial2D(np.concatenate(expected), np.concatenate(found))
+    if matrix is None:
+        return None, len(found)
+    scale = float(np.hypot(matrix[0, 0], matrix[1, 0]))
+    rotation = float(np.degrees(np.arctan2(matrix[1, 0], matrix[0, 0])))
+    if abs(scale - 1) > MAX_SCALE_CHANGE or abs(rotation) > MAX_ROTATION_DEG:
+        return None, len(found)
+    return matrix, len(found)
+
+
+def split_rows(crop: np.ndarray, min_gap: int = 2) -> List[Tuple[int, int]]:
+    """
+    Text rows of a multi-line region as (top, bottom) pixel bands.
+
+    Uses the horizontal ink profile, ignoring ruling lines (boxes and
+    underlines around form fields).
+    """
+    gray = to_gray(crop)
+    ink = ink_mask(gray)
+    horizontal, vertical = ruling_lines(gray, min_length_ratio=1 / 3)
+    ink[(horizontal > 0) | (vertical > 0)] = 0
+
+    profile = (ink > 0).sum(axis=1)
+    rows = profile > max(2, 0.01 * crop.shape[1])
+    bands, start, gap = [], None, 0
+    for y, has_ink in enumerate(rows):
+        if has_ink:
+            if start is None:
+                start = y
+            gap = 0
+        elif start is not None:
+            gap += 1
+            if gap > min_gap:
+                bands.append((start, y - gap + 1))
+                start, gap = None, 0
+    if start is not None:
+        bands.append((start, len(rows) - gap))
+
+    # Drop specks (less than a third of the tallest row)
+    tallest = max((b - t for t, b in bands), default=0)
+    return [(t, b) for t, b in bands if b - t >= tallest / 3]
+
+
+def _field_crops(image: np.ndarray, quad: np.ndarray, multiline: bool) -> List[np.ndarray]:
+    crop = crop_quad(image, quad, rotate_vertical=False)
+    if not multiline:
+        return [crop]
+    pad = 2
+    return [crop[max(t - pad, 0):b + pad] for t, b in split_rows(crop)] or [crop]
+
+
+def extract_fields(template: FormTemplate, render: Callable[[int], Any],
+                   page_count: int = None, recognizer: LineRecognizer = None,
+                   detector: TextDetector = None) -> Dict[str, Any]:
+    """
+    Recognize the fields of ``template`` on a document.
+
+    Args:
+        template: Form template
+        render: Page number -> PIL Image (e.g. ``DocumentSource.render``);
+            only the pages the template uses are requested
+        page_count: Pages in the document; fields on later pages are skipped
+            and their pages listed in ``missing_pages``
+        recognizer: Line recognizer (default: ``$OCR_TEMPLATE_REC_MODEL`` or PP-OCRv5 server)
+        detector: Detector for anchors (default: ``$OCR_TEMPLATE_DET_MODEL`` or PP-OCRv5 mobile)
+
+    Returns:
+        Dict with ``fields`` (name -> text), per-field ``details``
+        (confidence, page and pixel box) and per-page ``alignment``
+    """
+    recognizer = recognizer or _default_recognizer()
+    fields: Dict[str, str] = {}
+    details: Dict[str, Dict[str, Any]] = {}
+    alignment: Dict[str, Dict[str, Any]] = {}
+    missing_pages = []
+
+    for page_number in template.pages:
+        if page_count is not None and page_number > page_count:
+            missing_pages.append(page_number)
+            continue
+        page_fields = [f for f in template.fields if f.page == page_number]
+        page_anchors = [a for a in template.anchors if a.page == page_number]
+        if not page_fields:
+            continue
+
+        pil_image = render(page_number)
+        with stage("preprocess"):
+            # Full resolution: the fields are small, and nothing else is run
+            image = preprocess_for_ocr(pil_image, max_dimension=max(pil_image.size))
+        height, width = image.shape[:2]
+
+        matrix, anchors_found = align_page(image, page_anchors, detector, recognizer)
+        alignment[str(page_number)] = {
+            'anchors': len(page_anchors),
+            'anchors_found': anchors_found,
+            'aligned': matrix is not None,
+        }
+
+        crops, owners, quads = [], [], {}
+        with stage("crop"):
+            for field in page_fields:
+                quad = _to_pixels(field.box, width, height)
+                if matrix is not None:
+                    quad = cv2.transform(quad[None], matrix)[0]
+                quads[field.name] = quad
+                for crop in _field_crops(image, quad, field.multiline):
+                    crops.append(crop)
+                    owners.append(field.name)
+
+        texts, scores = recognizer.recognize(crops)
+
+        lines: Dict[str, List[Tuple[str, float]]] = {f.name: [] for f in page_fields}
+        for name, text, score in zip(owners, texts, scores):
+            lines[name].append((text, float(score)))
+        for field in page_fields:
+            field_lines = [(t, s) for t, s in lines[field.name] if t.strip()]
+            fields[field.name] = "\n".join(t for t, _ in field_lines)
+            quad = quads[field.name]
+            details[field.name] = {
+                'page': page_number,
+                'confidence': round(min((s for _, s in field_lines), default=0.0), 4),
+                'box': [round(float(v), 1) for v in (*quad.min(axis=0), *quad.max(axis=0))],
+            }
+
+    return {'template': template.name, 'fields': fields, 'details': details,
+            'alignment': alignment, 'missing_pages': missing_pages}
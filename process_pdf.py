@@ -4,8 +4,10 @@ Script to process multi-page PDF files using OCR structure analysis.
 """
 
 import argparse
+import json
 import os
 from utils.ingest import document_to_images
+from utils.profiling import profile_session
 from ocr.structure import ocr_document
 
 
@@ -43,15 +45,23 @@ def main():
     parser.add_argument("pdf_path", help="Path to the PDF file to process")
     parser.add_argument("--dpi", type=int, default=300,
                         help="DPI for image conversion (default: 300)")
+    parser.add_argument("--profile", metavar="TRACE_JSON",
+                        help="Print stage timings and write a Chrome trace to this file")
 
     args = parser.parse_args()
 
     try:
-        process_pdf(args.pdf_path, args.dpi)
+        with profile_session(bool(args.profile)) as profiler:
+            process_pdf(args.pdf_path, args.dpi)
     except Exception as e:
         print(f"Error processing PDF: {e}")
         raise
 
+    if profiler is not None:
+        print(json.dumps(profiler.summary(), indent=2))
+        profiler.write_chrome_trace(args.profile)
+        print(f"Chrome trace written to {args.profile}")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Memory admission checks (utils.admission) on a small budget.
+
+Estimates are plain numbers, so no document is rendered; the streamed
+response checks use the stub engine. Run with
+``python -m pytest test_admission.py``.
+"""
+
+import asyncio
+import gc
+
+import pytest
+from PIL import Image
+
+from utils.admission import MB, AdmissionError, MemoryBudget, admit
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(MemoryBudget, "poll_seconds", 0.005)
+    return MemoryBudget(100 * MB, max_queue=2, max_wait_seconds=0.5)
+
+
+def by_dpi(dpi):
+    """Estimate growing with the pixel count: 64 MB at 200 DPI."""
+    return int(64 * MB * (dpi / 200) ** 2)
+
+
+def test_fifo_order(budget):
+    async def scenario():
+        held = budget.try_reserve(90 * MB)
+        order = []
+
+        async def request(name, nbytes):
+            reservation = await budget.reserve(nbytes)
+            order.append(name)
+            reservation.release()
+
+        big = asyncio.create_task(request("big", 50 * MB))
+        await asyncio.sleep(0.02)
+        small = asyncio.create_task(request("small", 5 * MB))
+        await asyncio.sleep(0.02)
+        # 5 MB would fit, but the 50 MB request is first in line
+        assert order == [] and budget.stats()['waiting'] == 2
+        held.release()
+        await asyncio.gather(big, small)
+        return order
+
+    assert asyncio.run(scenario()) == ["big", "small"]
+    assert budget.stats()['used_mb'] == 0 and budget.stats()['active'] == 0
+
+
+def test_downgrade_picks_highest_fitting_dpi(budget):
+    async def scenario():
+        held = budget.try_reserve(30 * MB)
+        admission = await admit(budget, by_dpi, 300, page_count=1, allow_downgrade=True)
+        held.release()
+        return admission
+
+    admission = asyncio.run(scenario())
+    # 300 -> 144 MB, 250 -> 100 MB, 200 -> 64 MB, 150 -> 36 MB; 70 MB is free
+    assert admission.dpi == 200 and admission.to_dict()['downgraded']
+    assert admission.estimated_bytes == by_dpi(200)
+    assert budget.stats()['downgraded'] == 1
+    admission.release()
+
+
+def test_without_downgrade_a_fitting_request_waits(budget):
+    async def scenario():
+        held = budget.try_reserve(40 * MB)
+        waiting = asyncio.create_task(admit(budget, by_dpi, 200, page_count=1))
+        await asyncio.sleep(0.02)
+        assert not waiting.done()
+        held.release()
+        return await waiting
+
+    admission = asyncio.run(scenario())
+    assert admission.dpi == 200 and admission.queued_seconds > 0
+    assert budget.stats()['queued'] == 1
+    admission.release()
+
+
+def test_queue_limit(budget):
+    async def scenario():
+        held = budget.try_reserve(100 * MB)
+        waiting = [asyncio.create_task(budget.reserve(10 * MB)) for _ in range(2)]
+        await asyncio.sleep(0.02)
+        with pytest.raises(AdmissionError) as error:
+            await budget.reserve(10 * MB)
+        held.release()
+        for reservation in await asyncio.gather(*waiting):
+            reservation.release()
+        return error.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503 and error.retry_after is not None
+    assert budget.stats()['rejected'] == 1
+
+
+def test_timeout(budget):
+    async def scenario():
+        held = budget.try_reserve(100 * MB)
+        try:
+            await budget.reserve(10 * MB)
+        finally:
+            held.release()
+
+    with pytest.raises(AdmissionError) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 503
+    stats = budget.stats()
+    assert stats['timed_out'] == 1 and stats['waiting'] == 0 and stats['used_mb'] == 0
+
+
+def test_too_large_is_rejected(budget):
+    with pytest.raises(AdmissionError) as error:
+        asyncio.run(admit(budget, by_dpi, 300, page_count=1))
+    assert error.value.status_code == 413
+    assert "allow_downgrade" in str(error.value)
+    assert budget.stats()['rejected'] == 1 and budget.stats()['used_mb'] == 0
+
+
+@pytest.fixture
+def stream(monkeypatch, budget):
+    """Start an admitted streamed export of one blank page on the stub engine."""
+    monkeypatch.setenv("OCR_ENGINE", "stub")
+    monkeypatch.setenv("OCR_RESULT_STORE", "off")
+    from api.main import _stream_pages
+
+    def start():
+        admission = asyncio.run(admit(budget, lambda dpi: 10 * MB, 200, page_count=1))
+        image = Image.new("RGB", (200, 100), "white")
+        return _stream_pages("blank.png", b"", images=[image], admission=admission)
+
+    return start
+
+
+def test_abandoned_stream_releases_its_reservation(budget, stream):
+    pages = stream()
+    assert budget.stats()['used_mb'] == 10
+    # The client went away before the response started
+    del pages
+    gc.collect()
+    assert budget.stats()['used_mb'] == 0 and budget.stats()['active'] == 0
+
+
+def test_closed_stream_releases_its_reservation(budget, stream):
+    pages = stream()
+    next(pages)
+    pages.close()
+    assert budget.stats()['used_mb'] == 0 and budget.stats()['active'] == 0
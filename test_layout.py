@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Reading-order checks for skewed scans (ocr.layout).
+
+Pages come from the synthetic corpus generator; their ground-truth line
+boxes, rotated as a skewed scan would place them, stand in for the OCR
+result. Run with ``python -m pytest test_layout.py``.
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.corpus import find_fonts, generate_page, rotate_boxes
+from ocr.layout import arrange_text, estimate_skew
+
+DPI = 150
+FONTS = find_fonts()
+
+
+def make_page(seed, angle=0.0, **options):
+    """(line texts, line boxes) of a table-free page, scanned ``angle`` degrees off."""
+    options.setdefault('table_prob', 0.0)
+    image, truth = generate_page(np.random.default_rng(seed), dpi=DPI, fonts=FONTS, **options)
+    boxes = np.array([line['box'] for line in truth['lines']])
+    if angle:
+        boxes = rotate_boxes(boxes, angle, image.size)
+    return [line['text'] for line in truth['lines']], boxes
+
+
+def line_height(boxes):
+    return float(np.median(boxes[:, 3] - boxes[:, 1]))
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("angle", [-0.9, -2.0, 1.5])
+def test_skewed_columns_keep_reading_order(seed, angle):
+    texts, boxes = make_page(seed, angle, columns=(3,))
+    assert [line for line in arrange_text(texts, boxes).split("\n") if line] == texts
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("columns", [1, 2, 3])
+def test_straight_pages_are_not_deskewed(seed, columns):
+    _, boxes = make_page(seed, columns=(columns,))
+    assert estimate_skew(boxes.astype(np.float64), line_height(boxes)) == 0.0
+
+
+def test_skew_estimate():
+    _, boxes = make_page(0, -0.9, columns=(3,))
+    skew = estimate_skew(boxes.astype(np.float64), line_height(boxes))
+    assert abs(np.degrees(np.arctan(skew)) + 0.9) < 0.3
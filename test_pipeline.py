@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Back-pressure and ordering checks for the staged pipeline (ocr.pipeline).
+
+Run with ``python -m pytest test_pipeline.py``.
+"""
+
+import itertools
+import random
+import time
+
+import pytest
+
+from ocr.pipeline import Pipeline, Stage, max_in_flight
+
+
+def jitter(item):
+    time.sleep(random.random() * 0.002)
+    return item
+
+
+def make_pipeline(queue_size=4):
+    return Pipeline([Stage("a", jitter, 2), Stage("b", jitter, 3), Stage("c", jitter, 1)],
+                    queue_size=queue_size, name="test")
+
+
+def test_results_in_input_order():
+    assert list(make_pipeline().run(range(200))) == list(range(200))
+
+
+@pytest.mark.parametrize("queue_size", [1, 4])
+def test_stalled_consumer_bounds_pages_in_flight(queue_size):
+    pipeline = make_pipeline(queue_size)
+    pulled = itertools.count()
+    items = (next(pulled) for _ in range(200))
+    run = pipeline.run(items)
+    try:
+        assert next(run) == 0
+        time.sleep(0.5)
+        window = max_in_flight(pipeline.stages, queue_size)
+        stats = run.stats()
+        assert stats['in_flight'] <= window
+        assert next(pulled) <= window + 1
+        assert run._output.qsize() <= queue_size
+        assert len(run._pending) <= window
+        # Taking one more result lets exactly one more item in
+        assert next(run) == 1
+        time.sleep(0.2)
+        assert run.stats()['in_flight'] <= window
+    finally:
+        run.close()
+
+
+def test_stage_error_reaches_consumer():
+    def fail(item):
+        if item == 50:
+            raise ValueError("page 50")
+        return item
+
+    run = Pipeline([Stage("a", jitter, 2), Stage("b", fail, 1)], queue_size=2).run(range(100))
+    with pytest.raises(ValueError, match="page 50"):
+        list(run)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Checks for the recognition cache's near-duplicate matching (ocr.rec_cache).
+
+Run with ``python -m pytest test_rec_cache.py``.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from ocr.rec_cache import RecognitionCache, crop_hash
+
+FOOTER = "Page 12 of 40 - Confidential - Printed 03/04/2024 by the accounts department"
+
+
+def render_line(text, dx=0, dy=0, size=20, pad=6):
+    """A line crop as the detector would cut it, optionally off by (dx, dy) pixels."""
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        font = ImageFont.load_default(size)
+    left, top, right, bottom = font.getbbox(text)
+    margin = pad + 4
+    image = Image.new("L", (right - left + 2 * margin, bottom - top + 2 * margin), 255)
+    ImageDraw.Draw(image).text((margin - left, margin - top), text, font=font, fill=30)
+    gray = np.array(image)
+    height, width = gray.shape
+    crop = gray[4 + dy:height - 4 + dy, 4 + dx:width - 4 + dx]
+    return np.dstack([crop] * 3)
+
+
+def add_noise(crop, rng, amplitude=2):
+    noisy = crop.astype(np.int16) + rng.integers(-amplitude, amplitude + 1, crop.shape)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def jpeg(crop, quality=90):
+    buffer = io.BytesIO()
+    Image.fromarray(crop).save(buffer, "JPEG", quality=quality)
+    return np.array(Image.open(buffer).convert("RGB"))
+
+
+def cache_with(text, crop):
+    cache = RecognitionCache(max_entries=100)
+    cache.put(crop_hash(crop), text, 0.99)
+    return cache
+
+
+def test_noisy_copies_hit():
+    rng = np.random.default_rng(0)
+    cache = cache_with(FOOTER, render_line(FOOTER))
+    hits = sum(cache.get(crop_hash(add_noise(render_line(FOOTER), rng))) is not None
+               for _ in range(20))
+    assert hits == 20
+
+
+def test_shifted_and_reencoded_copies_hit():
+    cache = cache_with(FOOTER, render_line(FOOTER))
+    for crop in (render_line(FOOTER, dx=1), render_line(FOOTER, dy=1),
+                 render_line(FOOTER, dx=-1, dy=1), jpeg(render_line(FOOTER))):
+        assert cache.get(crop_hash(crop)) == (FOOTER, 0.99)
+
+
+def test_one_character_difference_misses():
+    cache = cache_with(FOOTER, render_line(FOOTER))
+    for other in (FOOTER.replace("12", "13"), FOOTER.replace("2024", "2025"),
+                  "Total", "Thank you for your business!"):
+        assert cache.get(crop_hash(render_line(other))) is None
+
+
+def test_closest_entry_wins():
+    exact = render_line(FOOTER)
+    near = jpeg(exact, quality=60)
+    cache = RecognitionCache(max_entries=100)
+    cache.put(crop_hash(exact), "exact", 1.0)
+    cache.put(crop_hash(near), "near", 1.0)
+    assert cache.get(crop_hash(exact)) == ("exact", 1.0)
+    assert cache.get(crop_hash(near)) == ("near", 1.0)
+
+
+def test_near_identical_amounts_keep_their_text():
+    cache = RecognitionCache(max_entries=100)
+    for amount in ("Total due: $1,000", "Total due: $1,600", "Total due: $1,800"):
+        cache.put(crop_hash(render_line(amount)), amount, 0.98)
+    for amount in ("Total due: $1,000", "Total due: $1,600", "Total due: $1,800"):
+        hit = cache.get(crop_hash(add_noise(render_line(amount), np.random.default_rng(1))))
+        assert hit == (amount, 0.98)
+
+
+def test_eviction_keeps_buckets_consistent():
+    cache = RecognitionCache(max_entries=3)
+    texts = [f"Line number {i} of the header" for i in range(6)]
+    for text in texts:
+        cache.put(crop_hash(render_line(text)), text, 0.9)
+    assert len(cache) == 3 and cache.evictions == 3
+    assert cache.get(crop_hash(render_line(texts[0]))) is None
+    assert cache.get(crop_hash(render_line(texts[-1]))) == (texts[-1], 0.9)
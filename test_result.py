@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Coordinate checks for PaddleOCR results (ocr.result).
+
+The document orientation model turns the page before OCR; its boxes must
+come back in the coordinates of the image the pipeline was given. Run with
+``python -m pytest test_result.py``.
+"""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from ocr.result import PageResult
+
+SIZE = (300, 200)
+BOX = (40, 30, 121, 51)
+
+
+def rotated_prediction(angle):
+    """A Paddle-like result for a page with one dark line at ``BOX``, rotated by ``angle``."""
+    image = Image.new("L", SIZE, 255)
+    ImageDraw.Draw(image).rectangle([BOX[0], BOX[1], BOX[2] - 1, BOX[3] - 1], fill=0)
+    ys, xs = np.nonzero(np.array(image.rotate(angle, expand=True)) < 128)
+    x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+    return {
+        'rec_texts': ["line"],
+        'rec_scores': [0.9],
+        'rec_boxes': np.array([[x1, y1, x2, y2]]),
+        'rec_polys': np.array([[[x1, y1], [x2, y1], [x2, y2], [x1, y2]]]),
+        'doc_preprocessor_res': {'angle': angle},
+    }
+
+
+@pytest.mark.parametrize("angle", [0, 90, 180, 270])
+def test_rotated_pages_map_back_to_the_input(angle):
+    page = PageResult.from_paddle(rotated_prediction(angle), image_size=SIZE)
+    assert page.boxes.tolist() == [list(BOX)]
+    assert page.polys.min(axis=1).tolist() == [list(BOX[:2])]
+    assert page.polys.max(axis=1).tolist() == [list(BOX[2:])]
+
+
+def test_disabled_orientation_is_left_alone():
+    res = rotated_prediction(0)
+    res['doc_preprocessor_res'] = {'angle': -1}
+    assert PageResult.from_paddle(res, image_size=SIZE).boxes.tolist() == [list(BOX)]
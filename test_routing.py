@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Routing fixtures for selective structure analysis (ocr.routing).
+
+Pages come from the synthetic corpus generator; their ground-truth lines
+stand in for the OCR result, so no model is needed. Run with
+``python -m pytest test_routing.py``.
+"""
+
+import numpy as np
+import pytest
+from PIL import ImageDraw
+
+from benchmarks.corpus import degrade, find_fonts, generate_page, load_font
+from ocr.result import PageResult
+from ocr.routing import needs_structure, page_signals
+from utils.preprocess import preprocess_for_ocr
+
+DPI = 150
+FONTS = find_fonts()
+
+
+def make_page(seed, noise=0.0, **options):
+    """(PIL page, ground-truth lines) of a table-free text page, with Gaussian noise."""
+    rng = np.random.default_rng(seed)
+    options.setdefault('table_prob', 0.0)
+    image, truth = generate_page(rng, dpi=DPI, fonts=FONTS, **options)
+    if noise:
+        image = degrade(image, rng, 0.0, noise)
+    return image, [dict(line) for line in truth['lines']]
+
+
+def route(image, lines):
+    """Reasons for sending the page to PPStructureV3, with ``lines`` as the OCR result."""
+    preprocessed = preprocess_for_ocr(image)
+    scale = np.array([preprocessed.shape[1] / image.width, preprocessed.shape[0] / image.height] * 2)
+    boxes = np.array([line['box'] for line in lines], dtype=np.float64).reshape(-1, 4)
+    page = PageResult(texts=[line['text'] for line in lines],
+                      boxes=np.rint(boxes * scale).astype(np.int64),
+                      scores=np.ones(len(lines)))
+    return needs_structure(page_signals(preprocessed, page))[1]
+
+
+def clear_bottom(image, lines, fraction=0.4):
+    """Blank the bottom of the page (and drop its lines); returns the cleared top y."""
+    top = int(image.height * (1 - fraction))
+    ImageDraw.Draw(image).rectangle([0, top, image.width, image.height], fill="white")
+    lines[:] = [line for line in lines if line['box'][3] < top]
+    return top
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_noisy_three_column_prose_is_plain_text(seed):
+    image, lines = make_page(seed, noise=11, columns=(3,))
+    assert route(image, lines) == []
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_aligned_prose_columns_are_not_tabular(seed):
+    image, lines = make_page(seed, columns=(3,), skew=1.0)
+    assert 'tabular_rows' not in route(image, lines)
+
+
+def test_ruled_table_is_routed():
+    image, lines = make_page(0, noise=11, columns=(1,), table_prob=1.0)
+    assert 'ruled_table' in route(image, lines)
+
+
+def test_unruled_table_is_routed():
+    image, lines = make_page(1, columns=(1,))
+    top = clear_bottom(image, lines)
+    draw = ImageDraw.Draw(image)
+    font = load_font(FONTS[0] if FONTS else None, 20)
+    for row in range(6):
+        y = top + 40 + row * 40
+        cells = ["Item %d" % row, str(10 * row + 3), "%.2f" % (row * 1.5), "EUR"]
+        for column, text in enumerate(cells):
+            x = 90 + column * 260
+            draw.text((x, y), text, font=font, fill="black")
+            lines.append({'text': text, 'box': list(draw.textbbox((x, y), text, font=font))})
+    assert route(image, lines) == ['tabular_rows']
+
+
+def test_chart_is_routed():
+    image, lines = make_page(2, noise=11, columns=(2,))
+    top = clear_bottom(image, lines)
+    draw = ImageDraw.Draw(image)
+    rng = np.random.default_rng(0)
+    points = [(150 + i * 40, top + 60 + int(rng.integers(0, 250))) for i in range(25)]
+    draw.line(points, fill="black", width=3)
+    for i, height in enumerate(rng.integers(40, 250, size=8)):
+        x = 200 + i * 110
+        draw.rectangle([x, top + 380 - height, x + 60, top + 380], fill=(90, 90, 90))
+    assert 'graphics' in route(image, lines)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Ruled-table extraction on a synthetic table (ocr.tables).
+
+The table is drawn with OpenCV; its cell texts stand in for the OCR result,
+so no model is needed. Run with ``python -m pytest test_tables.py``.
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from ocr.result import PageResult
+from ocr.tables import extract_tables, tables_summary
+
+COLS = [100, 400, 650, 900]
+ROWS = [100, 160, 220, 280, 340]
+
+
+def draw_table():
+    """
+    A 4 x 3 ruled table: a header spanning all columns, and a first-column
+    cell spanning the last two rows.
+    """
+    image = np.full((800, 1000, 3), 255, np.uint8)
+    black = (0, 0, 0)
+    for y in (ROWS[0], ROWS[1], ROWS[2], ROWS[4]):
+        cv2.line(image, (COLS[0], y), (COLS[3], y), black, 2)
+    cv2.line(image, (COLS[1], ROWS[3]), (COLS[3], ROWS[3]), black, 2)
+    for x in (COLS[0], COLS[3]):
+        cv2.line(image, (x, ROWS[0]), (x, ROWS[4]), black, 2)
+    for x in (COLS[1], COLS[2]):
+        cv2.line(image, (x, ROWS[1]), (x, ROWS[4]), black, 2)
+    return image
+
+
+def cell_box(row, col, dx=20, width=120):
+    top = ROWS[row] + 18
+    return [COLS[col] + dx, top, COLS[col] + dx + width, top + 24]
+
+
+def ocr_lines():
+    lines = [
+        ("Quarterly report", [350, 118, 650, 142]),
+        ("Item", cell_box(1, 0, width=60)),
+        ("name", cell_box(1, 0, dx=90, width=70)),
+        ("Qty", cell_box(1, 1)),
+        ("Price", cell_box(1, 2)),
+        ("Widgets", [COLS[0] + 20, 268, COLS[0] + 160, 292]),
+        ("4", cell_box(2, 1)),
+        ("9.50", cell_box(2, 2)),
+        ("2", cell_box(3, 1)),
+        ("3.10", cell_box(3, 2)),
+        ("Footnote outside the table", [100, 500, 500, 524]),
+    ]
+    return PageResult(texts=[text for text, _ in lines], boxes=[box for _, box in lines])
+
+
+@pytest.fixture(scope="module")
+def table():
+    tables = extract_tables(draw_table(), ocr_lines())
+    assert len(tables) == 1
+    return tables[0]
+
+
+def test_grid_and_spans(table):
+    assert (table.rows, table.columns) == (4, 3)
+    spans = {(cell.row, cell.col): (cell.rowspan, cell.colspan) for cell in table.cells}
+    assert spans == {
+        (0, 0): (1, 3),
+        (1, 0): (1, 1), (1, 1): (1, 1), (1, 2): (1, 1),
+        (2, 0): (2, 1), (2, 1): (1, 1), (2, 2): (1, 1),
+        (3, 1): (1, 1), (3, 2): (1, 1),
+    }
+
+
+def test_cells_are_filled_in_reading_order(table):
+    assert table.grid() == [
+        ["Quarterly report", "", ""],
+        ["Item name", "Qty", "Price"],
+        ["Widgets", "4", "9.50"],
+        ["", "2", "3.10"],
+    ]
+    assert all("Footnote" not in cell.text for cell in table.cells)
+
+
+def test_renderings(table):
+    html = table.to_html()
+    assert '<td colspan="3">Quarterly report</td>' in html
+    assert '<td rowspan="2">Widgets</td>' in html
+    assert table.to_csv().splitlines()[1] == "Item name,Qty,Price"
+    summary = tables_summary([table])
+    assert summary['tables'][0]['label'] == 'table'
+    assert summary['markdown'].startswith("| Quarterly report |  |  |")
+
+
+def test_plain_text_page_has_no_tables():
+    image = np.full((800, 1000, 3), 255, np.uint8)
+    cv2.putText(image, "No rules here", (100, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    assert extract_tables(image, PageResult()) == []
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Lease, retry and limit checks for the shared task queue (utils.task_queue, worker.py).
+
+Run with ``python -m pytest test_task_queue.py``.
+"""
+
+import threading
+
+import pytest
+
+from utils.admission import AdmissionError, check_dpi
+from utils.task_queue import DONE, FAILED, LEASED, QUEUED, SQLiteTaskQueue
+import worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with SQLiteTaskQueue(str(tmp_path / "tasks.sqlite")) as q:
+        yield q
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable ``time.time`` for the queue module."""
+    now = [1_000_000.0]
+    monkeypatch.setattr("utils.task_queue.time.time", lambda: now[0])
+    return now
+
+
+def test_lease_expiry_hands_task_to_another_worker(queue, clock):
+    task_id = queue.enqueue("image", {}, data=b"x")
+    first = queue.lease("a", visibility_timeout=10)
+    assert first.task_id == task_id and first.attempts == 1
+    assert queue.lease("b", visibility_timeout=10) is None
+
+    clock[0] += 11
+    second = queue.lease("b", visibility_timeout=10)
+    assert second.task_id == task_id and second.attempts == 2
+    assert queue.get(task_id).lease_owner == "b"
+
+
+def test_lost_lease_cannot_ack_extend_or_fail(queue, clock):
+    queue.enqueue("image", {}, data=b"x")
+    first = queue.lease("a", visibility_timeout=10)
+    clock[0] += 11
+    second = queue.lease("b", visibility_timeout=10)
+
+    assert not queue.extend(first, 10)
+    assert not queue.ack(first, {"stale": True})
+    assert not queue.fail(first, "stale")
+    assert queue.get(first.task_id).status == LEASED
+
+    assert queue.ack(second, {"ok": True})
+    task = queue.get(first.task_id)
+    assert task.status == DONE and task.result == {"ok": True}
+
+
+def test_same_owner_after_expiry_is_a_new_lease(queue, clock):
+    # The attempts counter, not just the owner, guards the lease
+    queue.enqueue("image", {}, data=b"x")
+    first = queue.lease("a", visibility_timeout=10)
+    clock[0] += 11
+    queue.lease("a", visibility_timeout=10)
+    assert not queue.ack(first)
+
+
+def test_retry_backoff_doubles_then_fails(queue, clock):
+    task_id = queue.enqueue("document", {}, data=b"x", max_attempts=3)
+    for attempt, delay in ((1, 5.0), (2, 10.0)):
+        task = queue.lease("w", visibility_timeout=60)
+        assert task.attempts == attempt
+        assert queue.fail(task, "boom", retry_delay=5.0)
+        assert queue.get(task_id).status == QUEUED
+        clock[0] += delay - 0.1
+        assert queue.lease("w", visibility_timeout=60) is None
+        clock[0] += 0.2
+
+    task = queue.lease("w", visibility_timeout=60)
+    assert task.attempts == 3
+    assert queue.fail(task, "boom", retry_delay=5.0)
+    failed = queue.get(task_id)
+    assert failed.status == FAILED and failed.error == "boom"
+
+
+def test_expired_last_attempt_is_failed(queue, clock):
+    task_id = queue.enqueue("image", {}, data=b"x", max_attempts=1)
+    queue.lease("w", visibility_timeout=10)
+    clock[0] += 11
+    assert queue.lease("w", visibility_timeout=10) is None
+    task = queue.get(task_id)
+    assert task.status == FAILED and task.error == "lease expired"
+
+
+def test_dpi_limit(monkeypatch):
+    monkeypatch.setenv("OCR_MAX_DPI", "600")
+    with pytest.raises(AdmissionError) as e:
+        check_dpi(99999)
+    assert e.value.status_code == 413
+    assert check_dpi(99999, allow_downgrade=True) == 600
+    assert check_dpi(300) == 300 and check_dpi("auto") == "auto"
+
+
+def test_worker_does_not_retry_limit_errors(queue, monkeypatch):
+    def reject(task):
+        raise AdmissionError("Document has 5000 pages; the limit is 1000", 413)
+
+    monkeypatch.setattr(worker, "process_task", reject)
+    task_id = queue.enqueue("document", {}, data=b"x", max_attempts=3)
+    counts = worker.run_worker(queue, "w", visibility_timeout=60, stop=threading.Event(),
+                               idle_exit=True)
+    task = queue.get(task_id)
+    assert counts['failed'] == 1
+    assert task.status == FAILED and task.attempts == 1 and "5000 pages" in task.error
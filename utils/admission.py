@@ -0,0 +1,360 @@
+"""
+Memory-aware admission control for document requests.
+
+Before a document is rasterized its peak working memory is estimated from
+the page count, the largest page's size and the DPI. The estimate is
+reserved against a process-wide budget for as long as the request runs:
+
+1. it fits in the free budget: the request starts at once;
+2. the client allows a downgrade and the document fits at a lower DPI
+   (down to ``MIN_DOWNGRADE_DPI``): it starts at that DPI;
+3. it fits in the whole budget: it waits in a FIFO queue (bounded in
+   length and time) for running requests to finish;
+4. otherwise it is rejected with the estimate and the budget in the error.
+
+Configured with ``OCR_REQUEST_MEMORY_BUDGET_MB`` (default: half of the
+physical memory divided by ``OCR_WORKERS``), ``OCR_ADMISSION_MAX_QUEUE``
+(16), ``OCR_ADMISSION_MAX_WAIT_SECONDS`` (60) and the hard limits
+``OCR_MAX_UPLOAD_MB`` (200), ``OCR_MAX_PAGES`` (1000), ``OCR_MAX_DPI``
+(600) and ``OCR_MAX_CROPS`` (1000 line crops per recognition request).
+Archive uploads are limited by ``OCR_MAX_ARCHIVE_MB`` (2048) and
+``OCR_ARCHIVE_MAX_MEMBERS`` (10000); each member by ``OCR_MAX_UPLOAD_MB``.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Sequence
+
+MB = 1024 * 1024
+
+RGB_BYTES = 3                       # rendered pages are RGB
+PREPROCESSED_BYTES = 1024 * 1024 * 3  # preprocessed page: 1024 px long side, 3 channels
+REQUEST_OVERHEAD_BYTES = 64 * MB    # upload, inference activations, results
+DOWNGRADE_DPIS = (300, 250, 200, 150)
+MIN_DOWNGRADE_DPI = 150
+
+
+class AdmissionError(Exception):
+    """
+    A request that cannot be admitted.
+
+    Attributes:
+        status_code: HTTP status (413 too large, 503 busy)
+        retry_after: Seconds after which retrying may succeed (503 only)
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def max_upload_bytes() -> int:
+    return _env_int("OCR_MAX_UPLOAD_MB", 200) * MB
+
+
+def max_pages() -> int:
+    return _env_int("OCR_MAX_PAGES", 1000)
+
+
+def max_dpi() -> int:
+    return _env_int("OCR_MAX_DPI", 600)
+
+
+def max_crops() -> int:
+    return _env_int("OCR_MAX_CROPS", 1000)
+
+
+def max_archive_bytes() -> int:
+    return _env_int("OCR_MAX_ARCHIVE_MB", 2048) * MB
+
+
+def max_archive_members() -> int:
+    return _env_int("OCR_ARCHIVE_MAX_MEMBERS", 10000)
+
+
+def check_upload(size: int):
+    """Reject uploads over ``OCR_MAX_UPLOAD_MB``."""
+    limit = max_upload_bytes()
+    if size > limit:
+        raise AdmissionError(
+            f"Upload of {size / MB:.1f} MB exceeds the limit of {limit / MB:.0f} MB", 413)
+
+
+def check_pages(page_count: int):
+    """Reject documents over ``OCR_MAX_PAGES``."""
+    if page_count > max_pages():
+        raise AdmissionError(
+            f"Document has {page_count} pages; the limit is {max_pages()}", 413)
+
+
+def check_dpi(dpi, allow_downgrade: bool = False):
+    """
+    The DPI to render at: ``dpi``, or ``OCR_MAX_DPI`` when ``dpi`` is over
+    it and ``allow_downgrade`` is set (otherwise such a DPI is rejected).
+    """
+    if isinstance(dpi, int) and dpi > max_dpi():
+        if not allow_downgrade:
+            raise AdmissionError(
+                f"DPI {dpi} exceeds the limit of {max_dpi()} (pass allow_downgrade=true "
+                f"to render at the highest allowed DPI)", 413)
+        return max_dpi()
+    return dpi
+
+
+def check_archive(size: int):
+    """Reject archive uploads over ``OCR_MAX_ARCHIVE_MB``."""
+    limit = max_archive_bytes()
+    if size > limit:
+        raise AdmissionError(
+            f"Archive of {size / MB:.1f} MB exceeds the limit of {limit / MB:.0f} MB", 413)
+
+
+def check_crops(count: int):
+    """Reject recognition requests with more than ``OCR_MAX_CROPS`` crops."""
+    if count > max_crops():
+        raise AdmissionError(
+            f"Request has {count} crops; the limit is {max_crops()}", 413)
+
+
+def estimate_document_bytes(page_pixels: int, page_count: int, pages_in_flight: int,
+                            rasterize_workers: int = 2) -> int:
+    """
+    Peak working memory of OCR'ing a document.
+
+    Args:
+        page_pixels: Pixels of the largest rendered page
+        page_count: Pages in the document
+        pages_in_flight: Most pages held at once (``page_count`` when all
+            pages are rendered up front)
+        rasterize_workers: Pages rendered concurrently
+    """
+    in_flight = min(page_count, pages_in_flight)
+    per_page = page_pixels * RGB_BYTES + PREPROCESSED_BYTES
+    # Poppler writes each page to a buffer that is decoded into the image
+    rendering = min(page_count, rasterize_workers) * page_pixels * RGB_BYTES
+    return REQUEST_OVERHEAD_BYTES + in_flight * per_page + rendering
+
+
+def default_budget_bytes() -> int:
+    """Half of the physical memory, split across ``OCR_WORKERS`` processes."""
+    try:
+        physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        physical = 8 * 1024 * MB
+    return physical // 2 // max(1, _env_int("OCR_WORKERS", 1))
+
+
+class Reservation:
+    """Memory reserved by one admitted request; ``release()`` is idempotent."""
+
+    def __init__(self, budget: "MemoryBudget", nbytes: int):
+        self.budget = budget
+        self.nbytes = nbytes
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.budget._release(self.nbytes)
+
+    def __del__(self):
+        # A streamed response that was never started still gives its memory back
+        self.release()
+
+
+class MemoryBudget:
+    """
+    Process-wide memory budget shared by running requests, with a FIFO
+    queue of requests waiting for memory.
+
+    Args:
+        budget_bytes: Memory requests may reserve in total
+        max_queue: Requests allowed to wait at once
+        max_wait_seconds: Longest a request waits before being turned away
+    """
+
+    poll_seconds = 0.05
+
+    def __init__(self, budget_bytes: int, max_queue: int = 16, max_wait_seconds: float = 60):
+        self.budget_bytes = budget_bytes
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self._used = 0
+        self._peak = 0
+        self._active = 0
+        self._waiting = deque()
+        # Reentrant: a Reservation collected while the lock is held releases through it
+        self._lock = threading.RLock()
+        self._counts = {'admitted': 0, 'queued': 0, 'downgraded': 0,
+                        'rejected': 0, 'timed_out': 0}
+
+    @property
+    def free_bytes(self) -> int:
+        with self._lock:
+            return self.budget_bytes - self._used
+
+    def count(self, event: str):
+        with self._lock:
+            self._counts[event] += 1
+
+    def try_reserve(self, nbytes: int, ticket=None) -> Optional[Reservation]:
+        """Reserve at once if the memory is free and nobody is queued ahead."""
+        with self._lock:
+            first = self._waiting[0] if self._waiting else None
+            if first is not ticket or self._used + nbytes > self.budget_bytes:
+                return None
+            if ticket is not None:
+                self._waiting.popleft()
+            self._used += nbytes
+            self._peak = max(self._peak, self._used)
+            self._active += 1
+            self._counts['admitted'] += 1
+            return Reservation(self, nbytes)
+
+    async def reserve(self, nbytes: int) -> Reservation:
+        """Reserve ``nbytes``, waiting in line when the budget is in use."""
+        reservation = self.try_reserve(nbytes)
+        if reservation is not None:
+            return reservation
+
+        ticket = object()
+        with self._lock:
+            if len(self._waiting) >= self.max_queue:
+                self._counts['rejected'] += 1
+                raise AdmissionError(
+                    f"Server busy: {len(self._waiting)} requests already waiting for memory",
+                    503, retry_after=int(self.max_wait_seconds))
+            self._waiting.append(ticket)
+            self._counts['queued'] += 1
+
+        deadline = time.monotonic() + self.max_wait_seconds
+        try:
+            while True:
+                reservation = self.try_reserve(nbytes, ticket)
+                if reservation is not None:
+                    return reservation
+                if time.monotonic() >= deadline:
+                    self.count('timed_out')
+                    raise AdmissionError(
+                        f"Server busy: no memory for this request within "
+                        f"{self.max_wait_seconds:.0f} s", 503,
+                        retry_after=int(self.max_wait_seconds))
+                await asyncio.sleep(self.poll_seconds)
+        finally:
+            with self._lock:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+
+    def _release(self, nbytes: int):
+        with self._lock:
+            self._used -= nbytes
+            self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'budget_mb': round(self.budget_bytes / MB, 1),
+                'used_mb': round(self._used / MB, 1),
+                'peak_used_mb': round(self._peak / MB, 1),
+                'active': self._active,
+                'waiting': len(self._waiting),
+                **self._counts,
+            }
+
+
+class Admission:
+    """An admitted request: its DPI, estimate and reservation."""
+
+    def __init__(self, reservation: Reservation, dpi, requested_dpi, estimated_bytes: int,
+                 queued_seconds: float):
+        self.reservation = reservation
+        self.dpi = dpi
+        self.requested_dpi = requested_dpi
+        self.estimated_bytes = estimated_bytes
+        self.queued_seconds = queued_seconds
+
+    def release(self):
+        self.reservation.release()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'estimated_mb': round(self.estimated_bytes / MB, 1),
+            'requested_dpi': self.requested_dpi,
+            'dpi': self.dpi,
+            'downgraded': self.dpi != self.requested_dpi,
+            'queued_seconds': round(self.queued_seconds, 3),
+        }
+
+
+async def admit(budget: "MemoryBudget", estimate: Callable[[Any], int], dpi, page_count: int,
+                allow_downgrade: bool = False,
+                downgrade_dpis: Sequence[int] = DOWNGRADE_DPIS) -> Admission:
+    """
+    Admit a document request or raise ``AdmissionError``.
+
+    Args:
+        budget: Memory budget to reserve from
+        estimate: DPI -> estimated peak bytes of the request
+        dpi: Requested DPI (an int or ``"auto"``)
+        page_count: Pages in the document
+        allow_downgrade: Whether a lower DPI may be used to fit the budget
+    """
+    try:
+        check_pages(page_count)
+        candidates = [check_dpi(dpi, allow_downgrade)]
+    except AdmissionError:
+        budget.count('rejected')
+        raise
+    if allow_downgrade:
+        highest = candidates[0] if isinstance(candidates[0], int) else float('inf')
+        candidates += [d for d in downgrade_dpis if MIN_DOWNGRADE_DPI <= d < highest]
+    estimates = [(d, estimate(d)) for d in candidates]
+
+    started = time.monotonic()
+    for candidate, nbytes in estimates:
+        reservation = budget.try_reserve(nbytes)
+        if reservation is not None:
+            if candidate != dpi:
+                budget.count('downgraded')
+            return Admission(reservation, candidate, dpi, nbytes, 0.0)
+
+    fitting = [(d, n) for d, n in estimates if n <= budget.budget_bytes]
+    if not fitting:
+        budget.count('rejected')
+        lowest_dpi, lowest = estimates[-1]
+        raise AdmissionError(
+            f"Estimated peak memory {lowest / MB:.0f} MB for {page_count} pages at "
+            f"{lowest_dpi} DPI exceeds the request memory budget of "
+            f"{budget.budget_bytes / MB:.0f} MB; use a lower dpi"
+            f"{'' if allow_downgrade else ', allow_downgrade=true'} or split the document",
+            413)
+
+    candidate, nbytes = fitting[0]
+    reservation = await budget.reserve(nbytes)
+    if candidate != dpi:
+        budget.count('downgraded')
+    return Admission(reservation, candidate, dpi, nbytes, time.monotonic() - started)
+
+
+_budget: Optional[MemoryBudget] = None
+_budget_lock = threading.Lock()
+
+
+def get_memory_budget() -> MemoryBudget:
+    """The process-wide budget from the environment."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            budget_mb = _env_int("OCR_REQUEST_MEMORY_BUDGET_MB", 0)
+            _budget = MemoryBudget(
+                budget_mb * MB if budget_mb > 0 else default_budget_bytes(),
+                max_queue=_env_int("OCR_ADMISSION_MAX_QUEUE", 16),
+                max_wait_seconds=float(os.environ.get("OCR_ADMISSION_MAX_WAIT_SECONDS", 60)))
+        return _budget
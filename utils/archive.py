@@ -0,0 +1,143 @@
+"""
+Member-by-member reading of ZIP and TAR uploads.
+
+``iter_archive`` yields the files of an archive one at a time, without
+extracting the archive to disk: TAR archives (plain or gzip/bzip2/xz
+compressed) are read as a forward-only stream (``tarfile`` mode ``r|*``),
+ZIP archives through their central directory. Only one member's bytes are
+held per ``next()``, so memory use is bounded by the member size limit
+times the number of members in flight, not by the archive size.
+
+Directories, links, hidden files and macOS resource forks are skipped.
+Members with an unsupported extension or over the size limit are still
+yielded, with ``error`` set and no data, so callers can report them.
+"""
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator, Optional
+
+from utils.ingest import SUPPORTED_EXTENSIONS
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+class ArchiveMember:
+    """
+    One file of an archive.
+
+    Attributes:
+        index: Position among the yielded members (0-based)
+        name: Path inside the archive
+        size: Uncompressed size in bytes (as declared by the archive)
+        data: File contents, or None when ``error`` is set
+        error: Why the member was not read
+    """
+
+    __slots__ = ('index', 'name', 'size', 'data', 'error')
+
+    def __init__(self, index: int, name: str, size: int, data: Optional[bytes] = None,
+                 error: Optional[str] = None):
+        self.index = index
+        self.name = name
+        self.size = size
+        self.data = data
+        self.error = error
+
+
+def is_archive(filename: str) -> bool:
+    return (filename or "").lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _skipped(name: str) -> bool:
+    base = os.path.basename(name.rstrip("/"))
+    return not base or base.startswith(".") or "__MACOSX/" in name
+
+
+def _check(index: int, name: str, size: int, max_member_bytes: int) -> Optional[ArchiveMember]:
+    """A member carrying an error, or None when ``name`` may be read."""
+    if not name.lower().endswith(SUPPORTED_EXTENSIONS):
+        return ArchiveMember(index, name, size, error="Unsupported file type")
+    if size > max_member_bytes:
+        return ArchiveMember(
+            index, name, size, error=f"Member of {size / 2 ** 20:.1f} MB exceeds the limit "
+                                     f"of {max_member_bytes / 2 ** 20:.0f} MB")
+    return None
+
+
+def _read_limited(f: BinaryIO, index: int, name: str, size: int,
+                  max_member_bytes: int) -> ArchiveMember:
+    # Declared sizes can lie (zip bombs): never read more than the limit
+    data = f.read(max_member_bytes + 1)
+    if len(data) > max_member_bytes:
+        return ArchiveMember(index, name, len(data),
+                             error=f"Member exceeds the limit of "
+                                   f"{max_member_bytes / 2 ** 20:.0f} MB")
+    return ArchiveMember(index, name, len(data), data=data)
+
+
+def _iter_zip(fileobj: BinaryIO, max_member_bytes: int) -> Iterator[ArchiveMember]:
+    with zipfile.ZipFile(fileobj) as archive:
+        index = 0
+        for info in archive.infolist():
+            if info.is_dir() or _skipped(info.filename):
+                continue
+            member = _check(index, info.filename, info.file_size, max_member_bytes)
+            if member is None:
+                with archive.open(info) as f:
+                    member = _read_limited(f, index, info.filename, info.file_size,
+                                           max_member_bytes)
+            yield member
+            index += 1
+
+
+def _iter_tar(fileobj: BinaryIO, max_member_bytes: int) -> Iterator[ArchiveMember]:
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.ReadError:
+        raise ValueError("Not a ZIP or TAR archive")
+    with archive:
+        index = 0
+        for info in archive:
+            if not info.isfile() or _skipped(info.name):
+                continue
+            member = _check(index, info.name, info.size, max_member_bytes)
+            if member is None:
+                # In stream mode the member's data can only be read now; unread
+                # members are skipped over by the next iteration
+                member = _read_limited(archive.extractfile(info), index, info.name, info.size,
+                                       max_member_bytes)
+            yield member
+            index += 1
+
+
+def iter_archive(fileobj: BinaryIO, max_member_bytes: int,
+                 max_members: int = 0) -> Iterator[ArchiveMember]:
+    """
+    Yield the files of a ZIP or TAR archive one by one.
+
+    Args:
+        fileobj: Seekable binary file positioned anywhere
+        max_member_bytes: Larger members are yielded with an error and no data
+        max_members: Stop after this many members (0: no limit); a last
+            member with an error says so
+
+    Raises:
+        ValueError: ``fileobj`` is neither a ZIP nor a TAR archive
+    """
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        members = _iter_zip(fileobj, max_member_bytes)
+    else:
+        fileobj.seek(0)
+        members = _iter_tar(fileobj, max_member_bytes)
+
+    for member in members:
+        if max_members and member.index >= max_members:
+            yield ArchiveMember(member.index, member.name, member.size,
+                                error=f"Archive has more than {max_members} files; "
+                                      f"the rest were skipped")
+            members.close()
+            return
+        yield member
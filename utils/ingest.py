@@ -1,19 +1,93 @@
 import os
+import re
 from PIL import Image
 
-# import cv2
-# import numpy as np
-from pdf2image import convert_from_path
+import cv2
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
 from docx2pdf import convert as docx2pdf_convert
 import tempfile
 import shutil
 
+from utils.preprocess import MAX_DIMENSION
+from utils.profiling import stage
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tiff", ".bmp")
+SUPPORTED_EXTENSIONS = (".pdf", ".docx") + IMAGE_EXTENSIONS
+
+# Adaptive DPI (dpi="auto"): render a probe, measure the text, re-render
+# only pages whose text would be too small in the OCR input
+PROBE_DPI = 100
+MIN_TEXT_PX = 7.0         # median glyph height wanted in the OCR input (~10 pt body text)
+MAX_ADAPTIVE_DPI = 400
+MIN_GLYPHS = 20           # fewer components than this: keep the probe
+
+
+def parse_dpi(value):
+    """``"auto"`` (adaptive DPI) or an int DPI from a CLI/query string."""
+    if isinstance(value, str) and value.lower() == "auto":
+        return "auto"
+    dpi = int(value)
+    if dpi <= 0:
+        raise ValueError(f"DPI must be positive: {value}")
+    return dpi
+
+
+def estimate_text_height(image):
+    """
+    Median height in pixels of glyph-like connected components, or None
+    when the page has too little text to tell.
+    """
+    gray = np.asarray(image.convert("L")) if isinstance(image, Image.Image) else image
+    ink = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                cv2.THRESH_BINARY_INV, 15, 10)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    width = stats[1:, cv2.CC_STAT_WIDTH]
+    height = stats[1:, cv2.CC_STAT_HEIGHT]
+    area = stats[1:, cv2.CC_STAT_AREA]
+
+    # Drop specks, rules, frames and pictures
+    glyphs = ((height >= 2) & (height <= gray.shape[0] * 0.05)
+              & (width <= height * 3) & (area >= 3)
+              & (area >= 0.1 * width * height))
+    if np.count_nonzero(glyphs) < MIN_GLYPHS:
+        return None
+    return float(np.median(height[glyphs]))
+
+
+def adaptive_dpi(text_height, probe_dpi, long_side):
+    """
+    DPI giving ``MIN_TEXT_PX`` glyphs in the OCR input, never below the probe.
+
+    Args:
+        text_height: Median glyph height at ``probe_dpi`` (pixels)
+        probe_dpi: DPI of the probe render
+        long_side: Long side of the probe render (pixels)
+
+    Returns:
+        (dpi, OCR input long side needed at that DPI)
+    """
+    # Preprocessing shrinks pages to MAX_DIMENSION; text size after that
+    shrink = min(1.0, MAX_DIMENSION / long_side)
+    if text_height is None or text_height * shrink >= MIN_TEXT_PX:
+        return probe_dpi, MAX_DIMENSION
+
+    # Render just large enough for the text, and keep that size in preprocessing
+    dpi = min(int(np.ceil(probe_dpi * MIN_TEXT_PX / text_height)), MAX_ADAPTIVE_DPI)
+    needed_side = int(np.ceil(long_side * dpi / probe_dpi))
+    return dpi, max(MAX_DIMENSION, needed_side)
+
 
 def document_to_images(input_path, dpi=300, output_dir=None):
     """
     Convert PDF, DOCX, or image file to a list of PIL Images (one per page).
     Output images are grayscale, 300 DPI, optimized for OCR.
     """
+    with stage("rasterize"):
+        return _document_to_images(input_path, dpi)
+
+
+def _document_to_images(input_path, dpi):
     file_ext = os.path.splitext(input_path)[1].lower()
     temp_dir = None
     image_paths = []
@@ -33,17 +107,8 @@ def document_to_images(input_path, dpi=300, output_dir=None):
             return images
 
         # Handle image files (JPG, PNG, etc.)
-        elif file_ext in [".jpg", ".jpeg", ".png", ".tiff", ".bmp"]:
-            img = Image.open(input_path)
-            # Ensure high DPI
-            if img.info.get("dpi") != (dpi, dpi):
-                img = img.resize(
-                    (int(img.width * dpi / 72), int(img.height * dpi / 72)),
-                    Image.LANCZOS,
-                )
-            # Convert to grayscale
-            img = img.convert("L")
-            return [img]
+        elif file_ext in IMAGE_EXTENSIONS:
+            return [_load_image(input_path, dpi)]
 
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
@@ -52,3 +117,139 @@ def document_to_images(input_path, dpi=300, output_dir=None):
         # Clean up temp files
         if temp_dir and os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
+
+
+def _load_image(input_path, dpi):
+    img = Image.open(input_path)
+    # Ensure high DPI
+    if img.info.get("dpi") != (dpi, dpi):
+        img = img.resize(
+            (int(img.width * dpi / 72), int(img.height * dpi / 72)),
+            Image.LANCZOS,
+        )
+    # Convert to grayscale
+    return img.convert("L")
+
+
+class DocumentSource:
+    """
+    Pages of a document rendered on demand, one page at a time.
+
+    Unlike ``document_to_images`` nothing is rendered up front, so pages can
+    be rasterized concurrently and only the pages in flight are in memory.
+    DOCX files are converted to PDF once on open; call ``close()`` (or use
+    as a context manager) to remove the temporary PDF.
+
+    With ``dpi="auto"`` each page is first rendered at ``PROBE_DPI``; only
+    pages whose text would be too small for recognition are rendered again
+    at a higher DPI. The DPI used per page is kept in ``page_dpi``.
+    """
+
+    def __init__(self, input_path, dpi=300):
+        self.input_path = input_path
+        self.dpi = dpi
+        self.page_dpi = {}
+        self._temp_dir = None
+        file_ext = os.path.splitext(input_path)[1].lower()
+
+        if file_ext == ".docx":
+            self._temp_dir = tempfile.mkdtemp()
+            self._pdf_path = os.path.join(self._temp_dir, "temp.pdf")
+            docx2pdf_convert(input_path, self._pdf_path)
+        elif file_ext == ".pdf":
+            self._pdf_path = input_path
+        elif file_ext in IMAGE_EXTENSIONS:
+            self._pdf_path = None
+        else:
+            raise ValueError(f"Unsupported file type: {file_ext}")
+
+        self.page_count = int(pdfinfo_from_path(self._pdf_path)["Pages"]) if self._pdf_path else 1
+        self._page_sizes = None
+
+    def page_sizes(self):
+        """
+        (width, height) of every page in points (1/72 in), without rendering.
+
+        For images the size in pixels is returned, as ``_load_image`` scales
+        it by dpi / 72 like a PDF page.
+        """
+        if self._page_sizes is None:
+            if self._pdf_path is None:
+                with Image.open(self.input_path) as img:
+                    self._page_sizes = [img.size]
+            else:
+                info = pdfinfo_from_path(self._pdf_path, first_page=1, last_page=self.page_count)
+                sizes = []
+                for key, value in info.items():
+                    if re.match(r"Page\s*\d* size", key):
+                        match = re.match(r"\s*([\d.]+) x ([\d.]+)", str(value))
+                        if match:
+                            sizes.append((float(match.group(1)), float(match.group(2))))
+                # Letter size when pdfinfo reports no sizes
+                self._page_sizes = sizes or [(612.0, 792.0)]
+        return self._page_sizes
+
+    def max_page_pixels(self, dpi=None):
+        """Pixels of the largest page rendered at ``dpi`` (default: this source's DPI)."""
+        dpi = self.dpi if dpi is None else dpi
+        if dpi == "auto":
+            if self._pdf_path is None:
+                # Images are not rescaled in adaptive mode
+                width, height = self.page_sizes()[0]
+                return int(width * height)
+            dpi = MAX_ADAPTIVE_DPI
+        scale = dpi / 72
+        return max(int(w * scale) * int(h * scale) for w, h in self.page_sizes())
+
+    def render(self, page_number):
+        """
+        Render one page (1-based) as a PIL Image; its DPI is recorded in
+        ``page_dpi`` and in the image's ``info["render_dpi"]``.
+        """
+        with stage("rasterize"):
+            if self.dpi == "auto":
+                image = self._render_adaptive(page_number)
+            else:
+                self.page_dpi[page_number] = self.dpi
+                if self._pdf_path is None:
+                    image = _load_image(self.input_path, self.dpi)
+                else:
+                    image = self._render_pdf(page_number, self.dpi)
+        # Exports that size pages physically (searchable PDF) need the DPI
+        image.info["render_dpi"] = self.page_dpi[page_number]
+        return image
+
+    def _render_pdf(self, page_number, dpi):
+        return convert_from_path(self._pdf_path, dpi=dpi,
+                                 first_page=page_number, last_page=page_number)[0]
+
+    def _render_adaptive(self, page_number):
+        if self._pdf_path is None:
+            # Pixels are fixed; only make sure preprocessing keeps fine text legible
+            image = Image.open(self.input_path).convert("L")
+            probe_dpi = int(round(image.info.get("dpi", (PROBE_DPI,))[0])) or PROBE_DPI
+        else:
+            probe_dpi = PROBE_DPI
+            image = self._render_pdf(page_number, probe_dpi)
+
+        with stage("dpi_probe"):
+            text_height = estimate_text_height(image)
+        dpi, max_dimension = adaptive_dpi(text_height, probe_dpi, max(image.size))
+
+        if dpi != probe_dpi and self._pdf_path is not None:
+            image = self._render_pdf(page_number, dpi)
+        if max_dimension > MAX_DIMENSION:
+            image.info["ocr_max_dimension"] = max_dimension
+        self.page_dpi[page_number] = dpi if self._pdf_path is not None else probe_dpi
+        return image
+
+    def close(self):
+        if self._temp_dir and os.path.exists(self._temp_dir):
+            shutil.rmtree(self._temp_dir)
+            self._temp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,132 @@
+"""
+SQLite manifest of documents in a batch run.
+
+One row per input path with its status (``pending``, ``running``, ``done``,
+``failed``), content hash, page count and output directory. Re-running a
+batch against the same manifest skips finished documents; rows left
+``running`` by an interrupted run go back to ``pending``.
+
+Only the coordinating process writes to the manifest.
+"""
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    sha256 TEXT,
+    pages INTEGER,
+    output_dir TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    seconds REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS documents_status ON documents (status);
+"""
+
+
+class Manifest:
+    """
+    Args:
+        path: SQLite file (created if missing)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, paths: Iterable[str], chunk_size: int = 1000) -> int:
+        """Register paths not seen before. Returns the number added."""
+        added = 0
+        chunk = []
+        for path in paths:
+            chunk.append((path, time.time()))
+            if len(chunk) >= chunk_size:
+                added += self._insert(chunk)
+                chunk = []
+        if chunk:
+            added += self._insert(chunk)
+        return added
+
+    def _insert(self, rows) -> int:
+        with self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO documents (path, updated_at) VALUES (?, ?)", rows)
+            return self._conn.total_changes - before
+
+    def recover(self, retry_failed: bool = False) -> int:
+        """Return interrupted (and optionally failed) documents to ``pending``."""
+        statuses = (RUNNING, FAILED) if retry_failed else (RUNNING,)
+        with self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE documents SET status = ? WHERE status IN ({','.join('?' * len(statuses))})",
+                (PENDING, *statuses))
+            return cursor.rowcount
+
+    def pending(self) -> Iterator[str]:
+        """Paths still to process, in insertion order."""
+        last = 0
+        while True:
+            rows = self._conn.execute(
+                "SELECT rowid, path FROM documents WHERE status = ? AND rowid > ? "
+                "ORDER BY rowid LIMIT 1000", (PENDING, last)).fetchall()
+            if not rows:
+                return
+            for rowid, path in rows:
+                last = rowid
+                yield path
+
+    def mark_running(self, path: str):
+        with self._conn:
+            self._conn.execute(
+                "UPDATE documents SET status = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE path = ?", (RUNNING, time.time(), path))
+
+    def mark_done(self, path: str, sha256: str, pages: int, output_dir: str,
+                  seconds: float):
+        with self._conn:
+            self._conn.execute(
+                "UPDATE documents SET status = ?, sha256 = ?, pages = ?, output_dir = ?, "
+                "error = NULL, seconds = ?, updated_at = ? WHERE path = ?",
+                (DONE, sha256, pages, output_dir, seconds, time.time(), path))
+
+    def mark_failed(self, path: str, error: str, sha256: Optional[str] = None):
+        with self._conn:
+            self._conn.execute(
+                "UPDATE documents SET status = ?, error = ?, sha256 = COALESCE(?, sha256), "
+                "updated_at = ? WHERE path = ?",
+                (FAILED, error, sha256, time.time(), path))
+
+    def counts(self) -> Dict[str, int]:
+        """Number of documents per status."""
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for status, count in self._conn.execute(
+                "SELECT status, COUNT(*) FROM documents GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def get(self, path: str) -> Optional[Dict]:
+        self._conn.row_factory = sqlite3.Row
+        try:
+            row = self._conn.execute("SELECT * FROM documents WHERE path = ?", (path,)).fetchone()
+        finally:
+            self._conn.row_factory = None
+        return dict(row) if row else None
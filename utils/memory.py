@@ -0,0 +1,36 @@
+import os
+import sys
+
+
+def current_rss(pid: int = None) -> int:
+    """
+    Return the resident set size of this process (or ``pid``) in bytes.
+
+    Uses psutil when installed, otherwise /proc (Linux) or, for this
+    process, the peak RSS reported by ``resource`` as a last resort.
+    """
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return peak_rss() if pid is None else 0
+
+
+def peak_rss() -> int:
+    """Return the peak resident set size of this process in bytes."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
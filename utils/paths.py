@@ -0,0 +1,22 @@
+"""
+Default locations of the service's persistent files.
+
+SQLite files (result store, task queue) default to a data directory
+instead of the working directory: ``OCR_DATA_DIR`` when set, otherwise
+``$XDG_DATA_HOME/ocr`` (``~/.local/share/ocr``).
+"""
+import os
+
+
+def data_dir() -> str:
+    """The data directory, created if missing."""
+    path = os.environ.get('OCR_DATA_DIR') or os.path.join(
+        os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser("~"), ".local", "share"),
+        "ocr")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_path(filename: str) -> str:
+    """Path of ``filename`` in the data directory."""
+    return os.path.join(data_dir(), filename)
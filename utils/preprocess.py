@@ -2,11 +2,21 @@ import cv2
 import numpy as np
 
 
-def preprocess_for_ocr(pil_image):
+MAX_DIMENSION = 1024
+
+
+def preprocess_for_ocr(pil_image, max_dimension=None):
     """
     Convert PIL image to OpenCV format and enhance for OCR.
     Ensures the dimension of the max side is 1024px while maintaining aspect ratio.
+
+    Pages rendered for fine print carry a larger limit in
+    ``pil_image.info["ocr_max_dimension"]`` (see ``utils.ingest``), which is
+    used when ``max_dimension`` is not given.
     """
+    if max_dimension is None:
+        max_dimension = getattr(pil_image, "info", {}).get("ocr_max_dimension", MAX_DIMENSION)
+
     # Convert PIL to OpenCV
     img = np.array(pil_image)
     if len(img.shape) == 3:
@@ -14,7 +24,6 @@ def preprocess_for_ocr(pil_image):
 
     # Resize image to ensure max dimension is 1024px while maintaining aspect ratio
     height, width = img.shape[:2]
-    max_dimension = 1024
 
     if max(height, width) > max_dimension:
         if height > width:
@@ -0,0 +1,198 @@
+"""
+Opt-in per-request profiling.
+
+Code marks its stages with ``stage("name")``; outside a ``profile_session()``
+this is a no-op costing one context-variable lookup. Inside a session each
+stage records wall time, the page it belongs to (``profile_page(n)``), the
+net Python allocations over the stage and the process RSS at its end.
+
+The recorded spans can be summarized per stage and per page, or exported as
+Chrome trace-event JSON (open in ``chrome://tracing`` or Perfetto).
+
+Memory peaks are recorded per request only. tracemalloc keeps a single
+process-wide peak, and the pipeline runs stages of different pages in
+parallel threads, so resetting it per stage would let one stage erase
+another's peak. The request's peak is exact for one profiled request at a
+time and approximate when several overlap; per-stage allocations are net
+figures that include whatever ran concurrently. Native allocations (Paddle
+tensors) are only covered by the RSS figures.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from utils.memory import current_rss
+
+
+class Span:
+    __slots__ = ('name', 'page', 'start', 'duration', 'thread', 'alloc_bytes', 'rss_bytes')
+
+    def __init__(self, name: str, page: Optional[int], start: float, thread: int):
+        self.name = name
+        self.page = page
+        self.start = start
+        self.duration = 0.0
+        self.thread = thread
+        self.alloc_bytes = 0
+        self.rss_bytes = 0
+
+
+class Profiler:
+    """
+    Collects stage spans for one request or document.
+
+    Args:
+        trace_memory: Record Python allocations (tracemalloc)
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.spans: List[Span] = []
+        self.started = time.perf_counter()
+        self.peak_traced_bytes = 0
+        self._stacks: Dict[int, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, page: Optional[int] = None):
+        thread = threading.get_ident()
+        stack = self._stacks.setdefault(thread, [])
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+
+        span = Span(name, page, time.perf_counter(), thread)
+        start_current = tracemalloc.get_traced_memory()[0] if tracing else 0
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            span.duration = time.perf_counter() - span.start
+            if tracing:
+                span.alloc_bytes = max(tracemalloc.get_traced_memory()[0] - start_current, 0)
+            span.rss_bytes = current_rss()
+            with self._lock:
+                self.spans.append(span)
+
+    def finish(self):
+        """Record the request's traced peak (call before tracing stops)."""
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peak_traced_bytes = max(self.peak_traced_bytes,
+                                         tracemalloc.get_traced_memory()[1])
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Totals per stage and per page, plus the request's memory peaks (sizes
+        in MB; ``alloc_mb`` per stage is the largest net allocation).
+        """
+        stages: Dict[str, Dict[str, Any]] = {}
+        pages: Dict[int, Dict[str, float]] = {}
+        for span in sorted(self.spans, key=lambda s: s.start):
+            entry = stages.setdefault(span.name, {'count': 0, 'seconds': 0.0,
+                                                  'max_seconds': 0.0, 'alloc_mb': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += span.duration
+            entry['max_seconds'] = max(entry['max_seconds'], span.duration)
+            entry['alloc_mb'] = max(entry['alloc_mb'], span.alloc_bytes / 1e6)
+            if span.page is not None:
+                page = pages.setdefault(span.page, {})
+                page[span.name] = page.get(span.name, 0.0) + span.duration
+
+        for entry in stages.values():
+            entry['seconds'] = round(entry['seconds'], 4)
+            entry['max_seconds'] = round(entry['max_seconds'], 4)
+            entry['alloc_mb'] = round(entry['alloc_mb'], 2)
+
+        return {
+            'total_seconds': round(time.perf_counter() - self.started, 4),
+            'stages': stages,
+            'pages': {str(n): {k: round(v, 4) for k, v in page.items()}
+                      for n, page in sorted(pages.items())},
+            'peak_traced_mb': round(self.peak_traced_bytes / 1e6, 2),
+            'peak_rss_mb': round(max((s.rss_bytes for s in self.spans), default=0) / 1e6, 1),
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Trace-event JSON (complete ``X`` events, microseconds)."""
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = {'alloc_mb': round(span.alloc_bytes / 1e6, 3),
+                    'rss_mb': round(span.rss_bytes / 1e6, 1)}
+            if span.page is not None:
+                args['page'] = span.page
+            events.append({
+                'name': span.name,
+                'cat': 'ocr',
+                'ph': 'X',
+                'ts': round((span.start - self.started) * 1e6, 1),
+                'dur': round(span.duration * 1e6, 1),
+                'pid': pid,
+                'tid': span.thread,
+                'args': args,
+            })
+        events.sort(key=lambda e: e['ts'])
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+_profiler: ContextVar[Optional[Profiler]] = ContextVar('ocr_profiler', default=None)
+_page: ContextVar[Optional[int]] = ContextVar('ocr_profile_page', default=None)
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler.get()
+
+
+@contextmanager
+def profile_session(enabled: bool = True, trace_memory: bool = True):
+    """
+    Profile the stages run in this block (and the current context).
+
+    Yields:
+        The Profiler, or None when ``enabled`` is false
+    """
+    if not enabled:
+        yield None
+        return
+
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = Profiler(trace_memory=trace_memory)
+    token = _profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _profiler.reset(token)
+        profiler.finish()
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def profile_page(page_number: int):
+    """Attribute the stages run in this block to ``page_number``."""
+    token = _page.set(page_number)
+    try:
+        yield
+    finally:
+        _page.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage when a profile session is active; no-op otherwise."""
+    profiler = _profiler.get()
+    if profiler is None:
+        yield None
+        return
+    with profiler.stage(name, _page.get()) as span:
+        yield span
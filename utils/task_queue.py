@@ -0,0 +1,335 @@
+"""
+Task queue shared by API nodes and OCR workers.
+
+API nodes enqueue documents and pages; standalone workers (``worker.py``)
+lease tasks, run the OCR pipeline and acknowledge them. A leased task is
+invisible to other workers until its visibility timeout expires. A worker
+that dies without acknowledging therefore loses the task to the next worker
+once the lease runs out. Failed tasks are retried with exponential backoff
+up to their ``max_attempts``; after that they stay ``failed``.
+
+``TaskQueue`` is the interface. ``SQLiteTaskQueue`` implements it on one
+SQLite file holding tasks, their input bytes and their results, so API
+nodes and workers share a backlog by pointing at the same file. For nodes
+on different machines, put the file on storage with working POSIX locks and
+use ``journal_mode=delete`` (WAL needs shared memory on one host). Other
+brokers plug in with ``register_backend``.
+
+Configured with ``OCR_TASK_QUEUE``: ``sqlite:///path/to/queue.sqlite``
+(default ``ocr_tasks.sqlite`` in the data directory, see ``utils.paths``),
+optionally with ``?journal_mode=delete``; ``off`` disables it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from utils.paths import data_path
+
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    data BLOB,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, available_at);
+"""
+
+
+class Task:
+    """
+    A leased (or looked-up) task.
+
+    Attributes:
+        task_id: Queue-assigned id
+        kind: Task type (``document``, ``image``, ...)
+        payload: JSON-serializable parameters
+        data: Input bytes (the upload), if any
+        attempts: Leases so far, including the current one
+        lease_owner: Worker holding the lease
+    """
+
+    __slots__ = ('task_id', 'kind', 'payload', 'data', 'status', 'attempts', 'max_attempts',
+                 'lease_owner', 'lease_expires', 'result', 'error', 'created_at',
+                 'updated_at')
+
+    def __init__(self, task_id: str, kind: str, payload: Dict[str, Any], data: bytes = None,
+                 status: str = QUEUED, attempts: int = 0, max_attempts: int = 3,
+                 lease_owner: str = None, lease_expires: float = None,
+                 result: Dict[str, Any] = None, error: str = None,
+                 created_at: float = None, updated_at: float = None):
+        self.task_id = task_id
+        self.kind = kind
+        self.payload = payload
+        self.data = data
+        self.status = status
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.lease_owner = lease_owner
+        self.lease_expires = lease_expires
+        self.result = result
+        self.error = error
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    def summary(self) -> Dict[str, Any]:
+        """Status without the input bytes or the result."""
+        return {
+            'task_id': self.task_id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'worker': self.lease_owner,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+
+class TaskQueue:
+    """Interface of a task queue backend."""
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], data: bytes = None,
+                max_attempts: int = 3) -> str:
+        """Add a task; returns its id."""
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, kinds: Iterable[str] = None,
+              visibility_timeout: float = 300) -> Optional[Task]:
+        """
+        The oldest ready task (of ``kinds``), leased to ``worker_id`` for
+        ``visibility_timeout`` seconds, or None when there is nothing to do.
+        """
+        raise NotImplementedError
+
+    def extend(self, task: Task, visibility_timeout: float) -> bool:
+        """Keep a long task leased; False when the lease was lost."""
+        raise NotImplementedError
+
+    def ack(self, task: Task, result: Dict[str, Any] = None) -> bool:
+        """Mark a leased task done; False when the lease was lost meanwhile."""
+        raise NotImplementedError
+
+    def fail(self, task: Task, error: str, retry: bool = True,
+             retry_delay: float = 5.0) -> bool:
+        """
+        Give a leased task back after an error: queued again after an
+        exponential backoff while attempts remain (and ``retry``), else failed.
+        """
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[Task]:
+        """Task by id, with its result, without input bytes."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    Task queue in one SQLite file (thread-safe; one connection behind a lock).
+
+    Leasing is a single ``BEGIN IMMEDIATE`` transaction, so processes (and
+    machines sharing the file) never lease the same task twice.
+
+    Args:
+        path: SQLite file (created if missing)
+        journal_mode: ``wal`` (one host) or ``delete`` (file shared between hosts)
+    """
+
+    def __init__(self, path: str, journal_mode: str = "wal"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                     timeout=30)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], data: bytes = None,
+                max_attempts: int = 3) -> str:
+        task_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tasks (id, kind, payload, data, max_attempts, available_at, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, kind, json.dumps(payload), data, max_attempts, now, now, now))
+        return task_id
+
+    def lease(self, worker_id: str, kinds: Iterable[str] = None,
+              visibility_timeout: float = 300) -> Optional[Task]:
+        kinds = list(kinds or [])
+        kind_filter = f" AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Leases that ran out on their last attempt are failures, not retries
+                self._conn.execute(
+                    "UPDATE tasks SET status = ?, error = 'lease expired', lease_owner = NULL, "
+                    "updated_at = ? WHERE status = ? AND lease_expires < ? "
+                    "AND attempts >= max_attempts", (FAILED, now, LEASED, now))
+                row = self._conn.execute(
+                    "SELECT id FROM tasks WHERE ((status = ? AND available_at <= ?) "
+                    "OR (status = ? AND lease_expires < ?))" + kind_filter +
+                    " ORDER BY created_at LIMIT 1",
+                    (QUEUED, now, LEASED, now, *kinds)).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE tasks SET status = ?, attempts = attempts + 1, lease_owner = ?, "
+                    "lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (LEASED, worker_id, now + visibility_timeout, now, row[0]))
+                task = self._load(row[0], with_data=True)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return task
+
+    def _load(self, task_id: str, with_data: bool = False) -> Optional[Task]:
+        row = self._conn.execute(
+            f"SELECT id, kind, payload, {'data' if with_data else 'NULL'}, status, attempts, "
+            "max_attempts, lease_owner, lease_expires, result, error, created_at, updated_at "
+            "FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        (task_id, kind, payload, data, status, attempts, max_attempts, owner, expires,
+         result, error, created_at, updated_at) = row
+        return Task(task_id, kind, json.loads(payload), data, status, attempts, max_attempts,
+                    owner, expires, json.loads(result) if result else None, error,
+                    created_at, updated_at)
+
+    def _update_leased(self, task: Task, sql: str, params: tuple) -> bool:
+        """Run ``sql`` if ``task`` is still leased by its owner."""
+        with self._lock:
+            cursor = self._conn.execute(
+                sql + " WHERE id = ? AND status = ? AND lease_owner = ? AND attempts = ?",
+                (*params, task.task_id, LEASED, task.lease_owner, task.attempts))
+            return cursor.rowcount > 0
+
+    def extend(self, task: Task, visibility_timeout: float) -> bool:
+        now = time.time()
+        return self._update_leased(task, "UPDATE tasks SET lease_expires = ?, updated_at = ?",
+                                   (now + visibility_timeout, now))
+
+    def ack(self, task: Task, result: Dict[str, Any] = None) -> bool:
+        return self._update_leased(
+            task, "UPDATE tasks SET status = ?, result = ?, error = NULL, data = NULL, "
+                  "lease_expires = NULL, updated_at = ?",
+            (DONE, json.dumps(result) if result is not None else None, time.time()))
+
+    def fail(self, task: Task, error: str, retry: bool = True,
+             retry_delay: float = 5.0) -> bool:
+        now = time.time()
+        if retry and task.attempts < task.max_attempts:
+            delay = retry_delay * 2 ** (task.attempts - 1)
+            return self._update_leased(
+                task, "UPDATE tasks SET status = ?, error = ?, available_at = ?, "
+                      "lease_owner = NULL, lease_expires = NULL, updated_at = ?",
+                (QUEUED, error, now + delay, now))
+        return self._update_leased(
+            task, "UPDATE tasks SET status = ?, error = ?, data = NULL, lease_expires = NULL, "
+                  "updated_at = ?", (FAILED, error, now))
+
+    def get(self, task_id: str) -> Optional[Task]:
+        with self._lock:
+            return self._load(task_id)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        counts = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for status, count in self._conn.execute(
+                    "SELECT status, COUNT(*) FROM tasks GROUP BY status"):
+                counts[status] = count
+            oldest, = self._conn.execute(
+                "SELECT MIN(created_at) FROM tasks WHERE status = ?", (QUEUED,)).fetchone()
+            expired, = self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE status = ? AND lease_expires < ?",
+                (LEASED, now)).fetchone()
+        return {'backend': 'sqlite', 'path': self.path, **counts,
+                'expired_leases': expired,
+                'oldest_queued_seconds': round(now - oldest, 1) if oldest else 0.0}
+
+
+_backends: Dict[str, Callable[..., TaskQueue]] = {}
+
+
+def register_backend(scheme: str, factory: Callable[..., TaskQueue]):
+    """
+    Make ``scheme://...`` URLs open with ``factory(url_path, **query_params)``
+    (e.g. a Redis or SQS adapter implementing ``TaskQueue``).
+    """
+    _backends[scheme] = factory
+
+
+register_backend("sqlite", SQLiteTaskQueue)
+
+
+def open_queue(url: str) -> TaskQueue:
+    """
+    Queue for ``scheme://location?option=value``; a bare path is an SQLite
+    file.
+    """
+    parts = urlsplit(url)
+    if not parts.scheme or len(parts.scheme) == 1:
+        # Plain path (or a Windows drive letter)
+        return SQLiteTaskQueue(url)
+    if parts.scheme not in _backends:
+        raise ValueError(f"Unknown task queue backend: {parts.scheme} "
+                         f"(expected one of {', '.join(_backends)})")
+    location = parts.netloc + parts.path
+    if parts.scheme == "sqlite":
+        # sqlite:///relative.sqlite and sqlite:////absolute.sqlite
+        location = parts.path[1:] if parts.path.startswith("/") else location
+    return _backends[parts.scheme](location, **dict(parse_qsl(parts.query)))
+
+
+_queue: Optional[TaskQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_task_queue() -> Optional[TaskQueue]:
+    """The process-wide queue from ``OCR_TASK_QUEUE``, or None when it is off."""
+    global _queue
+    url = os.environ.get('OCR_TASK_QUEUE')
+    if url is not None and (not url or url == 'off'):
+        return None
+    with _queue_lock:
+        if _queue is None:
+            _queue = open_queue(url) if url else SQLiteTaskQueue(data_path('ocr_tasks.sqlite'))
+        return _queue
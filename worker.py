@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Standalone OCR worker for the shared task queue.
+
+Leases ``document`` and ``image`` tasks enqueued by API nodes
+(``POST /tasks``) from the queue at ``--queue`` / ``OCR_TASK_QUEUE``, runs
+the OCR pipeline on them, saves the pages to the result store and
+acknowledges each task with its results. While a task runs, its lease is
+extended in the background, so only a worker that dies (or hangs past the
+visibility timeout) loses it to another worker. Errors are handed back to
+the queue, which retries with backoff. Inference nodes therefore scale
+independently of the API nodes: start as many workers, on as many
+machines, as the backlog needs.
+
+SIGINT/SIGTERM let the current task finish before exiting.
+
+Usage:
+    OCR_TASK_QUEUE=sqlite:////shared/ocr_tasks.sqlite?journal_mode=delete \\
+        python worker.py --engine server --visibility-timeout 600
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+from utils.admission import AdmissionError, check_dpi, check_pages
+from utils.task_queue import Task, TaskQueue, get_task_queue, open_queue
+
+logger = logging.getLogger("ocr.worker")
+
+TASK_KINDS = ("document", "image")
+
+
+def process_task(task: Task) -> dict:
+    """
+    Run OCR for a leased task and return its result (also saved to the result store).
+
+    The API node's DPI and page limits apply here too: a DPI over
+    ``OCR_MAX_DPI`` is lowered to it, and a document over ``OCR_MAX_PAGES``
+    raises ``AdmissionError``.
+    """
+    from PIL import Image
+
+    from ocr.orientation import document_orientation
+    from ocr.pipeline import ocr_pages
+    from ocr.rec_cache import document_cache
+    from ocr.result import pages_to_dicts
+    from ocr.store import get_result_store
+    from utils.ingest import DocumentSource
+
+    payload = task.payload
+    filename = payload.get('filename') or task.task_id
+    store = get_result_store()
+    orientation = document_orientation(payload.get('orientation'))
+    render_dpi = None
+
+    with document_cache():
+        if task.kind == 'image':
+            image = Image.open(io.BytesIO(task.data))
+            pages = [page for page, _ in ocr_pages(images=[image], store=store)]
+        elif task.kind == 'document':
+            with tempfile.TemporaryDirectory() as temp_dir:
+                path = os.path.join(temp_dir, os.path.basename(filename))
+                with open(path, 'wb') as f:
+                    f.write(task.data)
+                dpi = check_dpi(payload.get('dpi', 300), allow_downgrade=True)
+                with DocumentSource(path, dpi=dpi) as source:
+                    if not source.page_count:
+                        raise ValueError("Failed to convert document to images")
+                    check_pages(source.page_count)
+                    pages = [page for page, _ in ocr_pages(source=source, store=store,
+                                                           orientation=orientation)]
+                    if source.dpi == "auto":
+                        render_dpi = {str(n): d for n, d in sorted(source.page_dpi.items())}
+        else:
+            raise ValueError(f"Unknown task kind: {task.kind}")
+
+    sha256 = hashlib.sha256(task.data).hexdigest()
+    if store is not None:
+        try:
+            store.save(sha256, filename, pages)
+        except Exception:
+            logger.exception("could not save results of %s to the result store", filename)
+
+    result = {
+        'filename': filename,
+        'sha256': sha256,
+        'total_pages': len(pages),
+        'results': pages_to_dicts(pages),
+    }
+    if store is not None:
+        result['reused_pages'] = [page.page_number for page in pages if page.reused]
+    if render_dpi is not None:
+        result['render_dpi'] = render_dpi
+    if orientation is not None:
+        result['orientation'] = orientation.stats()
+    return result
+
+
+class LeaseKeeper:
+    """Extends a task's lease every ``visibility_timeout / 3`` seconds until stopped."""
+
+    def __init__(self, queue: TaskQueue, task: Task, visibility_timeout: float):
+        self.queue = queue
+        self.task = task
+        self.visibility_timeout = visibility_timeout
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="lease-keeper")
+
+    def _run(self):
+        while not self._stop.wait(self.visibility_timeout / 3):
+            if not self.queue.extend(self.task, self.visibility_timeout):
+                self.lost = True
+                logger.warning("lost the lease on task %s", self.task.task_id)
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(queue: TaskQueue, worker_id: str, kinds=TASK_KINDS,
+               visibility_timeout: float = 300, poll_interval: float = 1.0,
+               retry_delay: float = 5.0, max_tasks: int = 0, stop: threading.Event = None,
+               idle_exit: bool = False) -> dict:
+    """
+    Lease and process tasks until ``stop`` is set (or ``max_tasks`` are
+    done, or the queue is empty with ``idle_exit``).
+    """
+    stop = stop or threading.Event()
+    counts = {'done': 0, 'failed': 0, 'lost': 0}
+    while not stop.is_set() and not (max_tasks and sum(counts.values()) >= max_tasks):
+        task = queue.lease(worker_id, kinds, visibility_timeout)
+        if task is None:
+            if idle_exit:
+                break
+            stop.wait(poll_interval)
+            continue
+
+        started = time.perf_counter()
+        logger.info("task %s (%s, attempt %d/%d)", task.task_id, task.kind,
+                    task.attempts, task.max_attempts)
+        with LeaseKeeper(queue, task, visibility_timeout) as keeper:
+            retry = True
+            try:
+                result = process_task(task)
+                error = None
+            except AdmissionError as e:
+                # Over a hard limit: retrying cannot help
+                logger.warning("task %s rejected: %s", task.task_id, e)
+                result, error, retry = None, f"{type(e).__name__}: {e}", False
+            except Exception as e:
+                logger.exception("task %s failed", task.task_id)
+                result, error = None, f"{type(e).__name__}: {e}"
+
+        if keeper.lost:
+            # Someone else owns the task now; its outcome is theirs to report
+            counts['lost'] += 1
+        elif error is None and queue.ack(task, result):
+            counts['done'] += 1
+            logger.info("task %s done: %d pages in %.1fs", task.task_id,
+                        result['total_pages'], time.perf_counter() - started)
+        elif error is not None and queue.fail(task, error, retry=retry,
+                                              retry_delay=retry_delay):
+            counts['failed'] += 1
+        else:
+            counts['lost'] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR worker for the shared task queue")
+    parser.add_argument("--queue", default=None,
+                        help="Queue URL (default: $OCR_TASK_QUEUE or ocr_tasks.sqlite "
+                             "in the data directory)")
+    parser.add_argument("--kinds", nargs="*", default=list(TASK_KINDS), choices=TASK_KINDS,
+                        help="Task kinds to take (default: all)")
+    parser.add_argument("--worker-id", default=None,
+                        help="Lease owner name (default: host:pid:random)")
+    parser.add_argument("--visibility-timeout", type=float, default=300.0,
+                        help="Seconds a lease lasts without renewal (default: 300)")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Seconds between polls of an empty queue (default: 1)")
+    parser.add_argument("--retry-delay", type=float, default=5.0,
+                        help="Backoff before the first retry, doubled per attempt (default: 5)")
+    parser.add_argument("--max-tasks", type=int, default=0,
+                        help="Exit after this many tasks (default: run until stopped)")
+    parser.add_argument("--exit-when-idle", action="store_true",
+                        help="Exit once the queue has nothing ready")
+    parser.add_argument("--engine", default=None,
+                        help="OCR engine (default: $OCR_ENGINE or paddle)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    if args.engine:
+        os.environ["OCR_ENGINE"] = args.engine
+
+    from ocr.device import configure_worker
+    configure_worker()
+
+    queue = open_queue(args.queue) if args.queue else get_task_queue()
+    if queue is None:
+        parser.error("the task queue is off (set OCR_TASK_QUEUE or --queue)")
+    worker_id = args.worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info("stopping after the current task")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    logger.info("worker %s on %s", worker_id, args.queue or os.environ.get('OCR_TASK_QUEUE'))
+    with queue:
+        counts = run_worker(queue, worker_id, args.kinds, args.visibility_timeout,
+                            args.poll_interval, args.retry_delay, args.max_tasks, stop,
+                            idle_exit=args.exit_when_idle)
+    logger.info("worker %s: %s", worker_id, counts)
+
+
+if __name__ == "__main__":
+    main()